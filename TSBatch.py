@@ -0,0 +1,235 @@
+#this Python script is used to analyse many MPEG-2 TS recordings at once
+
+"""Batch analysis of recordings.
+
+findFiles() expands directories and glob patterns into the .ts, .TOD and
+.trp files under them. analyzeFiles() runs analyzeFile() over every file
+on one process pool shared by all of them, and returns the reports in the
+order of the files:
+
+    file, size, packet_size, packets    the file and its packets
+    pids                                PID manifest: packets, scrambled and
+                                        transport_error_indicator packets
+    programs                            PSI: PMT PID, PCR PID and streams
+                                        of every program of the PAT
+    pcr                                 PCR count, worst interval, interval
+                                        and accuracy errors, bitrate and
+                                        discontinuities per PCR PID
+    errors                              TR 101 290 errors per indicator
+    status, error                       ok, failed with error, or crashed
+
+Every file is read once, the PID census, the PCR analysis and the TR 101
+290 monitor sharing the header columns of every chunk. A file which raises
+is reported as failed. A file which kills its worker (a crash, or the
+kernel refusing memory) breaks the whole pool, so the files which were
+still running are tried again one process each, and the one which breaks
+its process again is reported as crashed. max_memory limits the data
+segment of every worker (RLIMIT_DATA, where the resource module exists);
+the files themselves are mapped read only and not counted in it.
+
+    python TSBatch.py [-j JOBS] [-m MB] [-r] [--output-format jsonl] [-o REPORT] DIR|GLOB|FILE ...
+"""
+
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from optparse import OptionParser
+from TSSource import PacketSource, detectSync
+from TSVector import decodeHeaders, PIDCensus
+from TSPCR import PCRAnalyzer
+from TSMonitor import TR101290Monitor, INDICATORS
+from TSOutput import openWriter
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+#the extensions of the file dialog of TSParser
+EXTENSIONS = ('.ts', '.tod', '.trp')
+
+FIELDS = ("file", "status", "error", "size", "packet_size", "packets", "pids", "programs", "pcr", "errors")
+
+def findFiles(paths, recursive=False):
+    "Return the sorted recordings named by paths: files, directories or glob patterns"
+    found = set()
+    for path in paths:
+        if os.path.isdir(path):
+            if recursive:
+                names = [os.path.join(root, name) for (root, dirs, files) in os.walk(path) for name in files]
+            else:
+                names = [os.path.join(path, name) for name in os.listdir(path)]
+        elif os.path.isfile(path):
+            #named on its own, taken whatever its extension
+            found.add(path)
+            continue
+        else:
+            names = glob.glob(path, recursive=recursive)
+        found.update(name for name in names
+                     if os.path.isfile(name) and os.path.splitext(name)[1].lower() in EXTENSIONS)
+    return sorted(found)
+
+def analyzeFile(filename, max_events=10):
+    "Read filename once and return its report"
+    result = dict.fromkeys(FIELDS)
+    result.update(file=filename, status="ok", size=os.path.getsize(filename))
+    with open(filename, 'rb') as filehandle:
+        (start, packet_size) = detectSync(filehandle)
+        if start < 0:
+            result.update(status="failed", error="no sync byte found")
+            return result
+        census = PIDCensus()
+        pcr = PCRAnalyzer(packet_size)
+        monitor = TR101290Monitor(packet_size, max_events=max_events)
+        source = PacketSource(filehandle, packet_size, start, resync=True)
+        source.resync_callback = monitor.syncLost
+        source.keep_sync_errors = True
+        try:
+            for (data, first, count) in source.chunks():
+                offset = source.offset(first)
+                columns = decodeHeaders(data, packet_size, first, count)
+                census.update(columns, census.total)
+                pcr.update(data, first, count, offset)
+                monitor.update(data, first, count, offset, columns)
+        finally:
+            source.close()
+    result.update(packet_size=packet_size, packets=census.total)
+    result["pids"] = [{"pid":i["pid"], "count":i["count"], "scrambled":i["scrambled"],
+                       "transport_error":i["transport_error"]} for i in census.report()]
+    result["programs"] = [{"program_number":number, "pmt_pid":p["pmt_pid"], "pcr_pid":p["pcr_pid"],
+                           "streams":[{"pid":pid, "stream_type":stream_type} for (pid, stream_type) in p["streams"]]}
+                          for (number, p) in sorted(monitor.programs.items())]
+    result["pcr"] = [{"pid":int(i["pid"]), "samples":i["samples"], "interval_max":i["interval_max"],
+                      "interval_violations":i["interval_violations"], "accuracy_violations":i["accuracy_violations"],
+                      "bitrate":i["bitrate"], "discontinuities":i["discontinuities"], "jumps":i["jumps"]}
+                     for i in pcr.report()]
+    result["errors"] = dict((i["indicator"], i["count"]) for i in monitor.report())
+    return result
+
+def _analyze(filename, max_events):
+    "analyzeFile() in a worker, an exception being reported instead of raised"
+    try:
+        return analyzeFile(filename, max_events)
+    except Exception as e:
+        result = dict.fromkeys(FIELDS)
+        error = type(e).__name__
+        if str(e):
+            error += ': %s' %e
+        result.update(file=filename, status="failed", error=error)
+        return result
+
+def _limitMemory(max_memory):
+    "Initializer of the workers"
+    if max_memory and resource is not None:
+        (soft, hard) = resource.getrlimit(resource.RLIMIT_DATA)
+        if hard != resource.RLIM_INFINITY:
+            max_memory = min(max_memory, hard)
+        resource.setrlimit(resource.RLIMIT_DATA, (max_memory, hard))
+
+def _run(filenames, jobs, max_memory, max_events, callback):
+    "Analyse filenames on one pool, return the reports by filename and the files left when the pool broke"
+    results = dict()
+    broken = list()
+    with ProcessPoolExecutor(jobs, initializer=_limitMemory, initargs=(max_memory,)) as executor:
+        futures = dict((executor.submit(_analyze, f, max_events), f) for f in filenames)
+        for future in as_completed(futures):
+            filename = futures[future]
+            try:
+                results[filename] = future.result()
+            except BrokenProcessPool:
+                broken.append(filename)
+                continue
+            if callback is not None:
+                callback(results[filename])
+    return (results, broken)
+
+def analyzeFiles(filenames, jobs=None, max_memory=None, max_events=10, callback=None):
+    """Return the report of every file of filenames, in the same order.
+
+    jobs is the number of worker processes, default = the number of CPUs;
+    max_memory the limit in bytes of the data segment of every worker.
+    callback is called with every report as soon as it is ready.
+    """
+    (results, broken) = _run(filenames, jobs, max_memory, max_events, callback)
+    #the file which broke the pool is among these, and breaks its own one again
+    for filename in sorted(broken):
+        (result, crashed) = _run([filename], 1, max_memory, max_events, callback)
+        if crashed:
+            result[filename] = dict.fromkeys(FIELDS)
+            result[filename].update(file=filename, status="crashed", error="the worker process died")
+            if callback is not None:
+                callback(result[filename])
+        results.update(result)
+    return [results[f] for f in filenames]
+
+def _errorCount(result, priority):
+    return sum(count for (indicator, count) in (result["errors"] or dict()).items() if indicator[0] == priority)
+
+def reportProgress(result):
+    print(('%s: %s' %(result["file"], result["status"] if result["error"] is None else result["error"])))
+    sys.stdout.flush()
+
+def reportBatch(results):
+    "Print one line per file, then the errors of every indicator over all files"
+    print('------- Batch Information -------')
+    print(('%-40s %-8s %12s %6s %9s %9s %10s %10s' \
+    %('file', 'status', 'packets', 'PIDs', 'programs', 'PCR PIDs', 'P1 errors', 'P2 errors')))
+    for r in results:
+        if r["status"] != "ok":
+            print(('%-40s %-8s %s' %(r["file"], r["status"], r["error"])))
+            continue
+        print(('%-40s %-8s %12d %6d %9d %9d %10d %10d' \
+        %(r["file"], r["status"], r["packets"], len(r["pids"]), len(r["programs"]), len(r["pcr"]),
+          _errorCount(r, "1"), _errorCount(r, "2"))))
+    print('')
+    print(('%-6s %-36s %10s %8s' %('', 'indicator', 'errors', 'files')))
+    analyzed = [r for r in results if r["status"] == "ok"]
+    for (indicator, name) in INDICATORS:
+        counts = [r["errors"][indicator] for r in analyzed]
+        print(('%-6s %-36s %10d %8d' %(indicator, name, sum(counts), len([c for c in counts if c]))))
+    print(('files = %d, analysed = %d, failed = %d, crashed = %d' \
+    %(len(results), len(analyzed), len([r for r in results if r["status"] == "failed"]),
+      len([r for r in results if r["status"] == "crashed"]))))
+    print('')
+
+def Main():
+
+    usage = "\n\t%prog [-j JOBS] [-m MB] [-r] [--output-format jsonl] [-o REPORT] DIR|GLOB|FILE ..."
+    cml_parser = OptionParser(usage=usage)
+    cml_parser.add_option("-j", "--jobs", action="store", type="int", dest="jobs", default=0,
+        help="number of worker processes, default = the number of CPUs")
+    cml_parser.add_option("-m", "--max-memory", action="store", type="int", dest="max_memory", default=0,
+        help="limit of the data segment of every worker in MB, default = no limit")
+    cml_parser.add_option("-r", "--recursive", action="store_true", dest="recursive", default=False,
+        help="look for recordings in the subdirectories too, and let ** in a glob match them")
+    cml_parser.add_option("--output-format", action="store", type="choice", choices=["text", "jsonl"],
+        dest="output_format", default="text",
+        help="report format[text, jsonl], default = text; jsonl writes one JSON object per file")
+    cml_parser.add_option("-o", "--output", action="store", type="string", dest="output", default="-",
+        help="file written with --output-format jsonl, default = - for stdout")
+    (opts, args) = cml_parser.parse_args(sys.argv)
+
+    filenames = findFiles(args[1:], opts.recursive)
+    if not filenames:
+        cml_parser.print_help()
+        return
+
+    callback = None
+    if opts.output_format == "text":
+        callback = reportProgress
+    results = analyzeFiles(filenames, opts.jobs or None, opts.max_memory*1024*1024, callback=callback)
+    if opts.output_format == "text":
+        reportBatch(results)
+        return
+    writer = openWriter(opts.output_format, opts.output, FIELDS)
+    try:
+        for r in results:
+            writer.write(tuple(r[f] for f in FIELDS))
+    finally:
+        writer.close()
+
+if __name__ == "__main__":
+
+    Main()
@@ -0,0 +1,188 @@
+#this Python script is used to measure how fast MPEG-2 TS streams are parsed
+
+"""Benchmarks of the parsers.
+
+benchModes() runs every TSParser mode (PAT, PMT and SIT searches, ES, PCR
+search, PID census) and TSStream.parse() over a whole file, with and
+without CRC_32 checks of the PSI sections where they apply, each in a
+fresh process, and reports packets/sec, MB/s and the peak RSS of the
+process. Without a file, a synthetic stream is written with TSGen first.
+
+benchPackets() decodes the same packets with the ctypes classes of TSStruct
+and with the TSView classes, reading the header fields, the adaptation
+field flags and the PES header of unit starts, and reports the time spent
+per packet.
+
+    python TSBench.py [-s MB] [-t 188|192|204] [-p programs] [file.ts]
+    python TSBench.py --packets 100000 file.ts
+"""
+
+import contextlib
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from optparse import OptionParser
+import TSGen
+import TSParser
+import TSStruct
+import TSView
+from TSSource import probeSync, detectSync
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+#name, TSParser mode, search item and psi_mode, or None for TSStream.parse()
+#and views, then whether the CRC_32 of PSI sections is checked
+MODES = (("PAT", "PAT", "PAT", 1, False),
+         ("PMT", "PAT", "PMT", 1, False),
+         ("PMT crc", "PAT", "PMT", 1, True),
+         ("SIT", "PAT", "SIT", 1, False),
+         ("ES", "ES", "FFF", 0, False),
+         ("PCR", "PAT", "PCR", 0, False),
+         ("PIDS", "PAT", "PIDS", 0, False),
+         ("TSStream", None, None, False, False),
+         ("TSStream crc", None, None, False, True),
+         ("TSStream views", None, None, True, False))
+
+DECODERS = (("ctypes", TSStruct.TSPacket, TSStruct.PES),
+            ("views", TSView.TSPacket, TSView.PES))
+
+def _decode(packet_type, pes_type, packets):
+    for data in packets:
+        p = packet_type(data)
+        h = p.head
+        if h.adaptation_field_ctrl & 0x2:
+            p.adaption_field.PCR_flag
+        if h.adaptation_field_ctrl & 0x1:
+            payload = p.payload
+            if h.payload_unit_start_indicator and payload[0:3] == b'\x00\x00\x01':
+                pes_type(payload).stream
+        (h.pid, h.continuity_counter)
+
+def benchPackets(packets, repeat=3):
+    """Return (name, microseconds per packet) of every decoder, the best of repeat runs"""
+    results = list()
+    for (name, packet_type, pes_type) in DECODERS:
+        best = None
+        for i in range(repeat):
+            start = time.perf_counter()
+            _decode(packet_type, pes_type, packets)
+            elapsed = time.perf_counter() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        results.append((name, best*1e6/max(len(packets), 1)))
+    return results
+
+def readPackets(filename, count=100000):
+    "Return up to count packets of filename as bytes objects"
+    with open(filename, 'rb') as f:
+        data = f.read(1024*1024)
+        (offset, size) = probeSync(data)
+        if offset < 0:
+            (offset, size) = (0, 188)
+        f.seek(offset)
+        data = f.read(count*size)
+    return [data[n:n+size] for n in range(0, len(data) - size + 1, size)]
+
+def _peakRSS():
+    "Peak resident set size of this process in bytes, or 0 when unknown"
+    if resource is None:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return rss
+    return rss*1024
+
+def _runMode(args):
+    (filename, mode, searchItem, option, verify_crc, es_pid) = args
+    filehandle = open(filename, 'rb')
+    (start, packet_size) = detectSync(filehandle)
+    with open(os.devnull, 'w') as null, contextlib.redirect_stdout(null):
+        begin = time.perf_counter()
+        if mode is None:
+            TSStruct.TSStream(option, verify_crc=verify_crc).parse(filehandle)
+        elif searchItem == "PIDS":
+            TSParser.parsePIDCensus(filehandle, packet_size, start)
+        else:
+            TSParser.parseTSMain(filehandle, packet_size, mode, es_pid, option, searchItem, start, verify_crc)
+        elapsed = time.perf_counter() - begin
+    filehandle.close()
+    return elapsed, _peakRSS()
+
+def benchModes(filename, modes=MODES, es_pid=None):
+    """Return (name, seconds, packets/sec, MB/s, peak RSS) of every mode over filename.
+
+    Every mode runs in a process of its own, so its peak RSS is not hidden
+    by the previous ones. es_pid defaults to the first TSGen video PID.
+    """
+    if es_pid is None:
+        es_pid = TSGen.PMT_PID_BASE + 1
+    with open(filename, 'rb') as f:
+        (start, packet_size) = detectSync(f)
+    size = os.path.getsize(filename) - max(start, 0)
+    packets = size // max(packet_size, 1)
+    context = multiprocessing.get_context('spawn')
+    results = list()
+    for (name, mode, searchItem, option, verify_crc) in modes:
+        pool = context.Pool(1)
+        try:
+            (elapsed, rss) = pool.apply(_runMode, ((filename, mode, searchItem, option, verify_crc, es_pid),))
+        finally:
+            pool.close()
+            pool.join()
+        results.append((name, elapsed, packets/elapsed, size/elapsed/(1024*1024), rss))
+    return results
+
+def reportModeBench(results):
+    print(('%-16s %10s %14s %10s %12s' %('mode', 'seconds', 'packets/sec', 'MB/s', 'peak RSS MB')))
+    for (name, elapsed, rate, throughput, rss) in results:
+        print(('%-16s %10.3f %14.0f %10.2f %12.1f' %(name, elapsed, rate, throughput, rss/(1024.0*1024))))
+
+def reportPacketBench(results):
+    base = results[0][1]
+    for (name, usec) in results:
+        print(('%-8s %8.2f us/packet %6.2fx' %(name, usec, base/usec)))
+
+if __name__ == "__main__":
+
+    cml_parser = OptionParser(usage="\n\t%prog [options] [FILE]")
+    cml_parser.add_option("-s", "--size", action="store", type="float", dest="size", default=20,
+        help="size in MB of the synthetic stream used without FILE, default = 20")
+    cml_parser.add_option("-t", "--type", action="store", type="int", dest="packet_size", default=188,
+        help="packet size of the synthetic stream[188, 192, 204], default = 188")
+    cml_parser.add_option("-p", "--programs", action="store", type="int", dest="programs", default=1,
+        help="number of programs of the synthetic stream, default = 1")
+    cml_parser.add_option("-a", "--audio", action="store", type="int", dest="audio_streams", default=1,
+        help="number of audio streams per program of the synthetic stream, default = 1")
+    cml_parser.add_option("-e", "--es", action="store", type="string", dest="es_pid", default=None,
+        help="PID (hex) used by the ES mode, default = 101, the first video PID of TSGen streams")
+    cml_parser.add_option("--packets", action="store", type="int", dest="packets", default=0,
+        help="only compare the ctypes and TSView decoders over this many packets")
+    (opts, args) = cml_parser.parse_args(sys.argv)
+
+    filename = None
+    if len(args) > 1:
+        filename = args[1]
+    else:
+        (fd, filename) = tempfile.mkstemp(suffix='.ts')
+        with os.fdopen(fd, 'wb') as f:
+            TSGen.TSGenerator(opts.packet_size, opts.programs, opts.audio_streams).write(
+                f, int(opts.size*1024*1024))
+    try:
+        if opts.packets:
+            packets = readPackets(filename, opts.packets)
+            print(('%d packets' %len(packets)))
+            reportPacketBench(benchPackets(packets))
+        else:
+            es_pid = None
+            if opts.es_pid is not None:
+                es_pid = int(opts.es_pid, 16)
+            print(('%s, %d bytes' %(filename, os.path.getsize(filename))))
+            reportModeBench(benchModes(filename, es_pid=es_pid))
+    finally:
+        if len(args) < 2:
+            os.remove(filename)
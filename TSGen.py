@@ -0,0 +1,235 @@
+#this Python script is used to generate synthetic MPEG-2 TS files for testing and benchmarks
+
+"""Deterministic synthetic Transport Stream generator.
+
+The stream carries a PAT, one PMT per program and a SIT, repeated every
+psi_interval frames, and per program one H.264 video PID and audio_streams
+audio PIDs. Video PES start with an access unit delimiter marking IDR
+pictures every idr_interval frames, carry PTS and DTS, and their first
+packet carries a PCR. The same arguments always give the same bytes.
+
+Every frame is padded with null packets to frame_packets packets, by
+default the most any frame needs, so the stream has a constant bitrate:
+PCR and the arrival time stamps of 192 bytes packets are the time of the
+first byte of their packet at that rate, and the stream is clean for
+TSParser -s TR101290 and -s PCRSTATS.
+
+    python TSGen.py out.ts [-s MB] [-t 188|192|204] [-p programs] [-a audio]
+"""
+
+import struct
+import sys
+from optparse import OptionParser
+from TSSection import crc32MPEG2
+
+PAT_PID = 0x0
+SIT_PID = 0x1F
+PMT_PID_BASE = 0x100
+
+NULL_PID = 0x1FFF
+
+STREAM_TYPE_H264 = 0x1B
+STREAM_TYPE_AAC = 0x0F
+
+#27 MHz ticks of one 29.97 Hz frame, and the PCR of the first packet
+FRAME_TICKS = 3003*300
+PCR_START = (90000 - 6000)*300
+
+def _section(table_id, extension, body, version=0, private=False):
+    "Long form PSI section with its CRC_32"
+    if private:
+        flags = 0xF000
+    else:
+        flags = 0xB000
+    header = struct.pack('>BHHBBB', table_id, flags | (5 + len(body) + 4), extension,
+                         0xC1 | (version << 1), 0, 0)
+    return header + body + struct.pack('>L', crc32MPEG2(header + body))
+
+def _timestamp(prefix, value):
+    "5 bytes PTS/DTS field"
+    return struct.pack('>BHH', (prefix << 4) | ((value >> 29) & 0xE) | 1,
+                       ((value >> 14) & 0xFFFE) | 1, ((value << 1) & 0xFFFE) | 1)
+
+class TSGenerator(object):
+    "Write a synthetic Transport Stream, frame by frame"
+
+    def __init__(self, packet_size=188, programs=1, audio_streams=1, frame_size=600,
+                 psi_interval=10, idr_interval=15, audio_interval=3, frame_packets=None):
+        self.packet_size = packet_size
+        self.programs = programs
+        self.audio_streams = audio_streams
+        self.frame_size = frame_size
+        self.psi_interval = psi_interval
+        self.idr_interval = idr_interval
+        self.audio_interval = audio_interval
+        self.continuity = dict()
+        self.packet_count = 0
+        if frame_packets is None:
+            frame_packets = self._framePackets()
+        #0 leaves the frames unpadded
+        self.frame_packets = frame_packets
+
+    def _framePackets(self):
+        "The most packets a frame needs, over a period of the frame patterns"
+        period = 7*self.psi_interval*self.audio_interval
+        dry = TSGenerator(self.packet_size, self.programs, self.audio_streams, self.frame_size,
+                          self.psi_interval, self.idr_interval, self.audio_interval, 0)
+        most = 0
+        for i in range(period):
+            first = dry.packet_count
+            dry.frame(i)
+            most = max(most, dry.packet_count - first)
+        return most
+
+    def clock(self, packet):
+        "27 MHz time of the first byte of packet"
+        if not self.frame_packets:
+            return PCR_START
+        return PCR_START + packet*FRAME_TICKS//self.frame_packets
+
+    def muxRate(self):
+        "Bitrate of the stream, in bits of 188 bytes packets per second"
+        return self.frame_packets*188*8*27000000.0/FRAME_TICKS
+
+    def programPIDs(self, program):
+        "Return (PMT PID, video PID, audio PIDs) of program, numbered from 1"
+        pmt = PMT_PID_BASE*program
+        return pmt, pmt + 1, [pmt + 2 + i for i in range(self.audio_streams)]
+
+    def pids(self):
+        "Every PID of the stream"
+        pids = [PAT_PID, SIT_PID]
+        for program in range(1, self.programs + 1):
+            (pmt, video, audio) = self.programPIDs(program)
+            pids.extend([pmt, video] + audio)
+        return pids
+
+    def _packet(self, out, pid, start, payload, pcr=False):
+        "Append one packet to out, with a PCR when pcr is set, return the number of payload bytes it carries"
+        field = b''
+        if pcr:
+            pcr = self.clock(self.packet_count)
+            base = pcr // 300
+            field = struct.pack('>BLH', 0x10, (base >> 1) & 0xFFFFFFFF,
+                                ((base & 1) << 15) | 0x7E00 | (pcr % 300))
+        if field or len(payload) < 184:
+            body = payload[:183 - len(field)]
+            length = 183 - len(body)
+            if length and not field:
+                field = b'\x00'
+            field = struct.pack('>B', length) + field + b'\xff'*(length - len(field))
+        else:
+            body = payload[:184]
+        control = 0
+        if field:
+            control |= 0x2
+        if body:
+            control |= 0x1
+        cc = self.continuity.get(pid, 0)
+        if body:
+            self.continuity[pid] = (cc + 1) & 0xF
+        header = struct.pack('>BHB', 0x47, (0x4000 if start else 0) | pid, (control << 4) | cc)
+        if self.packet_size == 192:
+            out += struct.pack('>L', self.clock(self.packet_count) & 0x3FFFFFFF)
+        out += header + field + body
+        if self.packet_size == 204:
+            out += b'\x00'*16
+        self.packet_count += 1
+        return len(body)
+
+    def _section(self, out, pid, section):
+        #pointer_field, then the section over as many packets as it needs
+        self._pes(out, pid, b'\x00' + section)
+
+    def _pes(self, out, pid, data, pcr=False):
+        first = True
+        while data or first:
+            if first:
+                n = self._packet(out, pid, True, data, pcr)
+            else:
+                n = self._packet(out, pid, False, data)
+            data = data[n:]
+            first = False
+
+    def _psi(self, out):
+        programs = b''.join(struct.pack('>HH', program, 0xE000 | self.programPIDs(program)[0])
+                            for program in range(1, self.programs + 1))
+        self._section(out, PAT_PID, _section(0x00, 1, struct.pack('>HH', 0, 0xE010) + programs))
+        for program in range(1, self.programs + 1):
+            (pmt, video, audio) = self.programPIDs(program)
+            body = struct.pack('>HH', 0xE000 | video, 0xF000)
+            for (stream_type, pid) in [(STREAM_TYPE_H264, video)] + [(STREAM_TYPE_AAC, p) for p in audio]:
+                body += struct.pack('>BHH', stream_type, 0xE000 | pid, 0xF003) + b'\x52\x01\x00'
+            self._section(out, pmt, _section(0x02, program, body))
+        body = struct.pack('>H', 0xF003) + b'\x63\x01\x00'
+        for program in range(1, self.programs + 1):
+            body += struct.pack('>HH', program, 0x8003) + b'\x40\x01\x41'
+        self._section(out, SIT_PID, _section(0x7F, 0xFFFF, body, private=True))
+
+    def frame(self, i):
+        "Return the packets of frame i as bytes"
+        out = bytearray()
+        pts = 90000 + i*3003
+        if i % self.idr_interval == 0:
+            aud = b'\x00\x00\x00\x01\x09\x10'
+        else:
+            aud = b'\x00\x00\x00\x01\x09\x30'
+        es = aud + bytes(bytearray((i + k) & 0xFF for k in range(self.frame_size + (i % 7)*50)))
+        video = b'\x00\x00\x01\xe0\x00\x00\x84\xc0\x0a' + _timestamp(3, pts) + _timestamp(1, pts - 3000) + es
+        #the video PES, and their PCR, lead the frame so the PCR interval stays close to one frame
+        for program in range(1, self.programs + 1):
+            self._pes(out, self.programPIDs(program)[1], video, True)
+        if i % self.audio_interval == 0:
+            for program in range(1, self.programs + 1):
+                for pid in self.programPIDs(program)[2]:
+                    self._pes(out, pid, b'\x00\x00\x01\xc0' + struct.pack('>H', 208) +
+                              b'\x84\x80\x05' + _timestamp(2, pts) + bytes(200))
+        if i % self.psi_interval == 0:
+            self._psi(out)
+        while self.packet_count < (i + 1)*self.frame_packets:
+            self._packet(out, NULL_PID, False, b'\xff'*184)
+        return bytes(out)
+
+    def write(self, filehandle, size=None, frames=None):
+        "Write frames until size bytes or frames frames are written, return the bytes written"
+        written = 0
+        i = 0
+        while (size is None or written < size) and (frames is None or i < frames):
+            data = self.frame(i)
+            filehandle.write(data)
+            written += len(data)
+            i += 1
+        return written
+
+def generate(filename, size=None, frames=None, **options):
+    "Write a synthetic stream to filename and return its TSGenerator"
+    generator = TSGenerator(**options)
+    with open(filename, 'wb') as f:
+        generator.write(f, size, frames)
+    return generator
+
+if __name__ == "__main__":
+
+    cml_parser = OptionParser(usage="\n\t%prog [options] OUTPUT")
+    cml_parser.add_option("-s", "--size", action="store", type="float", dest="size", default=10,
+        help="size of the stream in MB, default = 10")
+    cml_parser.add_option("-n", "--frames", action="store", type="int", dest="frames", default=None,
+        help="number of video frames, instead of a size")
+    cml_parser.add_option("-t", "--type", action="store", type="int", dest="packet_size", default=188,
+        help="TS packet size[188, 192, 204], default = 188")
+    cml_parser.add_option("-p", "--programs", action="store", type="int", dest="programs", default=1,
+        help="number of programs, default = 1")
+    cml_parser.add_option("-a", "--audio", action="store", type="int", dest="audio_streams", default=1,
+        help="number of audio streams per program, default = 1")
+    (opts, args) = cml_parser.parse_args(sys.argv)
+    if len(args) < 2:
+        cml_parser.print_help()
+        sys.exit(1)
+
+    size = None
+    if opts.frames is None:
+        size = int(opts.size*1024*1024)
+    generator = generate(args[1], size, opts.frames, packet_size=opts.packet_size,
+                         programs=opts.programs, audio_streams=opts.audio_streams)
+    print(('%s: %d packets, %d PIDs, %d bit/s' %(args[1], generator.packet_count, len(generator.pids()),
+                                                  generator.muxRate())))
@@ -0,0 +1,312 @@
+#this Python script is used to keep an index of a MPEG-2 TS file next to it
+
+"""Sidecar index (.tsidx) of a Transport Stream file.
+
+The index holds one record per payload unit start (packet number, byte
+offset, PID, previous payload packet of the same PID, stream_id, PTS, DTS
+and access unit type), one record per PCR (packet number, byte offset,
+PID, PCR base and extension, adaptation field flags) and one record per
+corrupt region skipped to find the sync byte again (number of the packet
+following it, its end and its length). Packets are numbered as they are
+handed out, so once bytes have been skipped the byte offset of a packet
+can not be computed from its number. Records are kept column-wise in
+array.array objects and written as raw little endian arrays, so loading
+an index is a handful of reads. The index records the size and mtime of
+the file it was built from and is ignored once either changes.
+
+An EntryPointMap keeps the IDR pictures of one elementary stream (packet
+number, byte offset, PTS and number of packets of the picture) in the same
+column-wise way, and answers seek(pts) with a binary search.
+"""
+
+import bisect
+import os
+import struct
+import sys
+from array import array
+
+NO_TIMESTAMP = -1
+
+#access unit types, as reported by TSParser.parseIndividualPESPayload(); new ones are appended
+AU_NOT_PARSED = 0
+AU_TYPES = ["", "IDR_picture", "non_IDR_picture", "Unknown AU type", None,
+            "I_picture", "P_picture", "B_picture", "IRAP_picture", "non_IRAP_picture"]
+#the access units a decoder can start from, H.264 IDR and HEVC IRAP pictures
+KEYFRAME_TYPES = ("IDR_picture", "IRAP_picture")
+
+class TSIndex(object):
+    "Column-wise index of payload unit starts and PCRs of one file"
+
+    magic = b'TSIX'
+    version = 3
+    _header = struct.Struct('<4sHHqqqqqqqq')
+    unit_columns = (('packet', 'q'), ('offset', 'q'), ('pid', 'H'), ('previous', 'q'), ('stream_id', 'B'),
+                    ('pts', 'q'), ('dts', 'q'), ('au_type', 'B'))
+    pcr_columns = (('packet', 'q'), ('offset', 'q'), ('pid', 'H'), ('base', 'q'), ('extension', 'H'), ('flags', 'B'))
+    resync_columns = (('packet', 'q'), ('offset', 'q'), ('skipped', 'q'))
+
+    def __init__(self, packet_size=188, start=0):
+        self.packet_size = packet_size
+        self.start = start
+        self.file_size = 0
+        self.mtime = 0
+        self.packet_count = 0
+        self.sync_error = -1
+        self.units = dict((name, array(code)) for (name, code) in TSIndex.unit_columns)
+        self.pcrs = dict((name, array(code)) for (name, code) in TSIndex.pcr_columns)
+        self.resyncs = dict((name, array(code)) for (name, code) in TSIndex.resync_columns)
+
+    @staticmethod
+    def indexPath(filename):
+        return filename + '.tsidx'
+
+    def addUnit(self, packet, offset, pid, previous, stream_id=0, pts=NO_TIMESTAMP, dts=NO_TIMESTAMP, au_type=AU_NOT_PARSED):
+        "Record a payload unit start, stream_id 0 standing for a PSI section"
+        u = self.units
+        u['packet'].append(packet)
+        u['offset'].append(offset)
+        u['pid'].append(pid)
+        u['previous'].append(previous)
+        u['stream_id'].append(stream_id)
+        u['pts'].append(pts)
+        u['dts'].append(dts)
+        u['au_type'].append(au_type)
+
+    def addPCR(self, packet, offset, pid, base, extension, flags):
+        p = self.pcrs
+        p['packet'].append(packet)
+        p['offset'].append(offset)
+        p['pid'].append(pid)
+        p['base'].append(base)
+        p['extension'].append(extension)
+        p['flags'].append(flags)
+
+    def addResync(self, packet, offset, skipped):
+        "Record skipped bytes, ending at offset where packet starts"
+        r = self.resyncs
+        r['packet'].append(packet)
+        r['offset'].append(offset)
+        r['skipped'].append(skipped)
+
+    def extend(self, index):
+        "Append the records of an index of the packets following the ones of this one"
+        for (name, code) in TSIndex.unit_columns:
+            self.units[name].extend(index.units[name])
+        for (name, code) in TSIndex.pcr_columns:
+            self.pcrs[name].extend(index.pcrs[name])
+        for (name, code) in TSIndex.resync_columns:
+            self.resyncs[name].extend(index.resyncs[name])
+        self.packet_count = index.packet_count
+        if index.sync_error >= 0:
+            self.sync_error = index.sync_error
+
+    def getPidManifest(self):
+        return sorted(set(self.units['pid']) | set(self.pcrs['pid']))
+
+    def unitOffsets(self, pid):
+        "Byte offsets of the payload unit starts of pid"
+        return [o for (o, q) in zip(self.units['offset'], self.units['pid']) if q == pid]
+
+    def keyframes(self, pid):
+        "Yield (packet, pts) of the IDR (or IRAP) pictures of pid"
+        u = self.units
+        idr = [AU_TYPES.index(t) for t in KEYFRAME_TYPES]
+        for i in range(len(u['packet'])):
+            if u['pid'][i] == pid and u['au_type'][i] in idr:
+                yield u['packet'][i], u['pts'][i]
+
+    def pcrSamples(self, pid=None):
+        "Yield (packet, pid, base, extension, flags) of every PCR, optionally of one pid"
+        p = self.pcrs
+        for i in range(len(p['packet'])):
+            if pid is None or p['pid'][i] == pid:
+                yield p['packet'][i], p['pid'][i], p['base'][i], p['extension'][i], p['flags'][i]
+
+    def resyncEvents(self):
+        "Yield (packet, offset, skipped) of every corrupt region skipped"
+        r = self.resyncs
+        for i in range(len(r['packet'])):
+            yield r['packet'][i], r['offset'][i], r['skipped'][i]
+
+    def stamp(self, filename):
+        "Remember size and mtime of the indexed file"
+        st = os.stat(filename)
+        self.file_size = st.st_size
+        self.mtime = st.st_mtime_ns
+
+    def matches(self, filename, packet_size):
+        "Whether the index still describes filename read with packet_size"
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return False
+        return st.st_size == self.file_size and st.st_mtime_ns == self.mtime and \
+            packet_size == self.packet_size
+
+    def _columns(self):
+        for (name, code) in TSIndex.unit_columns:
+            yield self.units[name], 'units'
+        for (name, code) in TSIndex.pcr_columns:
+            yield self.pcrs[name], 'pcrs'
+        for (name, code) in TSIndex.resync_columns:
+            yield self.resyncs[name], 'resyncs'
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(TSIndex._header.pack(TSIndex.magic, TSIndex.version, self.packet_size,
+                self.start, self.file_size, self.mtime, self.packet_count, self.sync_error,
+                len(self.units['packet']), len(self.pcrs['packet']), len(self.resyncs['packet'])))
+            for (column, table) in self._columns():
+                if sys.byteorder != 'little':
+                    column = array(column.typecode, column)
+                    column.byteswap()
+                column.tofile(f)
+
+    @classmethod
+    def load(cls, path):
+        "Load an index, return None when path is missing or not an index"
+        try:
+            f = open(path, 'rb')
+        except (IOError, OSError):
+            return None
+        with f:
+            header = f.read(TSIndex._header.size)
+            if len(header) != TSIndex._header.size:
+                return None
+            (magic, version, packet_size, start, file_size, mtime, packet_count, sync_error,
+                unit_count, pcr_count, resync_count) = TSIndex._header.unpack(header)
+            if magic != TSIndex.magic or version != TSIndex.version:
+                return None
+            index = cls(packet_size, start)
+            index.file_size = file_size
+            index.mtime = mtime
+            index.packet_count = packet_count
+            index.sync_error = sync_error
+            counts = {'units':unit_count, 'pcrs':pcr_count, 'resyncs':resync_count}
+            try:
+                for (column, table) in index._columns():
+                    column.fromfile(f, counts[table])
+                    if sys.byteorder != 'little':
+                        column.byteswap()
+            except (EOFError, ValueError):
+                #cut short, the last item partly written
+                return None
+        return index
+
+    @classmethod
+    def open(cls, filename, packet_size):
+        "Return the up to date index of filename, or None"
+        index = cls.load(TSIndex.indexPath(filename))
+        if index is not None and index.matches(filename, packet_size):
+            return index
+        return None
+
+#PTS and DTS wrap around with their 33 bits
+PTS_WRAP = 1 << 33
+
+class EntryPointMap(object):
+    "Random access points of one elementary stream, in file order"
+
+    magic = b'TSEP'
+    version = 1
+    _header = struct.Struct('<4sHHqHq')
+    columns = (('packet', 'q'), ('offset', 'q'), ('pts', 'q'), ('packets', 'q'))
+
+    def __init__(self, pid=0, packet_size=188, start=0):
+        self.pid = pid
+        self.packet_size = packet_size
+        self.start = start
+        self.entries = dict((name, array(code)) for (name, code) in EntryPointMap.columns)
+        #added to the PTS of the entries once it wrapped around
+        self._wrap = 0
+
+    def __len__(self):
+        return len(self.entries['packet'])
+
+    def add(self, packet, offset, pts, packets=0):
+        """Append an entry point; packets, the number of packets of the picture, 0 while unknown.
+
+        The 33 bits PTS is unwrapped, so the PTS column keeps growing.
+        """
+        e = self.entries
+        if len(e['pts']):
+            last = e['pts'][-1]
+            if pts + self._wrap < last - PTS_WRAP//2:
+                self._wrap += PTS_WRAP
+        e['packet'].append(packet)
+        e['offset'].append(offset)
+        e['pts'].append(pts + self._wrap)
+        e['packets'].append(packets)
+
+    def setPackets(self, packets):
+        "Set the number of packets of the last entry"
+        self.entries['packets'][-1] = packets
+
+    def entry(self, i):
+        "Return (packet, offset, pts, packets) of entry i"
+        e = self.entries
+        return e['packet'][i], e['offset'][i], e['pts'][i], e['packets'][i]
+
+    def seek(self, pts):
+        """Return (packet, offset) of the last entry point at or before pts.
+
+        pts is on the unwrapped timeline of the map; a pts before the first
+        entry gives the first one, and an empty map None.
+        """
+        if not len(self):
+            return None
+        i = max(bisect.bisect_right(self.entries['pts'], pts) - 1, 0)
+        return self.entries['packet'][i], self.entries['offset'][i]
+
+    @classmethod
+    def fromIndex(cls, index, pid):
+        "Build the map of pid from the unit records of a TSIndex"
+        entries = cls(pid, index.packet_size, index.start)
+        u = index.units
+        idr = [AU_TYPES.index(t) for t in KEYFRAME_TYPES]
+        open_entry = False
+        for i in range(len(u['packet'])):
+            if u['pid'][i] != pid or u['stream_id'][i] == 0:
+                continue
+            if open_entry:
+                entries.setPackets(u['previous'][i] - entries.entries['packet'][-1] + 1)
+                open_entry = False
+            if u['au_type'][i] in idr and u['pts'][i] != NO_TIMESTAMP:
+                entries.add(u['packet'][i], u['offset'][i], u['pts'][i])
+                open_entry = True
+        return entries
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(EntryPointMap._header.pack(EntryPointMap.magic, EntryPointMap.version,
+                self.packet_size, self.start, self.pid, len(self)))
+            for (name, code) in EntryPointMap.columns:
+                column = self.entries[name]
+                if sys.byteorder != 'little':
+                    column = array(column.typecode, column)
+                    column.byteswap()
+                column.tofile(f)
+
+    @classmethod
+    def load(cls, path):
+        "Load a map, return None when path is missing or not an entry point map"
+        try:
+            f = open(path, 'rb')
+        except (IOError, OSError):
+            return None
+        with f:
+            header = f.read(EntryPointMap._header.size)
+            if len(header) != EntryPointMap._header.size:
+                return None
+            (magic, version, packet_size, start, pid, count) = EntryPointMap._header.unpack(header)
+            if magic != EntryPointMap.magic or version != EntryPointMap.version:
+                return None
+            entries = cls(pid, packet_size, start)
+            try:
+                for (name, code) in EntryPointMap.columns:
+                    entries.entries[name].fromfile(f, count)
+                    if sys.byteorder != 'little':
+                        entries.entries[name].byteswap()
+            except (EOFError, ValueError):
+                return None
+        return entries
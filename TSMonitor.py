@@ -0,0 +1,579 @@
+#this Python script is used to monitor MPEG-2 TS streams with the indicators of ETSI TR 101 290
+
+"""TR 101 290 priority 1 and 2 monitoring.
+
+A TR101290Monitor takes the chunks of a TSSource.PacketSource and works on
+the header columns of TSVector.decodeHeaders(), so a packet is only looked
+at on its own when it belongs to a PSI PID, starts a PES of a PID listed in
+a PMT or carries a PCR. It checks
+
+    1.1 TS_sync_loss         two or more consecutive wrong sync bytes, or
+                             bytes out of phase skipped by the resync of
+                             the source, once until sync_regain good sync
+                             bytes in a row bring sync back
+    1.2 Sync_byte_error      a packet without 0x47, or bytes skipped by the
+                             resync of the source
+    1.3 PAT_error            no PAT section on PID 0 for 0.5 s, another
+                             table_id on PID 0, or PID 0 scrambled
+    1.4 Continuity_count_error
+                             a packet lost, out of order or sent more than
+                             twice, unless discontinuity_indicator is set
+    1.5 PMT_error            no PMT section on a PMT PID of the PAT for
+                             0.5 s, or a PMT PID scrambled
+    1.6 PID_error            no packet of a PID listed in a PMT for pid_timeout
+    2.1 Transport_error      transport_error_indicator set
+    2.2 CRC_error            a PAT, CAT or PMT section with a wrong CRC_32
+    2.3a PCR_repetition_error
+                             PCRs of a PID more than 40 ms apart
+    2.3b PCR_discontinuity_indicator_error
+                             a PCR jumping back or by more than 100 ms
+                             without discontinuity_indicator
+    2.4 PCR_accuracy_error   a PCR more than 500 ns off the constant bitrate
+                             line through its neighbours
+    2.5 PTS_error            no PTS on a video or audio PID for 0.7 s
+    2.6 CAT_error            scrambled packets without any CAT, or another
+                             table_id on PID 1
+
+A packet whose sync byte alone is wrong, between two right ones, is
+checked as any other one; the source should hand it out instead of
+skipping it (PacketSource.keep_sync_errors), or it shows up as a
+Continuity_count_error too. Counters are kept by indicator and PID; the first max_events errors of
+every indicator are also kept as (packet number, PID, time). Times are
+seconds from the first PCR, on the timeline of the first PCR PID: a packet
+gets the time of its byte position between the PCRs around it, and the
+timeline runs on at the last bitrate over PCR discontinuities. Errors met
+before the first PCR have no time, and the time based checks start there.
+"""
+
+import bisect
+from TSSource import prefixLength
+from TSVector import decodeHeaders
+from TSPCR import PCR_HZ, PCR_WRAP, PCRStatistics, pcrColumns
+from TSSection import SectionAssembler, SectionCache, sectionCRCValid, decodePAT, decodePMT
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+INDICATORS = (("1.1", "TS_sync_loss"),
+              ("1.2", "Sync_byte_error"),
+              ("1.3", "PAT_error"),
+              ("1.4", "Continuity_count_error"),
+              ("1.5", "PMT_error"),
+              ("1.6", "PID_error"),
+              ("2.1", "Transport_error"),
+              ("2.2", "CRC_error"),
+              ("2.3a", "PCR_repetition_error"),
+              ("2.3b", "PCR_discontinuity_indicator_error"),
+              ("2.4", "PCR_accuracy_error"),
+              ("2.5", "PTS_error"),
+              ("2.6", "CAT_error"))
+
+NULL_PID = 0x1FFF
+CAT_PID = 0x1
+
+#stream_type of the video and audio PES which carry a PTS at least every 0.7 s
+PTS_STREAM_TYPES = frozenset((0x01, 0x02, 0x03, 0x04, 0x0F, 0x10, 0x11, 0x1B, 0x24, 0x42, 0x81, 0x87))
+
+#stream_id of PES without the optional header, which carry no PTS
+_NO_PES_HEADER = frozenset((0xBC, 0xBE, 0xBF, 0xF0, 0xF1, 0xF2, 0xF8, 0xFF))
+
+class _Watch(object):
+    "Something which has to occur every limit seconds"
+    __slots__ = ('last', 'limit', 'flagged')
+
+    def __init__(self, last, limit):
+        self.last = last
+        self.limit = limit
+        #whether the current gap has been reported already
+        self.flagged = False
+
+class TR101290Monitor(object):
+    "Check the TR 101 290 priority 1 and 2 indicators of a stream, chunk by chunk"
+
+    #consecutive wrong sync bytes which lose sync, and right ones which regain it
+    sync_loss = 2
+    sync_regain = 5
+
+    def __init__(self, packet_size=188, pat_interval=0.5, pmt_interval=0.5, pid_timeout=5.0,
+                 pts_interval=0.7, max_events=1000, **options):
+        self.packet_size = packet_size
+        self.pat_interval = pat_interval
+        self.pmt_interval = pmt_interval
+        self.pid_timeout = pid_timeout
+        self.pts_interval = pts_interval
+        self.max_events = max_events
+        #PCRStatistics options
+        self.options = options
+        #called with (indicator, pid, packet, time) for every error
+        self.event_callback = None
+        self.packets = 0
+        self.counts = dict((indicator, dict()) for (indicator, name) in INDICATORS)
+        self.events = dict((indicator, list()) for (indicator, name) in INDICATORS)
+        #sync state, and the wrong and right sync bytes in a row up to the last packet
+        self.in_sync = True
+        self._bad_syncs = 0
+        self._good_syncs = 0
+        #last continuity_counter by PID, and whether that packet was a repetition
+        self._cc = dict()
+        self._repeated = dict()
+        self.pcrs = dict()
+        #the reference clock: PID, last PCR and the (offset, time, bytes per second) samples of the chunk
+        self._clock_pid = None
+        self._clock_pcr = None
+        self._clock = ([], [], [])
+        self.assemblers = dict()
+        self.sections = SectionCache()
+        #PMT PIDs by program, PES PIDs and the ones of them carrying PTS
+        self.pmt_pids = dict()
+        #the last PMT of every program: PMT PID, PCR PID and (PID, stream_type) of its streams
+        self.programs = dict()
+        self.es_pids = set()
+        self.pts_pids = set()
+        self.cat_seen = False
+        self._cat_flagged = False
+        self._watch = {("1.3", 0):_Watch(None, pat_interval)}
+
+    def _error(self, indicator, pid, packet, time=None):
+        counts = self.counts[indicator]
+        counts[pid] = counts.get(pid, 0) + 1
+        events = self.events[indicator]
+        if len(events) < self.max_events:
+            events.append((packet, pid, time))
+        if self.event_callback is not None:
+            self.event_callback(indicator, pid, packet, time)
+
+    def syncLost(self, offset, skipped):
+        "resync_callback of the source: sync found again at offset after skipped bytes"
+        t = self._time(offset)
+        #whole packets skipped in phase are as many wrong sync bytes, bytes out of phase lose sync
+        if skipped % self.packet_size == 0:
+            errors = skipped // self.packet_size
+            for i in range(errors):
+                self._error("1.2", None, self.packets, t)
+        else:
+            errors = self.sync_loss
+            self._error("1.2", None, self.packets, t)
+        self._syncErrors(errors, self.packets, t)
+
+    def _syncErrors(self, errors, packet, t):
+        "Account for errors wrong sync bytes in a row, the last one at packet"
+        self._good_syncs = 0
+        self._bad_syncs += errors
+        if self.in_sync and self._bad_syncs >= self.sync_loss:
+            self.in_sync = False
+            self._error("1.1", None, packet, t)
+
+    def _goodSyncs(self, count):
+        "Account for count right sync bytes in a row"
+        if count <= 0:
+            return
+        self._bad_syncs = 0
+        self._good_syncs += count
+        if not self.in_sync and self._good_syncs >= self.sync_regain:
+            self.in_sync = True
+
+    def _syncBytes(self, offset, first, count, bad):
+        """Follow the sync state over the count packets of a chunk, bad being the ones with a wrong sync byte.
+
+        Return the ones of bad between two right sync bytes, whose header is used.
+        """
+        lone = list()
+        previous = -1
+        for (j, i) in enumerate(bad):
+            self._goodSyncs(i - previous - 1)
+            t = self._times(offset, [i])[0]
+            if t is not None and t != t:
+                t = None
+            self._syncErrors(1, first + i, t)
+            if self._bad_syncs == 1 and (j + 1 == len(bad) or bad[j+1] != i + 1):
+                lone.append(i)
+            previous = i
+        self._goodSyncs(count - previous - 1)
+        return lone
+
+    def _time(self, offset):
+        "Time of the packet at offset, None before the first PCR"
+        (offsets, times, rates) = self._clock
+        i = bisect.bisect_right(offsets, offset) - 1
+        if i < 0:
+            return None
+        if rates[i]:
+            return times[i] + (offset - offsets[i])/rates[i]
+        return times[i]
+
+    def _times(self, offset, indices):
+        "Times of the packets indices of the chunk at offset, None (NaN with NumPy) before the first PCR"
+        size = self.packet_size
+        if numpy is None or not len(self._clock[0]):
+            return [self._time(offset + i*size) for i in indices]
+        (offsets, times, rates) = [numpy.array(c, dtype=numpy.float64) for c in self._clock]
+        positions = offset + numpy.asarray(indices, dtype=numpy.float64)*size
+        j = numpy.searchsorted(offsets, positions, side='right') - 1
+        known = j >= 0
+        j = numpy.maximum(j, 0)
+        rate = rates[j]
+        result = times[j] + numpy.where(rate > 0, (positions - offsets[j])/numpy.where(rate > 0, rate, 1), 0)
+        return numpy.where(known, result, numpy.nan)
+
+    def _tick(self, offset, pcr, discontinuity):
+        "Account for a PCR of the reference PID at offset"
+        (offsets, times, rates) = self._clock
+        if not offsets:
+            (time, rate) = (0.0, 0.0)
+        else:
+            (time, rate) = (times[-1], rates[-1])
+            interval = float((pcr - self._clock_pcr) % PCR_WRAP)/PCR_HZ
+            if discontinuity or interval <= 0 or interval > 1.0:
+                #the timeline runs on over the discontinuity
+                if rate:
+                    time += (offset - offsets[-1])/rate
+            else:
+                time += interval
+                rate = (offset - offsets[-1])/interval
+        self._clock_pcr = pcr
+        offsets.append(offset)
+        times.append(time)
+        rates.append(rate)
+
+    def update(self, data, start, count, offset, columns=None):
+        """Account for the count packets at data[start:], offset being the file offset of data[start].
+
+        columns are their header columns, when already decoded.
+        """
+        if count <= 0:
+            return
+        first = self.packets
+        if columns is None:
+            columns = decodeHeaders(data, self.packet_size, start, count)
+        #the clock samples of the chunk, after the last one of the chunk before
+        (offsets, times, rates) = self._clock
+        self._clock = (offsets[-1:], times[-1:], rates[-1:])
+        self._updatePCR(data, start, count, offset, first)
+        #the PIDs listed by the PSI of the chunk are checked in the same chunk
+        self._updatePSI(data, start, offset, first, columns)
+        if numpy is not None:
+            self._updateNumpy(data, start, count, offset, first, columns)
+        else:
+            self._updateBytes(data, start, count, offset, first, columns)
+        self.packets += count
+        self._timeouts(self._time(offset + (count - 1)*self.packet_size), first + count - 1)
+
+    def _updatePCR(self, data, start, count, offset, first):
+        size = self.packet_size
+        columns = pcrColumns(data, size, start, count)
+        for j in range(len(columns)):
+            pid = int(columns.pid[j])
+            position = offset + columns.index[j]*size
+            if self._clock_pid is None:
+                self._clock_pid = pid
+            if pid == self._clock_pid:
+                self._tick(position, columns.pcr[j], columns.discontinuity[j])
+            try:
+                stats = self.pcrs[pid]
+            except KeyError:
+                stats = self.pcrs[pid] = PCRStatistics(pid, **self.options)
+            before = (stats.interval_violations, stats.jumps, stats.accuracy_violations)
+            stats.add(position, columns.pcr[j], columns.discontinuity[j])
+            after = (stats.interval_violations, stats.jumps, stats.accuracy_violations)
+            if after != before:
+                packet = first + columns.index[j]
+                t = self._time(position)
+                for (indicator, b, a) in zip(("2.3a", "2.3b", "2.4"), before, after):
+                    if a != b:
+                        self._error(indicator, pid, packet, t)
+        if self._watch[("1.3", 0)].last is None and self._clock[0]:
+            #PAT sections are due from the first PCR on
+            self._watch[("1.3", 0)].last = self._clock[1][0]
+
+    def _report(self, indicator, offset, first, indices, pids):
+        "Report an error for every packet of indices, pids being their PIDs"
+        if not len(indices):
+            return
+        times = self._times(offset, indices)
+        for (i, pid, t) in zip(indices, pids, times):
+            if t is not None and t != t:
+                t = None
+            self._error(indicator, int(pid), first + int(i), t)
+
+    def _updateNumpy(self, data, start, count, offset, first, columns):
+        size = self.packet_size
+        o = prefixLength(size)
+        sync = columns.syncByte
+        pid = columns.pid
+        afc = columns.adaptation_field_ctrl
+        tei = columns.transport_error_indicator
+        bad = numpy.flatnonzero(sync != 0x47)
+        self._report("1.2", offset, first, bad, pid[bad])
+        usable = sync == 0x47
+        usable[self._syncBytes(offset, first, count, bad.tolist())] = True
+        errors = numpy.flatnonzero(usable & (tei != 0))
+        self._report("2.1", offset, first, errors, pid[errors])
+        #as in _updateBytes, nothing else is checked on a packet with transport_error_indicator set
+        usable &= tei == 0
+
+        if not self.cat_seen and not self._cat_flagged:
+            scrambled = numpy.flatnonzero((columns.scrambling_control != 0) & (pid != NULL_PID) & usable)
+            if len(scrambled):
+                self._cat_flagged = True
+                self._report("2.6", offset, first, scrambled[:1], pid[scrambled[:1]])
+
+        #continuity_counter of the payload packets, PID by PID in packet order
+        packets = numpy.frombuffer(data, dtype=numpy.uint8, count=count*size, offset=start).reshape(count, size)
+        discontinuity = ((afc & 0x2) != 0) & (packets[:, o+4] > 0) & ((packets[:, o+5] & 0x80) != 0)
+        selected = numpy.flatnonzero(((afc & 0x1) != 0) & (pid != NULL_PID) & usable)
+        if len(selected):
+            order = numpy.argsort(pid[selected], kind='stable')
+            selected = selected[order]
+            grouped = pid[selected]
+            cc = columns.continuity_counter[selected].astype(numpy.int16)
+            starts = numpy.ones(len(grouped), dtype=bool)
+            starts[1:] = grouped[1:] != grouped[:-1]
+            previous = numpy.empty_like(cc)
+            previous[1:] = cc[:-1]
+            heads = numpy.flatnonzero(starts)
+            for j in heads.tolist():
+                previous[j] = self._cc.get(int(grouped[j]), -1)
+            repeated = cc == previous
+            repeated_before = numpy.empty_like(repeated)
+            repeated_before[1:] = repeated[:-1]
+            for j in heads.tolist():
+                repeated_before[j] = self._repeated.get(int(grouped[j]), False)
+            ok = (previous < 0) | discontinuity[selected] | (cc == ((previous + 1) & 0xF)) | \
+                (repeated & ~repeated_before)
+            for j in numpy.flatnonzero(numpy.append(starts[1:], True)).tolist():
+                self._cc[int(grouped[j])] = int(cc[j])
+                self._repeated[int(grouped[j])] = bool(repeated[j])
+            wrong = numpy.sort(selected[~ok])
+            self._report("1.4", offset, first, wrong, pid[wrong])
+
+        #a packet of every PES PID is due every pid_timeout
+        for p in self.es_pids:
+            self._occurrences(("1.6", p), offset, first, numpy.flatnonzero((pid == p) & usable))
+
+    def _updateBytes(self, data, start, count, offset, first, columns):
+        size = self.packet_size
+        o = start + prefixLength(size)
+        sync = columns.syncByte
+        pids = columns.pid
+        afc = columns.adaptation_field_ctrl
+        tei = columns.transport_error_indicator
+        cc = columns.continuity_counter
+        es = dict((p, list()) for p in self.es_pids)
+        lone = set(self._syncBytes(offset, first, count, [i for i in range(count) if sync[i] != 0x47]))
+        for i in range(count):
+            pid = pids[i]
+            if sync[i] != 0x47:
+                self._report("1.2", offset, first, [i], [pid])
+                if i not in lone:
+                    continue
+            if tei[i]:
+                self._report("2.1", offset, first, [i], [pid])
+                continue
+            if columns.scrambling_control[i] and pid != NULL_PID and not self.cat_seen and not self._cat_flagged:
+                self._cat_flagged = True
+                self._report("2.6", offset, first, [i], [pid])
+            if pid in es:
+                es[pid].append(i)
+            if not afc[i] & 0x1 or pid == NULL_PID:
+                continue
+            n = o + i*size
+            discontinuity = afc[i] & 0x2 and data[n+4] > 0 and data[n+5] & 0x80
+            previous = self._cc.get(pid, -1)
+            repeated = cc[i] == previous
+            if not (previous < 0 or discontinuity or cc[i] == (previous + 1) & 0xF or \
+                    (repeated and not self._repeated.get(pid, False))):
+                self._report("1.4", offset, first, [i], [pid])
+            self._cc[pid] = cc[i]
+            self._repeated[pid] = repeated
+        for (p, indices) in es.items():
+            self._occurrences(("1.6", p), offset, first, indices)
+
+    def _psiPIDs(self):
+        pids = set(self.pmt_pids.values())
+        pids.update((0, CAT_PID))
+        return pids
+
+    def _updatePSI(self, data, start, offset, first, columns):
+        "Assemble the sections of the PSI PIDs, and look at the PES starts of the PTS PIDs"
+        size = self.packet_size
+        o = start + prefixLength(size)
+        psi = self._psiPIDs()
+        wanted = (psi, set(self.pts_pids))
+        indices = self._selectPackets(columns, psi, self.pts_pids, 0)
+        occurred = dict()
+        j = 0
+        while j < len(indices):
+            i = indices[j]
+            j += 1
+            pid = int(columns.pid[i])
+            n = o + i*size
+            if columns.scrambling_control[i]:
+                if pid == 0:
+                    self._report("1.3", offset, first, [i], [pid])
+                elif pid in self.pmt_pids.values():
+                    self._report("1.5", offset, first, [i], [pid])
+                continue
+            afc = columns.adaptation_field_ctrl[i]
+            if columns.transport_error_indicator[i] or not afc & 0x1:
+                continue
+            k = n + 4
+            if afc & 0x2:
+                k += 1 + data[k]
+            payload = data[k:n+188]
+            unit_start = columns.payload_unit_start_indicator[i]
+            if pid not in psi:
+                if unit_start and _hasPTS(payload):
+                    occurred.setdefault(("2.5", pid), list()).append(i)
+                continue
+            try:
+                assembler = self.assemblers[pid]
+            except KeyError:
+                assembler = self.assemblers[pid] = SectionAssembler()
+            sections = assembler.feed(payload, unit_start)
+            for section in sections:
+                key = self._section(pid, section, offset, first, i)
+                if key is not None:
+                    occurred.setdefault(key, list()).append(i)
+            if sections and (self._psiPIDs(), self.pts_pids) != wanted:
+                #a new PAT or PMT, the rest of the chunk is selected again
+                psi = self._psiPIDs()
+                wanted = (psi, set(self.pts_pids))
+                indices = self._selectPackets(columns, psi, self.pts_pids, i + 1)
+                j = 0
+        for (key, indices) in occurred.items():
+            self._occurrences(key, offset, first, indices)
+
+    def _selectPackets(self, columns, psi, pes, begin):
+        "Indices of the packets of the psi PIDs and of the PES starts of the pes PIDs in the chunk, from begin on"
+        if numpy is not None:
+            pid = columns.pid[begin:]
+            wanted = numpy.isin(pid, list(psi)) | \
+                (numpy.isin(pid, list(pes)) & (columns.payload_unit_start_indicator[begin:] != 0))
+            return (numpy.flatnonzero(wanted & (columns.syncByte[begin:] == 0x47)) + begin).tolist()
+        return [i for i in range(begin, len(columns)) if columns.syncByte[i] == 0x47 and \
+                (columns.pid[i] in psi or (columns.pid[i] in pes and columns.payload_unit_start_indicator[i]))]
+
+    def _section(self, pid, section, offset, first, i):
+        "Check a section of a PSI PID, return the key of the watch it satisfies"
+        table_id = section[0]
+        key = None
+        if pid == 0:
+            if table_id != 0x00:
+                self._report("1.3", offset, first, [i], [pid])
+                return None
+            key = ("1.3", 0)
+        elif pid == CAT_PID:
+            if table_id != 0x01:
+                self._report("2.6", offset, first, [i], [pid])
+                return None
+            self.cat_seen = True
+        elif table_id == 0x02:
+            key = ("1.5", pid)
+        if not sectionCRCValid(section, 0):
+            self._report("2.2", offset, first, [i], [pid])
+            return None
+        if self.sections.isNew(pid, section, 0):
+            t = self._times(offset, [i])[0]
+            if t is not None and t != t:
+                t = None
+            try:
+                if table_id == 0x00:
+                    self._learnPAT(decodePAT(section), t)
+                elif table_id == 0x02:
+                    self._learnPMT(pid, decodePMT(section), t)
+            except ValueError:
+                pass
+        return key
+
+    def _learnPAT(self, pat, t):
+        for p in pat.program_list:
+            if p["program_number"] == 0:
+                continue
+            self.pmt_pids[p["program_number"]] = p["pid"]
+            self._watch.setdefault(("1.5", p["pid"]), _Watch(t, self.pmt_interval))
+
+    def _learnPMT(self, pmt_pid, pmt, t):
+        self.programs[pmt.program_number] = {"pmt_pid":pmt_pid,
+                                             "pcr_pid":pmt.PCR_PID,
+                                             "streams":[(es["elementary_PID"], es["stream_type"]) for es in pmt.es_list]}
+        for es in pmt.es_list:
+            pid = es["elementary_PID"]
+            self.es_pids.add(pid)
+            self._watch.setdefault(("1.6", pid), _Watch(t, self.pid_timeout))
+            if es["stream_type"] in PTS_STREAM_TYPES:
+                self.pts_pids.add(pid)
+                self._watch.setdefault(("2.5", pid), _Watch(t, self.pts_interval))
+
+    def _occurrences(self, key, offset, first, indices):
+        "Account for the packets indices of the chunk which satisfy the watch key"
+        if not len(indices):
+            return
+        watch = self._watch.get(key)
+        if watch is None:
+            return
+        (indicator, pid) = key
+        times = self._times(offset, indices)
+        if numpy is not None:
+            times = numpy.asarray(times, dtype=numpy.float64)
+            known = ~numpy.isnan(times)
+            indices = numpy.asarray(indices)[known]
+            times = times[known]
+            if not len(times):
+                return
+            previous = numpy.empty_like(times)
+            previous[1:] = times[:-1]
+            previous[0] = times[0] if watch.last is None else watch.last
+            late = numpy.flatnonzero(times - previous > watch.limit).tolist()
+            if late and late[0] == 0 and watch.flagged:
+                late = late[1:]
+            self._report(indicator, offset, first, indices[late], [pid]*len(late))
+            watch.last = float(times[-1])
+        else:
+            for (i, t) in zip(indices, times):
+                if t is None:
+                    continue
+                if watch.last is not None and t - watch.last > watch.limit and not watch.flagged:
+                    self._error(indicator, pid, first + i, t)
+                watch.last = t
+                watch.flagged = False
+        watch.flagged = False
+
+    def _timeouts(self, t, packet):
+        "Report what is overdue at time t, once per gap"
+        if t is None:
+            return
+        for ((indicator, pid), watch) in self._watch.items():
+            if watch.last is not None and not watch.flagged and t - watch.last > watch.limit:
+                watch.flagged = True
+                self._error(indicator, pid, packet, t)
+
+    def analyze(self, source):
+        "Run over every chunk of a TSSource.PacketSource, reporting its resyncs as sync losses"
+        source.resync_callback = self.syncLost
+        source.keep_sync_errors = True
+        for (data, start, count) in source.chunks():
+            self.update(data, start, count, source.offset(start))
+        return self
+
+    def report(self):
+        "Return one dict per indicator, in TR 101 290 order"
+        rows = list()
+        for (indicator, name) in INDICATORS:
+            counts = self.counts[indicator]
+            rows.append({"indicator":indicator,
+                         "name":name,
+                         "priority":int(indicator[0]),
+                         "count":sum(counts.values()),
+                         "pids":dict(counts),
+                         "events":list(self.events[indicator])})
+        return rows
+
+def _hasPTS(payload):
+    "Whether the PES starting at payload carries a PTS"
+    if len(payload) < 8 or payload[0] != 0 or payload[1] != 0 or payload[2] != 1:
+        return False
+    if payload[3] in _NO_PES_HEADER:
+        return False
+    return bool(payload[7] & 0x80)
@@ -0,0 +1,181 @@
+#this Python script is used to find the access unit type of H.264 and HEVC elementary streams
+
+"""Start code scanning of H.264 and HEVC PES payload.
+
+nalUnits() finds the NAL units of a payload held in memory with
+bytes.find(), one call per start code, so the bytes between two NAL
+units are never looked at from Python. accessUnitType() classifies the
+access unit at the start of a payload:
+
+    H.264  IDR_picture for an IDR slice, else I_picture, P_picture or
+           B_picture from the slice_type of its slices (SP and SI slices
+           counting as P and I), B meaning at least one B slice
+    HEVC   IRAP_picture for a BLA, IDR or CRA picture, else
+           non_IRAP_picture, from the nal_unit_type of its first slice
+
+The access unit ends at the next access unit delimiter. Without a slice in
+data, the type comes from the access unit delimiter: an AUD can not tell
+an IDR picture from other I pictures, so as TSParser always did a
+primary_pic_type (pic_type for HEVC) of 0, I slices only, is taken for
+IDR_picture (IRAP_picture), any other one for non_IDR_picture
+(non_IRAP_picture). "Unknown AU type" is returned when data has no start
+code at all, None when none of its NAL units tells the type.
+
+classifyAccessUnit() also tells whether the type is final, that is
+whether more of the access unit than data holds could not change it: an
+IDR slice, a B slice, slices of every type the primary_pic_type allows,
+the first HEVC slice or the next access unit delimiter settle it.
+"""
+
+START_CODE = b'\x00\x00\x01'
+
+H264 = "H.264"
+HEVC = "HEVC"
+
+#nal_unit_type of H.264
+H264_SLICE = 1
+H264_IDR = 5
+H264_AUD = 9
+
+#nal_unit_type of HEVC: VCL below 32, IRAP from 16 to 23
+HEVC_VCL_END = 32
+HEVC_IRAP = range(16, 24)
+HEVC_AUD = 35
+#the ones an access unit without delimiter may begin with: TRAIL, RASL
+#and RADL, IRAP, VPS, SPS, PPS and prefix SEI
+_HEVC_FIRST = frozenset([0, 1, 6, 7, 8, 9] + list(HEVC_IRAP) + [32, 33, 34, 39])
+
+#slice_type % 5 of H.264 (P, B, I, SP, SI), ranked I < P < B
+_SLICE_RANK = (1, 2, 0, 1, 0)
+_RANK_TYPES = ("I_picture", "P_picture", "B_picture")
+#highest rank of the slice types every primary_pic_type allows
+_PIC_TYPE_RANK = (0, 1, 2, 0, 1, 0, 1, 2)
+
+def nalUnits(data, start=0, end=None):
+    "Yield the offset of every NAL unit header in data[start:end], just past its 00 00 01 start code"
+    if end is None:
+        end = len(data)
+    find = data.find
+    n = find(START_CODE, start, end)
+    while n >= 0:
+        n += 3
+        if n >= end:
+            return
+        yield n
+        n = find(START_CODE, n, end)
+
+def detectCodec(data, n, end=None):
+    """H.264 or HEVC from the NAL unit header at data[n], None when it does not tell.
+
+    An access unit delimiter tells either. Without one, a HEVC slice,
+    parameter set or prefix SEI header is told by its second byte,
+    nuh_layer_id 0 and a nuh_temporal_id_plus1 from 1 to 7: an H.264 NAL
+    unit whose first byte reads as one of these types is not a slice or
+    parameter set, or does not go on with such a byte.
+    """
+    if end is None:
+        end = len(data)
+    if data[n] == H264_AUD:
+        return H264
+    if (data[n] >> 1) & 0x3F == HEVC_AUD:
+        return HEVC
+    if n + 1 < end and not data[n] & 0x81 and 1 <= data[n+1] <= 7 and \
+            (data[n] >> 1) & 0x3F in _HEVC_FIRST:
+        return HEVC
+    return None
+
+def _ue(bits, pos):
+    "Decode the Exp-Golomb ue(v) at pos of a string of bits, return (value, next pos) or None"
+    one = bits.find('1', pos)
+    if one < 0:
+        return None
+    zeros = one - pos
+    end = one + 1 + zeros
+    if end > len(bits):
+        return None
+    return ((1 << zeros) - 1 + int(bits[one+1:end] or '0', 2), end)
+
+def sliceType(data, n, end):
+    "slice_type % 5 of the H.264 slice whose header is at data[n], None when it does not fit before end"
+    #first_mb_in_slice and slice_type fit in 8 bytes, emulation prevention bytes removed
+    window = bytes(data[n+1:min(n + 9, end)]).replace(b'\x00\x00\x03', b'\x00\x00')
+    bits = ''.join(['{0:08b}'.format(b) for b in window])
+    first_mb = _ue(bits, 0)
+    if first_mb is None:
+        return None
+    slice_type = _ue(bits, first_mb[1])
+    if slice_type is None:
+        return None
+    return slice_type[0] % 5
+
+def _h264Type(data, units, end):
+    rank = None
+    aud = None
+    final = False
+    for n in units:
+        nal_unit_type = data[n] & 0x1F
+        if nal_unit_type == H264_IDR:
+            return "IDR_picture", True
+        if nal_unit_type == H264_SLICE:
+            slice_type = sliceType(data, n, end)
+            if slice_type is not None:
+                rank = max(rank, _SLICE_RANK[slice_type]) if rank is not None else _SLICE_RANK[slice_type]
+                if rank == len(_RANK_TYPES) - 1:
+                    return _RANK_TYPES[rank], True
+        elif nal_unit_type == H264_AUD:
+            if aud is not None or rank is not None:
+                #the next access unit
+                final = True
+                break
+            if n + 1 < end:
+                aud = data[n+1] >> 5
+    if rank is not None:
+        return _RANK_TYPES[rank], final or (aud is not None and rank >= _PIC_TYPE_RANK[aud])
+    if aud is not None:
+        return ("IDR_picture" if aud == 0 else "non_IDR_picture"), final
+    return None, final
+
+def _hevcType(data, units, end):
+    aud = None
+    final = False
+    for n in units:
+        nal_unit_type = (data[n] >> 1) & 0x3F
+        if nal_unit_type < HEVC_VCL_END:
+            return ("IRAP_picture" if nal_unit_type in HEVC_IRAP else "non_IRAP_picture"), True
+        if nal_unit_type == HEVC_AUD:
+            if aud is not None:
+                final = True
+                break
+            if n + 2 < end:
+                aud = data[n+2] >> 5
+    if aud is not None:
+        return ("IRAP_picture" if aud == 0 else "non_IRAP_picture"), final
+    return None, final
+
+def classifyAccessUnit(data, start=0, end=None, codec=None):
+    """Return (type, final) of the access unit at data[start:end], see the module docstring.
+
+    codec is H264 or HEVC, detected from the first NAL unit header when
+    None, H.264 being taken when that does not tell.
+    """
+    if end is None:
+        end = len(data)
+    units = nalUnits(data, start, end)
+    n = next(units, None)
+    if n is None:
+        return "Unknown AU type", False
+    if codec is None:
+        codec = detectCodec(data, n, end) or H264
+
+    def every():
+        yield n
+        for m in units:
+            yield m
+
+    if codec == HEVC:
+        return _hevcType(data, every(), end)
+    return _h264Type(data, every(), end)
+
+def accessUnitType(data, start=0, end=None, codec=None):
+    "Return the type of the access unit at data[start:end], see classifyAccessUnit()"
+    return classifyAccessUnit(data, start, end, codec)[0]
@@ -0,0 +1,176 @@
+#this Python script is used to write the events found in MPEG-2 TS files in machine readable formats
+
+"""Buffered event writers.
+
+Every writer takes rows, tuples in the order of its fields, and writes
+them in batches instead of one print() per event:
+
+    jsonl  one JSON object per line
+    csv    a header line, then one line per row
+    npz    one NumPy array per field, written by numpy.savez() on close;
+           strings are stored as int codes into a <field>_names array,
+           None as -1
+
+PCR_FIELDS and PES_FIELDS are the rows of the PCR search and of the ES
+mode of TSParser.
+"""
+
+import csv
+import json
+import sys
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+FORMATS = ("text", "jsonl", "csv", "npz")
+
+PCR_FIELDS = ("packet", "pid", "pcr_base", "pcr_ext", "discontinuity")
+PES_FIELDS = ("packet", "pid", "stream_id", "pts", "au_type")
+
+class EventWriter(object):
+    "Collect rows and hand them to _flush() batch_size at a time"
+
+    batch_size = 65536
+
+    def __init__(self, filehandle, fields, close_file=True):
+        self.filehandle = filehandle
+        #False for stdout, which is only flushed by close()
+        self.close_file = close_file
+        self.fields = tuple(fields)
+        self.rows = list()
+        self.count = 0
+        #a TSStats.Stats whose output stage times the batches written
+        self.stats = None
+
+    def write(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            if self.stats is None:
+                self._flush(self.rows)
+            else:
+                begin = self.stats.clock()
+                self._flush(self.rows)
+                self.stats.add("output", begin)
+            self.count += len(self.rows)
+            self.rows = list()
+
+    def _flush(self, rows):
+        "Implement in subclass"
+        raise NotImplementedError
+
+    def close(self):
+        self.flush()
+        if self.close_file:
+            self.filehandle.close()
+        else:
+            self.filehandle.flush()
+
+def _jsonValue(value):
+    if value is None:
+        return 'null'
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    if isinstance(value, int):
+        return str(value)
+    return json.dumps(value)
+
+class JSONLinesWriter(EventWriter):
+
+    def __init__(self, filehandle, fields, close_file=True):
+        super(JSONLinesWriter, self).__init__(filehandle, fields, close_file)
+        #'{"packet":%s,"pid":%s}\n', filled with the JSON of every value
+        self.template = '{' + ','.join('%s:%%s' %json.dumps(f) for f in self.fields) + '}\n'
+
+    def _flush(self, rows):
+        #converted column by column, so int columns take one map(str) each
+        columns = list()
+        for values in zip(*rows):
+            if set(map(type, values)) == {int}:
+                columns.append(map(str, values))
+            else:
+                columns.append(map(_jsonValue, values))
+        template = self.template
+        self.filehandle.write(''.join([template %row for row in zip(*columns)]))
+
+class CSVWriter(EventWriter):
+
+    def __init__(self, filehandle, fields, close_file=True):
+        super(CSVWriter, self).__init__(filehandle, fields, close_file)
+        self.writer = csv.writer(filehandle, lineterminator='\n')
+        self.writer.writerow(self.fields)
+
+    def _flush(self, rows):
+        self.writer.writerows(rows)
+
+class NPZWriter(EventWriter):
+    "Keep one array.array per field, and save them all on close"
+
+    def __init__(self, filehandle, fields, close_file=True):
+        if numpy is None:
+            raise RuntimeError('npz output needs NumPy')
+        super(NPZWriter, self).__init__(filehandle, fields, close_file)
+        self.columns = [array('q') for f in self.fields]
+        #code by string, per field holding strings
+        self.names = dict()
+
+    def _code(self, field, value):
+        codes = self.names.setdefault(field, dict())
+        return codes.setdefault(value, len(codes))
+
+    def _flush(self, rows):
+        for (i, column) in enumerate(self.columns):
+            values = [row[i] for row in rows]
+            try:
+                values = array('q', values)
+            except TypeError:
+                values = self._encode(self.fields[i], values)
+            column.extend(values)
+
+    def _encode(self, field, values):
+        for value in values:
+            if value is None:
+                yield -1
+            elif isinstance(value, str):
+                yield self._code(field, value)
+            else:
+                yield int(value)
+
+    def close(self):
+        self.flush()
+        arrays = dict()
+        for (field, column) in zip(self.fields, self.columns):
+            arrays[field] = numpy.frombuffer(column, dtype=numpy.int64) if len(column) else numpy.zeros(0, numpy.int64)
+        for (field, codes) in self.names.items():
+            arrays[field + '_names'] = numpy.array(sorted(codes, key=codes.get), dtype=str)
+        numpy.savez(self.filehandle, **arrays)
+        if self.close_file:
+            self.filehandle.close()
+
+WRITERS = {"jsonl":JSONLinesWriter, "csv":CSVWriter, "npz":NPZWriter}
+
+def openWriter(output_format, filename, fields, stats=None):
+    """Return the writer of output_format for filename, '-' standing for stdout.
+
+    npz needs a seekable file, so it can not be written to stdout. With
+    stats, a TSStats.Stats, the time spent writing is its output stage.
+    """
+    writer_type = WRITERS[output_format]
+    if output_format == "npz":
+        if filename == '-':
+            raise ValueError('npz output needs a file name')
+        writer = writer_type(open(filename, 'wb'), fields)
+    elif filename == '-':
+        writer = writer_type(sys.stdout, fields, False)
+    else:
+        writer = writer_type(open(filename, 'w', newline=''), fields)
+    writer.stats = stats
+    return writer
@@ -0,0 +1,330 @@
+#this Python script is used to analyse the PCR of MPEG-2 TS streams
+
+"""PCR analysis.
+
+pcrColumns() finds the packets of a chunk carrying a PCR and decodes their
+PID, PCR (base*300 + extension, in 27 MHz ticks), discontinuity_indicator
+and, for 192 bytes packets, arrival time stamp, all at once with NumPy
+when it is installed. A PCRAnalyzer feeds these samples, with their byte
+positions, to one PCRStatistics per PCR PID, which keeps in constant
+memory:
+
+    interval    time between consecutive PCRs, and the intervals longer
+                than max_interval (40 ms by ETSI TR 101 290)
+    accuracy    the error of every PCR against the constant bitrate model,
+                the PCR interpolated from its two neighbours at their byte
+                positions, and the errors beyond accuracy (500 ns)
+    jitter      a histogram of these errors
+    drift       the slope of PCR against arrival time in ppm when packets
+                carry arrival time stamps, else the bitrate of PCR against
+                byte position and its offset from the other PCR PIDs
+
+The 33 bits base wraps around, and a PCR whose discontinuity_indicator is
+set, or which jumps back or further than discontinuity_limit, starts a new
+segment: intervals, accuracy and slope are never taken across two segments.
+"""
+
+import math
+from array import array
+from TSSource import prefixLength
+from TSVector import decodeHeaders, candidatePackets
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+PCR_HZ = 27000000
+#PCR values wrap around with their 33 bits base
+PCR_WRAP = (1 << 33)*300
+ARRIVAL_WRAP = 1 << 30
+
+class PCRColumns(object):
+    "The PCR samples of a chunk, one sequence per field, in packet order"
+
+    def __init__(self, index, pid, pcr, discontinuity, arrival=None):
+        self.index = index
+        self.pid = pid
+        self.pcr = pcr
+        self.discontinuity = discontinuity
+        #None unless the packets carry an arrival time stamp
+        self.arrival = arrival
+
+    def __len__(self):
+        return len(self.index)
+
+def _pcrNumpy(data, packet_size, start, count):
+    o = prefixLength(packet_size)
+    packets = numpy.frombuffer(data, dtype=numpy.uint8, count=count*packet_size, offset=start)
+    packets = packets.reshape(count, packet_size)
+    h = packets[:, o:o+12]
+    mask = (h[:, 0] == 0x47) & ((h[:, 3] & 0x20) != 0) & (h[:, 4] >= 7) & ((h[:, 5] & 0x10) != 0)
+    index = numpy.flatnonzero(mask)
+    h = h[index].astype(numpy.uint64)
+    base = (h[:, 6] << 25) | (h[:, 7] << 17) | (h[:, 8] << 9) | (h[:, 9] << 1) | (h[:, 10] >> 7)
+    pcr = base*300 + (((h[:, 10] & 0x1) << 8) | h[:, 11])
+    arrival = None
+    if o:
+        p = packets[index, 0:4].astype(numpy.uint64)
+        arrival = (((p[:, 0] & 0x3F) << 24) | (p[:, 1] << 16) | (p[:, 2] << 8) | p[:, 3]).tolist()
+    return PCRColumns(index.tolist(), (((h[:, 1] & 0x1F) << 8) | h[:, 2]).tolist(), pcr.tolist(),
+                      (h[:, 5] >> 7).tolist(), arrival)
+
+def _pcrBytes(data, packet_size, start, count):
+    o = prefixLength(packet_size)
+    columns = decodeHeaders(data, packet_size, start, count)
+    (index, pid, pcr, discontinuity) = (array('l'), array('H'), list(), bytearray())
+    arrival = None
+    if o:
+        arrival = list()
+    for i in candidatePackets(columns, adaptation_field=True):
+        n = start + i*packet_size
+        h = data[n+o:n+o+12]
+        if h[0] != 0x47 or h[4] < 7 or not h[5] & 0x10:
+            continue
+        index.append(i)
+        pid.append(columns.pid[i])
+        base = int.from_bytes(h[6:11], 'big') >> 7
+        pcr.append(base*300 + (((h[10] & 0x1) << 8) | h[11]))
+        discontinuity.append(h[5] >> 7)
+        if o:
+            arrival.append(int.from_bytes(data[n:n+4], 'big') & 0x3FFFFFFF)
+    return PCRColumns(index, pid, pcr, discontinuity, arrival)
+
+def pcrColumns(data, packet_size=188, start=0, count=None):
+    "Return the PCRColumns of the count packets found at data[start:]"
+    if count is None:
+        count = (len(data) - start) // packet_size
+    if numpy is not None:
+        return _pcrNumpy(data, packet_size, start, count)
+    return _pcrBytes(data, packet_size, start, count)
+
+class RunningStatistics(object):
+    "Count, mean, variance, minimum and maximum of a stream of values (Welford)"
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = None
+        self.maximum = None
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta/self.count
+        self.m2 += delta*(value - self.mean)
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    @property
+    def deviation(self):
+        if self.count < 2:
+            return 0.0
+        return math.sqrt(self.m2/(self.count - 1))
+
+class PCRStatistics(object):
+    "Streaming statistics of the PCRs of one PID"
+
+    def __init__(self, pid, max_interval=0.04, accuracy=500e-9, bin_ns=100, bins=40,
+                 discontinuity_limit=0.1):
+        self.pid = pid
+        self.max_interval = max_interval
+        self.accuracy = accuracy
+        self.bin_ns = bin_ns
+        self.bins = bins
+        self.discontinuity_limit = discontinuity_limit
+        self.samples = 0
+        #discontinuity_indicator set, jumps without it, and 33 bits wraparounds
+        self.discontinuities = 0
+        self.jumps = 0
+        self.wraps = 0
+        self.interval = RunningStatistics()
+        self.interval_violations = 0
+        #accuracy errors in ns
+        self.error = RunningStatistics()
+        self.accuracy_violations = 0
+        #underflow, bins of bin_ns ns centred on 0, overflow
+        self.histogram = [0]*(bins + 2)
+        #co-moments of PCR against the reference (arrival time or byte
+        #position) of the closed segments and of the current one
+        self.cxx = 0.0
+        self.cxy = 0.0
+        self._segment = None
+        #(position, PCR, raw PCR, reference) of the last two samples of the segment
+        self._last = None
+        self._previous = None
+
+    def add(self, position, pcr, discontinuity=False, reference=None):
+        """Account for the PCR read at byte position.
+
+        reference is the arrival time of the packet in 27 MHz ticks when
+        known, the byte position being used otherwise.
+        """
+        self.samples += 1
+        if reference is None:
+            reference = position
+        last = self._last
+        if last is None or discontinuity:
+            if discontinuity and last is not None:
+                self.discontinuities += 1
+            self._restart(position, pcr, reference)
+            return
+        delta = pcr - last[2]
+        if delta < -PCR_WRAP//2:
+            delta += PCR_WRAP
+            self.wraps += 1
+        interval = float(delta)/PCR_HZ
+        if delta < 0 or interval > self.discontinuity_limit:
+            self.jumps += 1
+            self._restart(position, pcr, reference)
+            return
+        self.interval.add(interval)
+        if interval > self.max_interval:
+            self.interval_violations += 1
+        sample = (position, last[1] + delta, pcr, reference)
+        if self._previous is not None:
+            self._addError(self._previous, last, sample)
+        self._addSlope(sample[3], sample[1])
+        (self._previous, self._last) = (last, sample)
+
+    def _restart(self, position, pcr, reference):
+        "Start a new segment with this sample"
+        if self._segment is not None:
+            self.cxx += self._segment[3]
+            self.cxy += self._segment[4]
+        self._segment = None
+        self._previous = None
+        self._last = (position, pcr, pcr, reference)
+        self._addSlope(reference, pcr)
+
+    def _addError(self, a, b, c):
+        "Error of the PCR of b against the constant bitrate line through a and c"
+        if c[0] == a[0]:
+            return
+        expected = a[1] + float(c[1] - a[1])*(b[0] - a[0])/(c[0] - a[0])
+        error = (b[1] - expected)*1e9/PCR_HZ
+        self.error.add(error)
+        if abs(error) > self.accuracy*1e9:
+            self.accuracy_violations += 1
+        slot = int(math.floor(error/self.bin_ns)) + self.bins//2
+        self.histogram[min(max(slot, -1), self.bins) + 1] += 1
+
+    def _addSlope(self, x, y):
+        if self._segment is None:
+            self._segment = [0, 0.0, 0.0, 0.0, 0.0]
+        s = self._segment
+        s[0] += 1
+        dx = x - s[1]
+        s[1] += dx/s[0]
+        s[2] += (y - s[2])/s[0]
+        s[3] += dx*(x - s[1])
+        s[4] += dx*(y - s[2])
+
+    @property
+    def slope(self):
+        "PCR ticks per reference unit, over every segment; None before two samples of a segment"
+        cxx = self.cxx
+        cxy = self.cxy
+        if self._segment is not None:
+            cxx += self._segment[3]
+            cxy += self._segment[4]
+        if cxx <= 0:
+            return None
+        return cxy/cxx
+
+    def histogramBins(self):
+        "Return (low ns, high ns, count) of the non empty bins, None for an open end"
+        rows = list()
+        for (slot, count) in enumerate(self.histogram):
+            if not count:
+                continue
+            low = (slot - 1 - self.bins//2)*self.bin_ns
+            if slot == 0:
+                rows.append((None, -(self.bins//2)*self.bin_ns, count))
+            elif slot == self.bins + 1:
+                rows.append(((self.bins - self.bins//2)*self.bin_ns, None, count))
+            else:
+                rows.append((low, low + self.bin_ns, count))
+        return rows
+
+class PCRAnalyzer(object):
+    "Analyse the PCRs of every PID of a stream, chunk by chunk"
+
+    def __init__(self, packet_size=188, **options):
+        self.packet_size = packet_size
+        #PCRStatistics options
+        self.options = options
+        self.pids = dict()
+        #packets carrying an arrival time stamp, unwrapped per PID
+        self.arrival = prefixLength(packet_size) != 0
+        self._arrival_last = dict()
+
+    def update(self, data, start, count, offset):
+        "Account for the count packets at data[start:], offset being the file offset of data[start]"
+        columns = pcrColumns(data, self.packet_size, start, count)
+        size = self.packet_size
+        for j in range(len(columns)):
+            pid = columns.pid[j]
+            try:
+                stats = self.pids[pid]
+            except KeyError:
+                stats = self.pids[pid] = PCRStatistics(pid, **self.options)
+            reference = None
+            if columns.arrival is not None:
+                reference = self._unwrapArrival(pid, columns.arrival[j])
+            stats.add(offset + columns.index[j]*size, columns.pcr[j], columns.discontinuity[j], reference)
+
+    def _unwrapArrival(self, pid, arrival):
+        (last, base) = self._arrival_last.get(pid, (arrival, 0))
+        if arrival < last - ARRIVAL_WRAP//2:
+            base += ARRIVAL_WRAP
+        self._arrival_last[pid] = (arrival, base)
+        return base + arrival
+
+    def analyze(self, source):
+        "Run over every chunk of a TSSource.PacketSource"
+        for (data, start, count) in source.chunks():
+            self.update(data, start, count, source.offset(start))
+        return self
+
+    def report(self):
+        """Return one dict per PCR PID, in PID order.
+
+        drift is in ppm: against arrival time when packets carry it, else
+        against the mean bitrate of all PCR PIDs.
+        """
+        slopes = [s.slope for s in self.pids.values() if s.slope]
+        mean_slope = None
+        if slopes:
+            mean_slope = sum(slopes)/len(slopes)
+        rows = list()
+        for pid in sorted(self.pids):
+            s = self.pids[pid]
+            slope = s.slope
+            (bitrate, drift) = (None, None)
+            if slope:
+                if self.arrival:
+                    drift = (slope - 1)*1e6
+                else:
+                    bitrate = PCR_HZ*8/slope
+                    drift = (slope/mean_slope - 1)*1e6
+            rows.append({"pid":pid,
+                         "samples":s.samples,
+                         "interval_min":s.interval.minimum,
+                         "interval_mean":s.interval.mean if s.interval.count else None,
+                         "interval_max":s.interval.maximum,
+                         "interval_violations":s.interval_violations,
+                         "accuracy_mean":s.error.mean if s.error.count else None,
+                         "accuracy_deviation":s.error.deviation,
+                         "accuracy_max":max(abs(s.error.minimum), abs(s.error.maximum)) if s.error.count else None,
+                         "accuracy_violations":s.accuracy_violations,
+                         "bitrate":bitrate,
+                         "drift":drift,
+                         "discontinuities":s.discontinuities,
+                         "jumps":s.jumps,
+                         "wraps":s.wraps,
+                         "histogram":s.histogramBins()})
+        return rows
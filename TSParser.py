@@ -10,11 +10,25 @@
 """
 
 import struct
+import mmap
 import tkinter
 import tkinter.messagebox
 import tkinter.filedialog
 import sys
+import os
+import contextlib
+import time
 from optparse import OptionParser
+from concurrent.futures import ProcessPoolExecutor
+from TSSource import PacketSource, FollowSource, detectSync, openStream, isSeekable
+from TSSection import SectionCache, SectionAssembler, MAX_SECTION_LENGTH, sectionCRCValid, decodePAT, decodePMT, decodeSIT
+from TSVector import scanPackets, decodeHeaders, candidatePackets, previousPayloadPackets, PIDCensus
+from TSIndex import TSIndex, EntryPointMap, NO_TIMESTAMP, AU_NOT_PARSED, AU_TYPES, KEYFRAME_TYPES
+from TSPCR import PCRAnalyzer
+from TSMonitor import TR101290Monitor, INDICATORS
+from TSOutput import FORMATS, PCR_FIELDS, PES_FIELDS, openWriter
+from TSStats import Stats, TimedStream
+from TSNAL import accessUnitType, classifyAccessUnit
 
 class SystemClock:
     def __init__(self):
@@ -32,6 +46,8 @@ class PESPacketInfo:
     def __init__(self):
         self.PTS_hi = 0
         self.PTS_lo = 0
+        self.DTS_hi = 0
+        self.DTS_lo = 0
         self.streamID = 0
         self.AUType = ""
     def setPTS(self, PTS_hi, PTS_lo):
@@ -39,6 +55,11 @@ class PESPacketInfo:
         self.PTS_lo = PTS_lo
     def getPTS(self):
         return self.PTS_hi, self.PTS_lo
+    def setDTS(self, DTS_hi, DTS_lo):
+        self.DTS_hi = DTS_hi
+        self.DTS_lo = DTS_lo
+    def getDTS(self):
+        return self.DTS_hi, self.DTS_lo
     def setStreamID(self, streamID):
         self.streamID = streamID
     def setAUType(self, auType):
@@ -48,45 +69,46 @@ class PESPacketInfo:
     def getAUType(self):
         return self.AUType
 
-def readFile(filehandle, startPos, width):
-    filehandle.seek(startPos,0)
-    if width == 4:
-        string = filehandle.read(4)
-        if string == '':
-            raise IOError
-        return struct.unpack('>L',string[:4])[0]
-    elif width == 2:
-        string = filehandle.read(2)
-        if string == '':
-            raise IOError
-        return struct.unpack('>H',string[:2])[0]
-    elif width == 1:
-        string = filehandle.read(1)
-        if string == '':
-            raise IOError
-        return struct.unpack('>B',string[:1])[0]
-
-def parseAdaptation_Field(filehandle, startPos, PCR):
+_UINT32 = struct.Struct('>L')
+_UINT16 = struct.Struct('>H')
+_UINT8 = struct.Struct('>B')
+
+def readFile(data, startPos, width):
+    """Read a big endian field of width bytes at startPos of the packet buffer.
+
+    data is the buffer handed out by TSSource.PacketSource, so no I/O is done here.
+    """
+    try:
+        if width == 4:
+            return _UINT32.unpack_from(data, startPos)[0]
+        elif width == 2:
+            return _UINT16.unpack_from(data, startPos)[0]
+        elif width == 1:
+            return _UINT8.unpack_from(data, startPos)[0]
+    except struct.error:
+        raise IOError
+
+def parseAdaptation_Field(data, startPos, PCR):
     n = startPos
     flags = 0
-    adaptation_field_length = readFile(filehandle,n,1)
+    adaptation_field_length = readFile(data,n,1)
     if adaptation_field_length > 0:
-        flags = readFile(filehandle,n+1,1)
+        flags = readFile(data,n+1,1)
         PCR_flag = (flags>>4)&0x1
         if PCR_flag == 1:
-            PCR1 = readFile(filehandle,n+2,4)
-            PCR2 = readFile(filehandle,n+6,2)
+            PCR1 = readFile(data,n+2,4)
+            PCR2 = readFile(data,n+6,2)
             PCR_base_hi = (PCR1>>31)&0x1
             PCR_base_lo = (PCR1<<1)+ ((PCR2>>15)&0x1)
             PCR_ext = PCR2&0x1FF
             PCR.setPCR(PCR_base_hi, PCR_base_lo, PCR_ext)
     return [adaptation_field_length + 1, flags]
 
-def getPTS(filehandle, startPos):
+def getPTS(data, startPos):
     n = startPos
-    time1 = readFile(filehandle,n,1)
-    time2 = readFile(filehandle,n+1,2)
-    time3 = readFile(filehandle,n+3,2)
+    time1 = readFile(data,n,1)
+    time2 = readFile(data,n+1,2)
+    time3 = readFile(data,n+3,2)
     PTS_hi = (time1>>3)&0x1
     PTS_low = ((time1>>1)&0x3)<<30
     PTS_low += ((time2>>1)&0x7FFF)<<15
@@ -94,35 +116,15 @@ def getPTS(filehandle, startPos):
 
     return PTS_hi, PTS_low
 
-def parseIndividualPESPayload(filehandle, startPos):
-
-    n = startPos
-
-##    local1 = readFile(filehandle,n,4)
-##    local2 = readFile(filehandle,n+4,4)
-##    local3 = readFile(filehandle,n+8,4)
-##    print('NAL header = 0x%08X%08X%08X' %(local1,local2,local3)
-
-    local = readFile(filehandle,n,4)
-    k = 0
-    while((local&0xFFFFFF00) != 0x00000100):
-        k += 1;
-        if (k > 100):
-            return "Unknown AU type"
-        local = readFile(filehandle,n+k,4)
-
-    if(((local&0xFFFFFF00) == 0x00000100)&(local&0x1F == 0x9)):
-        primary_pic_type = readFile(filehandle,n+k+4,1)
-        primary_pic_type = (primary_pic_type&0xE0)>>5
-        if (primary_pic_type == 0x0):
-            return "IDR_picture"
-        else:
-            return "non_IDR_picture"
+def parseIndividualPESPayload(data, startPos, endPos=None):
+    "Return the access unit type of the ES payload at data[startPos:endPos], see TSNAL.accessUnitType()"
+    return accessUnitType(data, startPos, endPos)
 
-def parsePESHeader(filehandle, startPos,PESPktInfo):
+def parsePESHeader(data, startPos,PESPktInfo):
+    "Return False when more of the PES than data holds could change its access unit type"
     n = startPos
-    stream_ID = readFile(filehandle, n+3, 1)
-    PES_packetLength = readFile(filehandle, n+4, 2)
+    stream_ID = readFile(data, n+3, 1)
+    PES_packetLength = readFile(data, n+4, 2)
     PESPktInfo.setStreamID(stream_ID)
 
     k = 6
@@ -135,223 +137,313 @@ def parsePESHeader(filehandle, startPos,PESPktInfo):
         (stream_ID != 0xF9)& \
         (stream_ID != 0xF8)):
 
-        PES_packet_flags = readFile(filehandle, n+5, 4)
+        PES_packet_flags = readFile(data, n+5, 4)
         PTS_DTS_flag = ((PES_packet_flags>>14)&0x3)
         PES_header_data_length = PES_packet_flags&0xFF
 
         k += PES_header_data_length + 3
 
         if (PTS_DTS_flag == 0x2):
-            (PTS_hi, PTS_low) = getPTS(filehandle, n+9)
+            (PTS_hi, PTS_low) = getPTS(data, n+9)
 ##            print('PTS_hi = 0x%X, PTS_low = 0x%X' %(PTS_hi, PTS_low)
             PESPktInfo.setPTS(PTS_hi, PTS_low)
 
         elif (PTS_DTS_flag == 0x3):
-            (PTS_hi, PTS_low) = getPTS(filehandle, n+9)
+            (PTS_hi, PTS_low) = getPTS(data, n+9)
 ##            print('PTS_hi = 0x%X, PTS_low = 0x%X' %(PTS_hi, PTS_low)
             PESPktInfo.setPTS(PTS_hi, PTS_low)
 
-            (DTS_hi, DTS_low) = getPTS(filehandle, n+14)
+            (DTS_hi, DTS_low) = getPTS(data, n+14)
 ##            print('DTS_hi = 0x%X, DTS_low = 0x%X' %(DTS_hi, DTS_low)
+            PESPktInfo.setDTS(DTS_hi, DTS_low)
         else:
             k = k
-            return
+            return True
 
-        auType = parseIndividualPESPayload(filehandle, n+k)
+##      only video streams carry H.264/HEVC access units, a start code in audio is not one
+        auType = "Unknown AU type"
+        final = True
+        if (stream_ID&0xF0) == 0xE0:
+            (auType, final) = classifyAccessUnit(data, n+k)
         PESPktInfo.setAUType(auType)
+        return final
+    return True
 
-def parsePATSection(filehandle, k):
+def parsePES(data, n, packet_size, PID, PESPktInfo):
+    """Parse the PES starting in the packet at data[n:] into PESPktInfo, n past the timestamp of 192 bytes packets.
 
-    local = readFile(filehandle,k,4)
-    table_id = (local>>24)
-    if (table_id != 0x0):
-        print('Ooops! error in parsePATSection()!')
-        return
+    The access unit type is taken from the payload in the lookahead of the
+    buffer, and from the whole PES when more of it could change the type
+    and data is a memory mapped file.
+    """
+    if (not parsePESHeader(pesPayload(data, n, packet_size, PID), 0, PESPktInfo)) & isinstance(data, mmap.mmap):
+        parsePESHeader(pesPayload(data, n, packet_size, PID, len(data)), 0, PESPktInfo)
 
+def printPATSection(pat):
     print('------- PAT Information -------')
-    section_length = (local>>8)&0xFFF
-    print(('section_length = %d' %section_length))
-
-    transport_stream_id = (local&0xFF) << 8;
-    local = readFile(filehandle, k+4, 4)
-    transport_stream_id += (local>>24)&0xFF
-    transport_stream_id = (local >> 16)
-    version_number = (local>>17)&0x1F
-    current_next_indicator = (local>>16)&0x1
-    section_number = (local>>8)&0xFF
-    last_section_number = local&0xFF;
-    print(('section_number = %d, last_section_number = %d' %(section_number, last_section_number)))
-
-    length = section_length - 4 - 5
-    j = k + 8
-
-    while (length > 0):
-        local = readFile(filehandle, j, 4)
-        program_number = (local >> 16)
-        program_map_PID = local & 0x1FFF
-        print(('program_number = 0x%X' %program_number))
-        if (program_number == 0):
-            print(('network_PID = 0x%X' %program_map_PID))
+    print(('section_length = %d' %pat.section_length))
+    print(('section_number = %d, last_section_number = %d' %(pat.section_number, pat.last_section_number)))
+
+    for p in pat.program_list:
+        print(('program_number = 0x%X' %p["program_number"]))
+        if (p["program_number"] == 0):
+            print(('network_PID = 0x%X' %p["pid"]))
         else:
-            print(('program_map_PID = 0x%X' %program_map_PID))
-        length = length - 4;
-        j += 4
-        
+            print(('program_map_PID = 0x%X' %p["pid"]))
         print('')
 
-def parsePMTSection(filehandle, k):
-
-    local = readFile(filehandle,k,4)
-
-    table_id = (local>>24)
-    if (table_id != 0x2):
-        print('Ooops! error in parsePATSection()!')
-        return
+def printDescriptors(descriptors):
+    for (descriptor_tag, offset, descriptor_length) in descriptors:
+        print(('descriptor_tag = %d, descriptor_length = %d' %(descriptor_tag, descriptor_length)))
 
+def printPMTSection(pmt):
     print('------- PMT Information -------')
+    print(('section_length = %d' %pmt.section_length))
+    print(('program_number = %d' %pmt.program_number))
+    print(('section_number = %d, last_section_number = %d' %(pmt.section_number, pmt.last_section_number)))
+    print(('PCR_PID = 0x%X' %pmt.PCR_PID))
+    print(('program_info_length = %d' %pmt.program_info_length))
+    printDescriptors(pmt.program_info)
+
+    for es in pmt.es_list:
+        print(('stream_type = 0x%X, elementary_PID = 0x%X, ES_info_length = %d' \
+            %(es["stream_type"], es["elementary_PID"], es["es_info_length"])))
+        printDescriptors(es["descriptors"])
 
-    section_length = (local>>8)&0xFFF
-    print(('section_length = %d' %section_length))
-
-    program_number = (local&0xFF) << 8;
-
-    local = readFile(filehandle, k+4, 4)
-
-    program_number += (local>>24)&0xFF
-    print(('program_number = %d' %program_number))
-
-    version_number = (local>>17)&0x1F
-    current_next_indicator = (local>>16)&0x1
-    section_number = (local>>8)&0xFF
-    last_section_number = local&0xFF;
-    print(('section_number = %d, last_section_number = %d' %(section_number, last_section_number)))
-
-    local = readFile(filehandle, k+8, 4)
-
-    PCR_PID = (local>>16)&0x1FFF
-    print(('PCR_PID = 0x%X' %PCR_PID))
-    program_info_length = (local&0xFFF)
-    print(('program_info_length = %d' %program_info_length))
+    print('')
 
-    n = program_info_length
-    m = k + 12;
-    while (n>0):
-        descriptor_tag = readFile(filehandle, m, 1)
-        descriptor_length = readFile(filehandle, m+1, 1)
-        print(('descriptor_tag = %d, descriptor_length = %d' %(descriptor_tag, descriptor_length)))
-        n -= descriptor_length + 2
-        m += descriptor_length + 2
+def printSITSection(sit):
+    print('------- SIT Information -------')
+    print(('section_length = %d' %sit.section_length))
+    print(('section_number = %d, last_section_number = %d' %(sit.section_number, sit.last_section_number)))
+    print(('transmission_info_loop_length = %d' %sit.transmission_info_loop_length))
+    printDescriptors(sit.transmission_info)
+
+    for service in sit.service_list:
+        print(('service_id = %d, service_loop_length = %d' %(service["service_id"], service["service_loop_length"])))
+        printDescriptors(service["descriptors"])
+    print('')
 
-    j = k + 12 + program_info_length
-    length = section_length - 4 - 9 - program_info_length
+def parseSection(data, k, verify, decoder, printer, name):
+    """Decode and print the section at data[k]; with verify, a section whose CRC_32 does not match is not output.
 
-    while (length > 0):
-        local1 = readFile(filehandle, j, 1)
-        local2 = readFile(filehandle, j+1, 4)
+    Return False for a CRC_32 error, True once printed.
+    """
+    try:
+        section = decoder(bytes(data[k:k+3+MAX_SECTION_LENGTH]), verify)
+    except ValueError:
+        print(('Ooops! error in parse%sSection()!' %name))
+        return
+    if verify and (not section.crc_valid):
+        print(('Ooops! CRC_32 error in %s section' %name))
+        return False
+    printer(section)
+    return True
+
+def parsePATSection(data, k, verify=False):
+    return parseSection(data, k, verify, decodePAT, printPATSection, 'PAT')
+
+def parsePMTSection(data, k, verify=False):
+    return parseSection(data, k, verify, decodePMT, printPMTSection, 'PMT')
+
+def parseSITSection(data, k, verify=False):
+    return parseSection(data, k, verify, decodeSIT, printSITSection, 'SIT')
+
+def uniqueSection(seen, PID, section, verify=False):
+    """Whether a section of --unique mode is output: one seen for the first time, or with verify one failing CRC_32.
+
+    Only a section which passes the check is remembered, so a corrupt copy
+    neither hides the valid ones nor keeps its repetitions from being checked.
+    """
+    if verify and not sectionCRCValid(section, 0):
+        return True
+    return seen.isNew(PID, section, 0)
+
+def packetPayload(data, n):
+    "Return the payload of the packet at data[n:], n past the timestamp of 192 bytes packets"
+    k = n + 4
+    if (data[n+3]>>4)&0x2:
+        k += 1 + data[k]
+    return bytes(data[k:n+188])
+
+def readSections(data, n, packet_size, PID):
+    """Return the sections starting in the packet at data[n:], n past the timestamp of 192 bytes packets.
+
+    A section running on is completed from the packets of PID which follow
+    in the lookahead of the buffer, and dropped when it runs past it.
+    """
+    assembler = SectionAssembler()
+    sections = assembler.feed(packetPayload(data, n), True)
+    m = n
+    limit = min(len(data), n + PacketSource.lookahead)
+    while assembler.active and (m + 2*packet_size <= limit):
+        m += packet_size
+        header = readFile(data, m, 4)
+        if (((header>>8)&0x1FFF) != PID) | (((header>>4)&0x1) == 0):
+            continue
+        payload = packetPayload(data, m)
+        if ((header>>22)&0x1):
+##          only the bytes before the pointer_field target belong to the open section
+            sections += assembler.feed(payload[1:1+payload[0]], False)
+            break
+        sections += assembler.feed(payload, False)
+    return sections
+
+def pesPayload(data, n, packet_size, PID, limit=None):
+    """Return the PES packet starting in the packet at data[n:], n past the timestamp of 192 bytes packets.
+
+    The payload of the packets of PID which follow in the lookahead of the
+    buffer, or up to limit, is joined to it, up to the start of the next
+    PES packet.
+    """
+    pes = [packetPayload(data, n)]
+    m = n
+    if (limit is None):
+        limit = n + PacketSource.lookahead
+    limit = min(len(data), limit)
+    while (m + 2*packet_size <= limit):
+        m += packet_size
+        header = readFile(data, m, 4)
+        if (((header>>8)&0x1FFF) != PID) | (((header>>4)&0x1) == 0):
+            continue
+        if ((header>>22)&0x1):
+            break
+        pes.append(packetPayload(data, m))
+    return b''.join(pes)
+
+class EntryPointList:
+    "IDR pictures of the ES, kept in an EntryPointMap and printed by report()"
+
+    def __init__(self, entry_map=None):
+        if entry_map is None:
+            entry_map = EntryPointMap()
+        self.map = entry_map
+        self.idr_flag = False
+        self.last_SameES_packetNo = 0
+        self.last_EntryTPI = 0
+
+    def addPESStart(self, packetCount, PID, PESPktInfo, offset=-1):
+        print(('packet No. %d,  ES PID = 0x%X,  Steam_ID = 0x%X,  AU_Type = %s' \
+        %(packetCount, PID, PESPktInfo.getStreamID(), PESPktInfo.getAUType())))
+
+        if (self.idr_flag == True):
+            self.map.setPackets(self.last_SameES_packetNo - self.last_EntryTPI +1)
+            print(('packet No. %d, ES PID = 0x%X, Steam_ID = 0x%X, AU_Type = %s' \
+            %(packetCount, PID, PESPktInfo.getStreamID(), PESPktInfo.getAUType())))
+
+
+        if (PESPktInfo.getAUType() in KEYFRAME_TYPES):
+            self.idr_flag = True
+            self.last_EntryTPI = packetCount
+            print(('packet No. %d, ES PID = 0x%X, Steam_ID = 0x%X, AU_Type = %s' \
+            %(packetCount, PID, PESPktInfo.getStreamID(), PESPktInfo.getAUType())))
+            self.map.add(packetCount, offset, ((PESPktInfo.PTS_hi&0x1)<<32)|PESPktInfo.PTS_lo)
+        else:
+            self.idr_flag = False
+
+    def report(self):
+        print('================================================\n')
+##      the last IDR picture has no EntryPESPacketNum when no PES follows it
+        for i in range(len(self.map)):
+            (TPI, offset, PTS, EntryPESPacketNum) = self.map.entry(i)
+            if (EntryPESPacketNum == 0):
+                continue
+            PTS_MSB24 = (PTS>>9)&0xFFFFFF
+            print(('TPI = 0x%x, PTS = 0x%x, EntryPESPacketNum = 0x%x' %(TPI, PTS_MSB24, EntryPESPacketNum)))
+
+def reportPCRPacket(packetCount, PID, PCR, flags, writer=None):
+    if writer is not None:
+        writer.write((packetCount, PID, (PCR.PCR_base_hi<<32)|(PCR.PCR_base_lo&0xFFFFFFFF), PCR.PCR_extension, \
+            bool((flags>>7)&0x1)))
+        return
 
-        stream_type = local1;
-        elementary_PID = (local2>>16)&0x1FFF
-        ES_info_length = local2&0xFFF
+    discontinuity = 'discontinuity: false'
+    if (((flags>>7)&0x1)):
+        discontinuity = 'discontinuity: true'
 
-        print(('stream_type = 0x%X, elementary_PID = 0x%X, ES_info_length = %d' %(stream_type, elementary_PID, ES_info_length)))
-        n = ES_info_length
-        m = j+5;
-        while (n>0):
-            descriptor_tag = readFile(filehandle, m, 1)
-            descriptor_length = readFile(filehandle, m+1, 1)
-            print(('descriptor_tag = %d, descriptor_length = %d' %(descriptor_tag, descriptor_length)))
-            n -= descriptor_length + 2
-            m += descriptor_length + 2
+    print(('PCR packet, packet No. %d, PID = 0x%x, PCR_base = hi:0x%X lo:0x%X PCR_ext = 0x%X %s' \
+    %(packetCount, PID, PCR.PCR_base_hi, PCR.PCR_base_lo, PCR.PCR_extension, discontinuity)))
 
+def reportPESStart(packetCount, PID, PESPktInfo, mode, entries, writer=None, offset=-1):
+    if writer is not None:
+        writer.write((packetCount, PID, PESPktInfo.getStreamID(), (PESPktInfo.PTS_hi<<32)|PESPktInfo.PTS_lo, \
+            PESPktInfo.getAUType() or None))
+        return
 
-        j += 5 + ES_info_length
-        length -= 5 + ES_info_length
+    PTS_MSB24 = ((PESPktInfo.PTS_hi&0x1)<<23)|((PESPktInfo.PTS_lo>>9)&0x7FFFFF)
+    print(('PES start, packet No. %d, PID = 0x%x, PTS_MSB24 = 0x%x PTS_hi = 0x%X, PTS_low = 0x%X' \
+    %(packetCount, PID, PTS_MSB24, PESPktInfo.PTS_hi, PESPktInfo.PTS_lo)))
 
-    print('')
+    if (mode == 'ES'):
+        entries.addPESStart(packetCount, PID, PESPktInfo, offset)
 
-def parseSITSection(filehandle, k):
-    local = readFile(filehandle,k,4)
+def flushOutput(writer=None):
+    "Hand out what was output so far, while follow mode waits for the file to grow"
+    if writer is not None:
+        writer.flush()
+        writer.filehandle.flush()
+    sys.stdout.flush()
 
-    table_id = (local>>24)
-    if (table_id != 0x7F):
-        print('Ooops! error in parseSITSection()!')
-        return
+def reportResync(offset, skipped):
+    print(('Ooops! Sync_Byte lost, %d bytes skipped, sync found again at offset 0x%X' %(skipped, offset)))
 
-    print('------- SIT Information -------')
-
-    section_length = (local>>8)&0xFFF
-    print(('section_length = %d' %section_length))
-    local = readFile(filehandle, k+4, 4)
-
-    section_number = (local>>8)&0xFF
-    last_section_number = local&0xFF;
-    print(('section_number = %d, last_section_number = %d' %(section_number, last_section_number)))
-    local = readFile(filehandle, k+8, 2)
-    transmission_info_loop_length = local&0xFFF
-    print(('transmission_info_loop_length = %d' %transmission_info_loop_length))
-
-    n = transmission_info_loop_length
-    m = k + 10;
-    while (n>0):
-        descriptor_tag = readFile(filehandle, m, 1)
-        descriptor_length = readFile(filehandle, m+1, 1)
-        print(('descriptor_tag = %d, descriptor_length = %d' %(descriptor_tag, descriptor_length)))
-        n -= descriptor_length + 2
-        m += descriptor_length + 2
-
-    j = k + 10 + transmission_info_loop_length
-    length = section_length - 4 - 7 - transmission_info_loop_length
-
-    while (length > 0):
-        local1 = readFile(filehandle, j, 4)
-        service_id = (local1>>16)&0xFFFF;
-        service_loop_length = local1&0xFFF
-        print(('service_id = %d, service_loop_length = %d' %(service_id, service_loop_length)))
-
-        n = service_loop_length
-        m = j+4;
-        while (n>0):
-            descriptor_tag = readFile(filehandle, m, 1)
-            descriptor_length = readFile(filehandle, m+1, 1)
-            print(('descriptor_tag = %d, descriptor_length = %d' %(descriptor_tag, descriptor_length)))
-            n -= descriptor_length + 2
-            m += descriptor_length + 2
-
-        j += 4 + service_loop_length
-        length -= 4 + service_loop_length
-    print('')
-
-def parseTSMain(filehandle, packet_size, mode, pid, psi_mode, searchItem):
+def parseTSMain(filehandle, packet_size, mode, pid, psi_mode, searchItem, start=0, verify_crc=False, writer=None, entry_map=None,
+                follow=False, idle_timeout=None, stats=None):
 
     PCR = SystemClock()
     PESPktInfo = PESPacketInfo()
 
     if (packet_size != 192):
-        n = 0
+        prefix_length = 0
     else:
-        n = 4
+        prefix_length = 4
 
     packetCount = 0
     rdi_count = 0
 
-    EntryPESPacketNumList = []
-    TPIList = []
-    PTSList = []
-    PIDList = []
+    entries = EntryPointList(entry_map)
+    seen = SectionCache()
+    crc_errors = 0
+##  without --all or --unique, only the first table is output
+    first_found = False
+##  PSI sections are only assembled and decoded when a table is asked for
+    psi_wanted = (searchItem in ("PAT", "PMT", "SIT")) | \
+        ((searchItem == "FFF") & (mode in ("PAT", "PMT", "SIT")))
+
+
+##  a corrupt region is skipped by locking onto the sync byte again,
+##  instead of stopping at the first packet without one.
+##  with follow, a file still being written is read on as it grows.
+    if follow:
+        source = FollowSource(filehandle, packet_size, start, True, idle_timeout)
+        source.wait_callback = lambda: flushOutput(writer)
+    else:
+        source = PacketSource(filehandle, packet_size, start, resync=True)
+    source.resync_callback = reportResync
 
-    idr_flag = False
-    last_SameES_packetNo = 0
-    last_EntryTPI = 0
+##  only the packets which can produce output are visited, the rest is
+##  skipped by looking at the header columns of the whole chunk.
+    if (mode == 'ES'):
+        pids = (pid,)
+    else:
+        pids = ()
+    packets = scanPackets(source, pids, payload_unit_start=True, adaptation_field=(searchItem == "PCR"), stats=stats)
 
+##  with stats, the time of every stage is measured, printing included
+    if stats is not None:
+        clock = stats.clock
 
     try:
-        while(True):
+        for (packetCount, data, n) in packets:
 
-            ##if (rdi_count == 0):
-                ##packetCount += 1
-                ##rdi_count += 1
+##          whether the maxim packet number reached? an entry point map
+##          covers the whole file, and a followed file has no end.
+            if (packetCount > 1450000) & (entry_map is None) & (not follow):
+                break
 
-            PacketHeader = readFile(filehandle,n,4)
+            offset = source.offset(n)
+            n += prefix_length
+            PacketHeader = readFile(data,n,4)
 
             syncByte = (PacketHeader>>24)
             if (syncByte != 0x47):
@@ -370,152 +462,448 @@ def parseTSMain(filehandle, packet_size, mode, pid, psi_mode, searchItem):
             Adaptation_Field_Length = 0
 
             if (adaptation_fieldc_trl == 0x2)|(adaptation_fieldc_trl == 0x3):
-                [Adaptation_Field_Length, flags] = parseAdaptation_Field(filehandle,n+4,PCR)
+                if stats is not None:
+                    begin = clock()
+                [Adaptation_Field_Length, flags] = parseAdaptation_Field(data,n+4,PCR)
             
                 if ((searchItem == "PCR")&((flags>>4)&0x1)):
-                    discontinuity = 'discontinuity: false'
-                    if (((flags>>7)&0x1)):
-                        discontinuity = 'discontinuity: true'
-
-                    print(('PCR packet, packet No. %d, PID = 0x%x, PCR_base = hi:0x%X lo:0x%X PCR_ext = 0x%X %s' \
-                    %(packetCount, PID, PCR.PCR_base_hi, PCR.PCR_base_lo, PCR.PCR_extension, discontinuity)))
+                    reportPCRPacket(packetCount, PID, PCR, flags, writer)
+                if stats is not None:
+                    stats.add("adaptation field", begin)
 
             if (adaptation_fieldc_trl == 0x1)|(adaptation_fieldc_trl == 0x3):
 
-                PESstartCode = readFile(filehandle,n+Adaptation_Field_Length+4,4)
+                PESstartCode = readFile(data,n+Adaptation_Field_Length+4,4)
 
                 if ((PESstartCode&0xFFFFFF00) == 0x00000100)& \
                     (PID == pid)&(payload_unit_start_indicator == 1):
 
-                    parsePESHeader(filehandle, n+Adaptation_Field_Length+4, PESPktInfo)
-                    PTS_MSB24 = ((PESPktInfo.PTS_hi&0x1)<<23)|((PESPktInfo.PTS_lo>>9)&0x7FFFFF)
-                    print(('PES start, packet No. %d, PID = 0x%x, PTS_MSB24 = 0x%x PTS_hi = 0x%X, PTS_low = 0x%X' \
-                    %(packetCount, PID, PTS_MSB24, PESPktInfo.PTS_hi, PESPktInfo.PTS_lo)))
-
-                    if (mode == 'ES'):
-                        print(('packet No. %d,  ES PID = 0x%X,  Steam_ID = 0x%X,  AU_Type = %s' \
-                        %(packetCount, PID, PESPktInfo.getStreamID(), PESPktInfo.getAUType())))
-
-                        if (idr_flag == True):
-                            EntryPESPacketNumList.append(last_SameES_packetNo - last_EntryTPI +1)
-                            print(('packet No. %d, ES PID = 0x%X, Steam_ID = 0x%X, AU_Type = %s' \
-                            %(packetCount, PID, PESPktInfo.getStreamID(), PESPktInfo.getAUType())))
-
-
-                        if (PESPktInfo.getAUType() == "IDR_picture"):
-                            idr_flag = True
-                            last_EntryTPI = packetCount
-                            print(('packet No. %d, ES PID = 0x%X, Steam_ID = 0x%X, AU_Type = %s' \
-                            %(packetCount, PID, PESPktInfo.getStreamID(), PESPktInfo.getAUType())))
-                            TPIList.append(packetCount)
-                            PTSList.append(PTS_MSB24)
-                        else:
-                            idr_flag = False
+                    if stats is not None:
+                        begin = clock()
+                    parsePES(data, n, packet_size, PID, PESPktInfo)
+                    reportPESStart(packetCount, PID, PESPktInfo, mode, entries, writer, offset)
+                    if stats is not None:
+                        stats.add("PES header", begin)
+                        stats.count("pes_units")
 
                 elif (((PESstartCode&0xFFFFFF00) != 0x00000100)& \
-                    (payload_unit_start_indicator == 1)):
-
-                    pointer_field = (PESstartCode >> 24)
-                    table_id = readFile(filehandle,n+Adaptation_Field_Length+4+1+pointer_field,1)
-
-                    if ((table_id == 0x0)&(PID != 0x0)):
-                        print(('Ooops!, Something wrong in packet No. %d' %packetCount))
-
-                    k = n+Adaptation_Field_Length+4+1+pointer_field
-
-                    if (table_id == 0x0):
-##                      packetCount -= 1
-##                      rdi_count -= 1
-                        if (((searchItem == "FFF")&(mode == 'PAT'))|(searchItem == "PAT")):
-                            if ((psi_mode == 2)&(searchItem == "PAT")):
-                                isUnique = True
-                                for i in PIDList:
-                                    if (i == PID):
-                                        isUnique = False
-                                
-                                if isUnique:
-                                    PIDList.append(PID)
-                                else:
-                                    n += packet_size
-                                    packetCount += 1
-                                continue
-                                
-                            print(('pasing PAT Packet! packet No. %d, PID = 0x%X' %(packetCount, PID)))
-                            parsePATSection(filehandle, k)
-                            if (psi_mode == 0):
-                                return
-
-
-                    elif (table_id == 0x2):
-##                        packetCount -= 1
-##                        rdi_count -= 1
-                        if (((searchItem == "FFF")&(mode == 'PMT')&(PID == pid))|(searchItem == "PMT")):
-                            if ((psi_mode == 2)&(searchItem == "PMT")):
-                                isUnique = True
-                                for i in PIDList:
-                                    if (i == PID):
-                                        isUnique = False
-                                
-                                if isUnique:
-                                    PIDList.append(PID)
-                                else:
-                                    n += packet_size
-                                    packetCount += 1
-                                    continue
-                            print(('pasing PMT Packet! packet No. %d, PID = 0x%X' %(packetCount, PID)))
-                            parsePMTSection(filehandle, k)
-                            if (psi_mode == 0):
-                                return
-                    
-                    elif (table_id == 0x7F):
-                        if (((searchItem == "FFF")&(mode == 'SIT')&(PID == pid))|(searchItem == "SIT")):
-                            if ((psi_mode == 2)&(searchItem == "SIT")):
-                                isUnique = True
-                                for i in PIDList:
-                                    if (i == PID):
-                                        isUnique = False
-                                if isUnique:
-                                    PIDList.append(PID)
-                                else:
-                                    n += packet_size
-                                    packetCount += 1
-                                    continue
-                            print(('pasing SIT Packet! packet No. %d, PID = 0x%X' %(packetCount, PID)))
-                            parseSITSection(filehandle, k)
-                            if (psi_mode == 0):
-                                return
+                    (payload_unit_start_indicator == 1)&psi_wanted):
+
+                    if stats is not None:
+                        begin = clock()
+                    sections = readSections(data, n, packet_size, PID)
+                    if stats is not None:
+                        stats.add("PSI sections", begin)
+                        stats.count("psi_units", len(sections))
+                        stats.count("bytes_copied", sum(map(len, sections)))
+                    for section in sections:
+                        table_id = section[0]
+
+                        if ((table_id == 0x0)&(PID != 0x0)):
+                            print(('Ooops!, Something wrong in packet No. %d' %packetCount))
+
+                        if (table_id == 0x0):
+                            if (((searchItem == "FFF")&(mode == 'PAT'))|(searchItem == "PAT")):
+                                if ((psi_mode == 2)&(searchItem == "PAT")):
+                                    if not uniqueSection(seen, PID, section, verify_crc):
+                                        continue
+                                print(('pasing PAT Packet! packet No. %d, PID = 0x%X' %(packetCount, PID)))
+                                if (parsePATSection(section, 0, verify_crc) == False):
+                                    crc_errors += 1
+                                elif (psi_mode == 0):
+                                    first_found = True
+                                    break
+
+                        elif (table_id == 0x2):
+                            if (((searchItem == "FFF")&(mode == 'PMT')&(PID == pid))|(searchItem == "PMT")):
+                                if ((psi_mode == 2)&(searchItem == "PMT")):
+                                    if not uniqueSection(seen, PID, section, verify_crc):
+                                        continue
+                                print(('pasing PMT Packet! packet No. %d, PID = 0x%X' %(packetCount, PID)))
+                                if (parsePMTSection(section, 0, verify_crc) == False):
+                                    crc_errors += 1
+                                elif (psi_mode == 0):
+                                    first_found = True
+                                    break
+
+                        elif (table_id == 0x7F):
+                            if (((searchItem == "FFF")&(mode == 'SIT')&(PID == pid))|(searchItem == "SIT")):
+                                if ((psi_mode == 2)&(searchItem == "SIT")):
+                                    if not uniqueSection(seen, PID, section, verify_crc):
+                                        continue
+                                print(('pasing SIT Packet! packet No. %d, PID = 0x%X' %(packetCount, PID)))
+                                if (parseSITSection(section, 0, verify_crc) == False):
+                                    crc_errors += 1
+                                elif (psi_mode == 0):
+                                    first_found = True
+                                    break
 ##                    else:
 ##                        print('Unknown PSI, table_id = 0x%X' %table_id)
 
 
+                if first_found:
+                    break
+
                 if (PID == pid):
-                    last_SameES_packetNo = packetCount
+                    entries.last_SameES_packetNo = packetCount
 
+    except IOError:
+        print('IO error! maybe reached EOF')
+    except KeyboardInterrupt:
+##      the way out of follow mode
+        if not follow:
+            raise
+    else:
+        filehandle.close()
+    finally:
+        source.close()
+
+    if verify_crc:
+        print(('%d PSI sections failed the CRC_32 check' %crc_errors))
+    if (writer is None) & (not first_found):
+        entries.report()
 
+def indexPackets(index, source, first, last_payload, unseen=0):
+    """Add the payload unit starts and PCRs of the packets of source to index.
 
-##            skip to next TS packet and increase packet count by 1.
-            n += packet_size
+    Packets are numbered from first; last_payload and unseen are passed on to
+    TSVector.previousPayloadPackets(). Return the number of packets scanned.
+    """
+
+    packet_size = source.packet_size
+    PCR = SystemClock()
 
-            packetCount += 1
-##            rdi_count += 1
+    if (packet_size != 192):
+        prefix_length = 0
+    else:
+        prefix_length = 4
 
-##            if (rdi_count == 32):
-##                rdi_count = 0
+    packetCount = first
+##  the corrupt regions skipped are recorded with the number of the packet
+##  following them, for parseTSIndex() to report them where a scan does.
+    source.resync_callback = lambda offset, skipped: index.addResync(first, offset, skipped)
+    try:
+        for (data, start, count) in source.chunks():
+            columns = decodeHeaders(data, packet_size, start, count)
+            selected = candidatePackets(columns, (), payload_unit_start=True, adaptation_field=True)
+            units = [i for i in selected if columns.payload_unit_start_indicator[i] & \
+                (columns.adaptation_field_ctrl[i] & 0x1)]
+            previous = dict(zip(units, previousPayloadPackets(columns, units, first, last_payload, unseen)))
+
+            for i in selected:
+                packetCount = first + i
+                n = start + i*packet_size + prefix_length
+                PacketHeader = readFile(data,n,4)
+                if ((PacketHeader>>24) != 0x47):
+                    index.sync_error = packetCount
+                    break
+
+                PID = ((PacketHeader>>8)&0x1FFF)
+                adaptation_fieldc_trl = ((PacketHeader>>4)&0x3)
+                Adaptation_Field_Length = 0
+
+                if (adaptation_fieldc_trl == 0x2)|(adaptation_fieldc_trl == 0x3):
+                    [Adaptation_Field_Length, flags] = parseAdaptation_Field(data,n+4,PCR)
+                    if ((flags>>4)&0x1):
+                        index.addPCR(packetCount, source.offset(n - prefix_length), PID,
+                                     (PCR.PCR_base_hi<<32)|PCR.PCR_base_lo, PCR.PCR_extension, flags)
+
+                if i not in previous:
+                    continue
+
+                k = n+Adaptation_Field_Length+4
+                if ((readFile(data,k,4)&0xFFFFFF00) == 0x00000100):
+                    info = PESPacketInfo()
+                    info.setPTS(None, None)
+                    info.setDTS(None, None)
+                    info.setAUType(AU_NOT_PARSED)
+                    parsePES(data, n, packet_size, PID, info)
+                    pts = NO_TIMESTAMP
+                    dts = NO_TIMESTAMP
+                    au_type = AU_NOT_PARSED
+                    if (info.PTS_hi is not None):
+                        pts = (info.PTS_hi<<32)|info.PTS_lo
+                    if (info.DTS_hi is not None):
+                        dts = (info.DTS_hi<<32)|info.DTS_lo
+                    if (info.getAUType() != AU_NOT_PARSED):
+                        au_type = AU_TYPES.index(info.getAUType())
+                    index.addUnit(packetCount, source.offset(n - prefix_length), PID, previous[i],
+                                  info.getStreamID(), pts, dts, au_type)
+                else:
+                    index.addUnit(packetCount, source.offset(n - prefix_length), PID, previous[i])
+
+            if (index.sync_error >= 0):
+                return index.sync_error
+            first += count
+    except IOError:
+        return packetCount
+    return first
 
+def buildIndex(filehandle, packet_size, processes=1, start=0):
+    """Scan the whole file once and return a TSIndex of its payload unit starts and PCRs.
+
+    With processes > 1 the file is split into packet aligned ranges which
+    are indexed by a process pool.
+    """
+
+    if (processes > 1):
+        return buildIndexParallel(filehandle.name, packet_size, processes, start)
+
+    index = TSIndex(packet_size, start)
+    source = PacketSource(filehandle, packet_size, start, resync=True)
+    try:
+        index.packet_count = indexPackets(index, source, 0, dict())
+    finally:
+        source.close()
+    return index
+
+def _indexRange(args):
+    """Index the packets from byte begin to end of filename, numbered from 0.
+
+    Unless exact, begin and end are moved to the packets
+    PacketSource.boundary() finds. Return the index, the last payload
+    packet of every PID, the range as indexed, and the file offset a scan
+    would go on from.
+    """
+    (filename, packet_size, start, begin, end, exact) = args
+    index = TSIndex(packet_size, start)
+    last_payload = dict()
+    with open(filename, 'rb') as f:
+        source = PacketSource(f, packet_size, begin, end, resync=True)
+        try:
+            if not exact:
+                size = os.fstat(f.fileno()).st_size
+                if (begin != start):
+                    begin = source.boundary(begin, size)
+                end = source.boundary(end, size)
+        finally:
+            source.close()
+        source = PacketSource(f, packet_size, begin, end, resync=True)
+        try:
+            index.packet_count = indexPackets(index, source, 0, last_payload, -1)
+        finally:
+            source.close()
+    return index, last_payload, begin, end, source.position
+
+def _renumber(index, base, last_payload):
+    "Number the packets of the index of a range from base, the ranges before it ending with last_payload"
+    units = index.units
+    for i in range(len(units['packet'])):
+        units['packet'][i] += base
+        if (units['previous'][i] == -1):
+            units['previous'][i] = last_payload.get(units['pid'][i], 0)
+        else:
+            units['previous'][i] += base
+    for table in (index.pcrs, index.resyncs):
+        for i in range(len(table['packet'])):
+            table['packet'][i] += base
+
+def buildIndexParallel(filename, packet_size, processes, start=0):
+    """Index ranges of filename in a process pool and join them in file order.
+
+    A range is cut at the packet a resync search locks onto, and numbers
+    its packets from 0; joined, they are numbered as one scan numbers
+    them. A range which does not begin where the one before it ends, the
+    last packet running past the cut or the corrupt regions lining up
+    otherwise than in one scan, is indexed again from there.
+    """
+
+    size = os.path.getsize(filename)
+    total = (size - start) // packet_size
+    step = max(total // (processes*4) + 1, 1024)*packet_size
+    jobs = [(filename, packet_size, start, begin, min(begin + step, size), False) for begin in range(start, size, step)]
+
+    index = TSIndex(packet_size, start)
+    last_payload = dict()
+    base = 0
+    position = start
+##  the ranges not started yet are cancelled when the scan ends early;
+##  terminating a pool whose task queue is still full can hang.
+    executor = ProcessPoolExecutor(processes)
+    try:
+        futures = [executor.submit(_indexRange, job) for job in jobs]
+        for future in futures:
+            (part, part_last, begin, end, next_position) = future.result()
+            if (begin != position):
+                (part, part_last, begin, end, next_position) = \
+                    _indexRange((filename, packet_size, start, position, max(end, position), True))
+            _renumber(part, base, last_payload)
+            index.extend(part)
+            last_payload.update((pid, packet + base) for (pid, packet) in part_last.items())
+            base += part.packet_count
+            position = next_position
+            if (index.sync_error >= 0):
+                break
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+    index.packet_count = base
+    return index
 
-##            whether the maxim packet number reached?
+def reportIndexResyncs(resyncs, r, packetCount=None):
+    "Report the resyncs[r:] of a TSIndex up to the one before packetCount, all of them without; return the next r"
+    while (r < len(resyncs)) and ((packetCount is None) or (resyncs[r][0] <= packetCount)):
+        reportResync(resyncs[r][1], resyncs[r][2])
+        r += 1
+    return r
+
+def parseTSIndex(index, mode, pid, searchItem, writer=None):
+    """Answer the ES and PCR modes of parseTSMain from a TSIndex, printing the same lines."""
+
+    PCR = SystemClock()
+    PESPktInfo = PESPacketInfo()
+    entries = EntryPointList()
+
+##  a corrupt region skipped is reported before the first packet after it
+    resyncs = list(index.resyncEvents())
+    r = 0
+
+    if (searchItem == "PCR"):
+        for (packetCount, PID, base, extension, flags) in index.pcrSamples():
+            if (packetCount > 1450000):
+                break
+            r = reportIndexResyncs(resyncs, r, packetCount)
+            PCR.setPCR(base>>32, base&0xFFFFFFFF, extension)
+            reportPCRPacket(packetCount, PID, PCR, flags, writer)
+        else:
+            reportIndexResyncs(resyncs, r)
+    else:
+        units = index.units
+        for i in range(len(units['packet'])):
+            packetCount = units['packet'][i]
             if (packetCount > 1450000):
                 break
+            r = reportIndexResyncs(resyncs, r, packetCount)
+            if (units['pid'][i] != pid) | (units['stream_id'][i] == 0):
+                continue
+
+            entries.last_SameES_packetNo = units['previous'][i]
+            PESPktInfo.setStreamID(units['stream_id'][i])
+            if (units['pts'][i] != NO_TIMESTAMP):
+                PESPktInfo.setPTS(units['pts'][i]>>32, units['pts'][i]&0xFFFFFFFF)
+            if (units['au_type'][i] != AU_NOT_PARSED):
+                PESPktInfo.setAUType(AU_TYPES[units['au_type'][i]])
+            reportPESStart(packetCount, pid, PESPktInfo, mode, entries, writer, units['offset'][i])
+        else:
+            reportIndexResyncs(resyncs, r)
 
-    except IOError:
-        print('IO error! maybe reached EOF')
+    if (0 <= index.sync_error <= 1450000):
+        print('Ooops! Can NOT found Sync_Byte! maybe something wrong with the file')
+
+    if writer is None:
+        entries.report()
+
+def openIndex(filename, filehandle, packet_size, processes=1, start=0):
+    """Return the up to date index of filename, building and saving it when needed."""
+
+    index = TSIndex.open(filename, packet_size)
+    if (index is not None) and (index.start != start):
+        index = None
+    if index is None:
+        index = buildIndex(filehandle, packet_size, processes, start)
+        index.stamp(filename)
+        try:
+            index.save(TSIndex.indexPath(filename))
+        except (IOError, OSError):
+            print(('Can NOT write index file %s' %TSIndex.indexPath(filename)))
+    return index
+
+
+def parsePIDCensus(filehandle, packet_size, start=0):
+
+    census = PIDCensus()
+    source = PacketSource(filehandle, packet_size, start, resync=True)
+    first = 0
+    try:
+        for (data, start, count) in source.chunks():
+            census.update(decodeHeaders(data, packet_size, start, count), first)
+            first += count
+    finally:
+        source.close()
+    filehandle.close()
+
+    print('------- PID Information -------')
+    print(('%-8s %12s %8s %12s %10s %14s %14s' \
+    %('PID', 'packets', 'share', 'scrambled', 'TEI', 'first packet', 'last packet')))
+    for i in census.report():
+        print(('0x%-6X %12d %7.2f%% %12d %10d %14d %14d' \
+        %(i["pid"], i["count"], i["share"]*100, i["scrambled"], i["transport_error"], i["first"], i["last"])))
+    print(('total packets = %d, PIDs = %d' %(census.total, len(census.counts))))
+    print('')
+
+def parsePCRStats(filehandle, packet_size, start=0):
+
+    analyzer = PCRAnalyzer(packet_size)
+    source = PacketSource(filehandle, packet_size, start, resync=True)
+    try:
+        analyzer.analyze(source)
+    finally:
+        source.close()
+    filehandle.close()
+
+    print('------- PCR Information -------')
+    for i in analyzer.report():
+        print(('PCR PID = 0x%X, PCR count = %d, discontinuities = %d, jumps = %d, wraps = %d' \
+        %(i["pid"], i["samples"], i["discontinuities"], i["jumps"], i["wraps"])))
+        if (i["interval_mean"] is None):
+            print('')
+            continue
+        print(('interval min/mean/max = %.3f/%.3f/%.3f ms, intervals over 40 ms = %d' \
+        %(i["interval_min"]*1e3, i["interval_mean"]*1e3, i["interval_max"]*1e3, i["interval_violations"])))
+        if (i["accuracy_mean"] is not None):
+            print(('accuracy mean/deviation/max = %.1f/%.1f/%.1f ns, errors over 500 ns = %d' \
+            %(i["accuracy_mean"], i["accuracy_deviation"], i["accuracy_max"], i["accuracy_violations"])))
+        if (i["bitrate"] is not None):
+            print(('bitrate = %.0f bit/s, drift = %.3f ppm' %(i["bitrate"], i["drift"])))
+        elif (i["drift"] is not None):
+            print(('drift = %.3f ppm' %i["drift"]))
+        for (low, high, count) in i["histogram"]:
+            if (low is None):
+                print(('jitter < %d ns: %d' %(high, count)))
+            elif (high is None):
+                print(('jitter >= %d ns: %d' %(low, count)))
+            else:
+                print(('jitter [%d, %d) ns: %d' %(low, high, count)))
+        print('')
+
+def reportIndicator(indicator, pid, packet, time):
+    if (pid is None):
+        pid_text = '-'
     else:
-        filehandle.close()
+        pid_text = '0x%X' %pid
+    if (time is None):
+        time_text = '-'
+    else:
+        time_text = '%.3f s' %time
+    print(('TR 101 290 %s %s, packet No. %d, PID = %s, time = %s' \
+    %(indicator, dict(INDICATORS)[indicator], packet, pid_text, time_text)))
 
-    print('================================================\n')
-    for i in range(len(EntryPESPacketNumList)):
-            print(('TPI = 0x%x, PTS = 0x%x, EntryPESPacketNum = 0x%x' %(TPIList[i], PTSList[i], EntryPESPacketNumList[i])))
+def parseTR101290(filehandle, packet_size, start=0, follow=False, idle_timeout=None):
 
+    monitor = TR101290Monitor(packet_size)
+    monitor.event_callback = reportIndicator
+    if follow:
+        source = FollowSource(filehandle, packet_size, start, True, idle_timeout)
+        source.wait_callback = flushOutput
+    else:
+        source = PacketSource(filehandle, packet_size, start, resync=True)
+    try:
+        monitor.analyze(source)
+    except KeyboardInterrupt:
+##      the way out of follow mode
+        if not follow:
+            raise
+    finally:
+        source.close()
+    filehandle.close()
+
+    print('------- TR 101 290 Information -------')
+    print(('%-6s %-36s %10s  %s' %('', 'indicator', 'errors', 'PIDs')))
+    for i in monitor.report():
+        pids = ', '.join([('-' if (p is None) else '0x%X' %p) + ':%d' %c \
+            for (p, c) in sorted(i["pids"].items(), key=lambda item: -1 if (item[0] is None) else item[0])])
+        print(('%-6s %-36s %10d  %s' %(i["indicator"], i["name"], i["count"], pids)))
+    print(('total packets = %d' %monitor.packets))
+    print('')
 
 def getFilename():
     root=tkinter.Tk()
@@ -528,31 +916,62 @@ def getFilename():
 def Main():
 
     description = "This is a python script for parsing MPEG-2 TS stream"
-    usage = "\n\t%prog -t <188|192|204> -m PAT\
-    \n\t%prog -t <188|192|204> -m <PMT|ES|SIT> PID\
+    usage = "\n\t%prog [-t <188|192|204>] -m PAT\
+    \n\t%prog [-t <188|192|204>] -m <PMT|ES|SIT> PID\
     \n\t%prog -s PCR \
+    \n\t%prog -s PIDS \
+    \n\t%prog -s PCRSTATS \
+    \n\t%prog -s TR101290 \
     \n\t%prog -s <PAT|PMT|SIT> --all \
     \n\t%prog -s <PAT|PMT|SIT> --unique\n\n \
     Example: TSParser.py -t 188 -m PMT 1fc8"
 
     cml_parser = OptionParser(description = description, usage=usage)
     cml_parser.add_option("-f", "--file", action="store", type="string", dest="filename", default="",
-        help="specify file name, if not specified, a file open dialogbox will be shown.")
+        help="specify file name, - for stdin, if not specified, a file open dialogbox will be shown.")
 
-    cml_parser.add_option("-t", "--type", action="store", type="int", dest="packet_size", default="188",
-        help="specify TS packet size[188, 192, 204], default = 188")
+    cml_parser.add_option("-t", "--type", action="store", type="int", dest="packet_size", default="0",
+        help="specify TS packet size[188, 192, 204], default = detected from the file")
 
     cml_parser.add_option("-m", "--mode", action="store", type="string", dest="mode", default="PAT",
         help="specify parsing mode[PAT, PMT, SIT, ES], default = PAT")
 
     cml_parser.add_option("-s", "--search", action="store", type="string", dest="searchItem", default="FFF",
-        help="search PAT/PMT/PCR/SIT packets and output Information.")
+        help="search PAT/PMT/PCR/SIT packets and output Information, count packets per PID with PIDS, analyse PCR interval, accuracy, jitter and drift per PCR PID with PCRSTATS, or monitor the TR 101 290 priority 1 and 2 indicators with TR101290.")
 
     cml_parser.add_option("--all", action="store_const", const=1, dest="psi_mode", default=0,
         help="Output all PAT/PMT/SIT packets Information. default, only the first one is output.")
 
     cml_parser.add_option("--unique", action="store_const", const=2, dest="psi_mode", default=0,
-        help="Output unique PAT/PMT/SIT packets Information. default, only the first one is output.")
+        help="Output unique PAT/PMT/SIT packets Information, a table again only when its version or CRC changes. default, only the first one is output.")
+
+    cml_parser.add_option("--crc", action="store_true", dest="verify_crc", default=False,
+        help="check the CRC_32 of PAT/PMT/SIT sections, and count the ones which fail.")
+
+    cml_parser.add_option("--index", action="store_true", dest="use_index", default=False,
+        help="answer ES and PCR queries from the .tsidx index next to the file, building it first if it is missing or out of date.")
+
+    cml_parser.add_option("--output-format", action="store", type="choice", choices=list(FORMATS),
+        dest="output_format", default="text",
+        help="output of -s PCR and -m ES[text, jsonl, csv, npz], default = text")
+
+    cml_parser.add_option("-o", "--output", action="store", type="string", dest="output", default="-",
+        help="file written with --output-format, default = - for stdout, npz needs a file")
+
+    cml_parser.add_option("--entry-map", action="store", type="string", dest="entry_map", default="",
+        help="with -m ES, save the IDR pictures of the whole file to an entry point map file for PTS lookups")
+
+    cml_parser.add_option("--follow", action="store_true", dest="follow", default=False,
+        help="like tail -f, wait for a file still being written to grow and parse the packets appended, until Ctrl-C.")
+
+    cml_parser.add_option("--idle-timeout", action="store", type="float", dest="idle_timeout", default=None,
+        help="with --follow, stop once the file has not grown for IDLE_TIMEOUT seconds, default = wait forever")
+
+    cml_parser.add_option("--profile", action="store", type="choice", choices=["table", "json"], dest="profile", default=None,
+        help="measure the time of every stage of the PAT, PMT, SIT, ES and PCR modes and count bytes, packets and units, printed at the end as a table or as JSON")
+
+    cml_parser.add_option("-j", "--jobs", action="store", type="int", dest="jobs", default=1,
+        help="number of processes used to scan the file in ES and PCR modes, default = 1")
 
     (opts, args) = cml_parser.parse_args(sys.argv)
 
@@ -567,7 +986,7 @@ def Main():
 
     if ((opts.searchItem != "FFF") & (opts.searchItem != "PAT") & \
         (opts.searchItem != "PMT") & (opts.searchItem != "PCR") &
-        (opts.searchItem != "SIT")):
+        (opts.searchItem != "SIT") & (opts.searchItem != "PIDS") & (opts.searchItem != "PCRSTATS") & (opts.searchItem != "TR101290")):
         cml_parser.print_help()
         return
 
@@ -575,18 +994,150 @@ def Main():
     if (opts.searchItem != "FFF"):
         psi_mode = opts.psi_mode
 
-    if (opts.filename == ""):
+    if (opts.entry_map != "") & ((opts.searchItem != "FFF") | (opts.mode != "ES")):
+        print('--entry-map applies to -m ES')
+        return
+
+    if (opts.profile is not None) & (opts.searchItem in ("PIDS", "PCRSTATS", "TR101290")):
+        print('--profile applies to the PAT, PMT, SIT, ES and PCR modes')
+        return
+
+    if opts.follow & ((opts.searchItem == "PIDS") | (opts.searchItem == "PCRSTATS")):
+        print('--follow applies to the PAT, PMT, SIT, ES, PCR and TR101290 modes')
+        return
+
+    filename = opts.filename
+    if (filename == ""):
         filename = getFilename()
     
     if (filename == ""):
         return
-    else:
-        filename = opts.filename
+
+##  events are written by a buffered writer instead of printed, and the
+##  messages go to stderr when the writer has stdout
+    stats = None
+    if (opts.profile is not None):
+        stats = Stats()
+    writer = None
+    if (opts.output_format != "text"):
+        if (opts.searchItem == "PCR"):
+            fields = PCR_FIELDS
+        elif ((opts.searchItem == "FFF") & (opts.mode == "ES")):
+            fields = PES_FIELDS
+        else:
+            print('--output-format applies to -s PCR and -m ES')
+            return
+        try:
+            writer = openWriter(opts.output_format, opts.output, fields, stats)
+        except (ValueError, RuntimeError, IOError) as e:
+            print(('Ooops! %s' %e))
+            return
+
+    messages = contextlib.nullcontext()
+    if (writer is not None) & (opts.output == '-'):
+        messages = contextlib.redirect_stdout(sys.stderr)
+    with messages:
+##      with --profile, the time spent printing is measured too
+        output = contextlib.nullcontext()
+        if stats is not None:
+            output = contextlib.redirect_stdout(TimedStream(sys.stdout, stats))
+        try:
+            with output:
+                parseFile(filename, opts, pid, psi_mode, writer, stats)
+        finally:
+            if writer is not None:
+                writer.close()
+        if (opts.profile == "table"):
+            print(stats.table())
+        elif (opts.profile == "json"):
+            print(stats.json())
+
+def waitSync(filehandle, idle_timeout=None):
+    "detectSync() again whenever the file grows, until it locks or the file stops growing for idle_timeout seconds"
+
+    size = os.fstat(filehandle.fileno()).st_size
+    idle = 0.0
+    while (idle_timeout is None) or (idle < idle_timeout):
+        time.sleep(FollowSource.poll_interval)
+        idle += FollowSource.poll_interval
+        if (os.fstat(filehandle.fileno()).st_size != size):
+            size = os.fstat(filehandle.fileno()).st_size
+            idle = 0.0
+            (start, packet_size) = detectSync(filehandle)
+            if (start >= 0):
+                return (start, packet_size)
+    return (-1, 0)
+
+def parseFile(filename, opts, pid, psi_mode, writer=None, stats=None):
+    "Run the mode selected by the command line options over filename"
 
     print(filename)
-    filehandle = open(filename,'rb')
+    filehandle = openStream(filename)
+
+##  lock onto the sync byte, and the packet size when it is not given
+    if (opts.packet_size == 0):
+        (start, packet_size) = detectSync(filehandle)
+##      a recording which has just started may not hold enough packets yet
+        if opts.follow & (start < 0) & isSeekable(filehandle):
+            (start, packet_size) = waitSync(filehandle, opts.idle_timeout)
+    else:
+        (start, packet_size) = detectSync(filehandle, sizes=(opts.packet_size,))
+        if (start < 0):
+            (start, packet_size) = (0, opts.packet_size)
+    if (start < 0):
+        print('Ooops! Can NOT found Sync_Byte! maybe something wrong with the file')
+        filehandle.close()
+        return
+    if (opts.packet_size == 0) | (start != 0):
+        print(('packet size = %d, first packet at offset 0x%X' %(packet_size, start)))
+
+##  the index and the process pool need a file to come back to,
+##  a pipe or stdin is read once from start to end instead.
+    use_index = (opts.use_index | (opts.jobs > 1))
+    if use_index & (not isSeekable(filehandle)):
+        print('--index and -j need a regular file, the stream is read once instead')
+        use_index = False
+
+##  a pipe or stdin already waits for more data, a file is polled
+    follow = opts.follow & isSeekable(filehandle)
+    if follow & use_index:
+        print('--index and -j read the file as it is, --follow reads it once instead')
+        use_index = False
+
+    if (opts.searchItem == "PIDS"):
+        parsePIDCensus(filehandle, packet_size, start)
+    elif (opts.searchItem == "PCRSTATS"):
+        parsePCRStats(filehandle, packet_size, start)
+    elif (opts.searchItem == "TR101290"):
+        parseTR101290(filehandle, packet_size, start, follow, opts.idle_timeout)
+    elif use_index & (((opts.searchItem == "FFF") & (opts.mode == "ES")) | (opts.searchItem == "PCR")):
+        if opts.use_index:
+            index = openIndex(filename, filehandle, packet_size, opts.jobs, start)
+        else:
+            index = buildIndex(filehandle, packet_size, opts.jobs, start)
+        filehandle.close()
+        parseTSIndex(index, opts.mode, pid, opts.searchItem, writer)
+        if stats is not None:
+            print('--profile measures a scan of the file, not --index or -j')
+        if (opts.entry_map != ""):
+            saveEntryMap(EntryPointMap.fromIndex(index, pid), opts.entry_map)
+    elif (opts.entry_map != ""):
+        entry_map = EntryPointMap(pid, packet_size, start)
+        parseTSMain(filehandle, packet_size, opts.mode, pid, psi_mode, opts.searchItem, start, opts.verify_crc, writer, entry_map,
+                    follow, opts.idle_timeout, stats)
+        saveEntryMap(entry_map, opts.entry_map)
+    else:
+        parseTSMain(filehandle, packet_size, opts.mode, pid, psi_mode, opts.searchItem, start, opts.verify_crc, writer, None,
+                    follow, opts.idle_timeout, stats)
 
-    parseTSMain(filehandle, opts.packet_size, opts.mode, pid, psi_mode, opts.searchItem)
+def saveEntryMap(entry_map, path):
+
+    try:
+        entry_map.save(path)
+    except (IOError, OSError):
+        print(('Can NOT write entry point map file %s' %path))
+        return
+    print(('entry point map of %d IDR pictures written to %s' %(len(entry_map), path)))
 
 
 if __name__ == "__main__":
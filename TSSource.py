@@ -0,0 +1,502 @@
+#this Python script is used to read MPEG-2 TS packets without per-field I/O
+
+"""Packet sources for MPEG-2 TS parsing.
+
+A PacketSource maps the whole file into memory, or reads it through one
+large reusable buffer when the file can not be mapped, and hands out the
+buffer together with the offset of each packet. Parsers index the bytes
+of the current packet directly instead of seeking and reading every field.
+
+probeSync() locks onto the sync byte and the packet size of a stream, and
+a PacketSource created with resync=True skips corrupt regions by locking
+onto the sync byte again instead of handing out broken packets.
+
+Pipes, FIFOs and stdin are read forward only, through the same bounded
+buffer; openStream() wraps them in a StreamReader, which detectSync() can
+peek at without consuming anything.
+
+A FollowSource reads a file which is still being written, like tail -f:
+at its end it waits for the file to grow and goes on with the packets
+appended since.
+"""
+
+import io
+import mmap
+import os
+import sys
+import time
+
+SYNC_BYTE = b'G'
+PACKET_SIZES = (188, 192, 204)
+
+def prefixLength(packet_size):
+    "192 bytes packets carry a 4 bytes timestamp in front of the TS header"
+    if packet_size == 192:
+        return 4
+    return 0
+
+def probeSync(data, sizes=PACKET_SIZES, threshold=0.9, minimum=4, lock=5, fallback=64):
+    """Find the first packet and the packet size of the stream held in data.
+
+    Every packet size and every phase is tried at once by counting sync bytes
+    in strided slices of data; the packet size of the best phase is taken
+    when its share of sync bytes reaches threshold over at least minimum
+    packets. When no phase does, as when a corrupt region shifts the
+    packets after it, the first half of data is probed again, down to
+    fallback packets. The first packet is then the first sync byte followed
+    by lock - 1 more at that size, so a recording cut or damaged near its
+    start loses as little as possible. Return (offset, packet_size), or (-1, 0).
+    """
+    best = (0.0, -1, 0)
+    for size in sizes:
+        packets = len(data) // size
+        if packets < minimum:
+            continue
+        for phase in range(size):
+            column = data[phase:phase+packets*size:size]
+            found = column.count(SYNC_BYTE)
+            if found > best[0]*len(column):
+                best = (float(found)/len(column), phase, size)
+    (ratio, phase, size) = best
+    if ratio < threshold:
+        half = len(data) // 2
+        if half >= fallback*max(sizes):
+            return probeSync(data[:half], sizes, threshold, minimum, lock, fallback)
+        return (-1, 0)
+    span = (min(lock, len(data) // size) - 1)*size
+    n = data.find(SYNC_BYTE)
+    while 0 <= n < phase:
+        run = data[n:n+span+1:size]
+        if len(run) > span // size and run.count(SYNC_BYTE) == len(run):
+            phase = n
+            break
+        n = data.find(SYNC_BYTE, n + 1)
+    offset = phase - prefixLength(size)
+    if offset < 0:
+        offset += size
+    return (offset, size)
+
+def isSeekable(filehandle):
+    try:
+        return filehandle.seekable()
+    except (AttributeError, ValueError, OSError):
+        return False
+
+class StreamReader(object):
+    "Forward only reader of a pipe, FIFO or stdin, which can look ahead without consuming"
+
+    def __init__(self, raw, name='-'):
+        self.raw = raw
+        self.name = name
+        self.pending = b''
+        self.position = 0
+
+    def seekable(self):
+        return False
+
+    def tell(self):
+        return self.position
+
+    def peek(self, size):
+        "Return the next size bytes, fewer at the end of the stream, and keep them for the next reads"
+        while len(self.pending) < size:
+            data = self.raw.read(size - len(self.pending))
+            if not data:
+                break
+            self.pending += data
+        return self.pending[:size]
+
+    def readinto(self, b):
+        if self.pending:
+            count = min(len(b), len(self.pending))
+            b[:count] = self.pending[:count]
+            self.pending = self.pending[count:]
+        else:
+            count = self.raw.readinto(b) or 0
+        self.position += count
+        return count
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            data = self.pending + self.raw.readall()
+        else:
+            data = self.peek(size)
+        self.pending = self.pending[len(data):]
+        self.position += len(data)
+        return data
+
+    def close(self):
+        self.raw.close()
+
+def openStream(name):
+    "Open a file for reading, '-' standing for stdin; pipes and FIFOs get a StreamReader"
+    if name == '-':
+        return StreamReader(io.open(sys.stdin.fileno(), 'rb', buffering=0, closefd=False))
+    raw = io.open(name, 'rb', buffering=0)
+    if isSeekable(raw):
+        return io.BufferedReader(raw)
+    return StreamReader(raw, name)
+
+def detectSync(filehandle, probe_size=256*1024, sizes=PACKET_SIZES):
+    """Probe the data at the current position of filehandle.
+
+    Return (file offset of the first packet, packet size), or (-1, 0); the
+    position of filehandle is left unchanged. A stream which can not seek
+    is only peeked at, from its read-ahead buffer.
+    """
+    if isSeekable(filehandle):
+        position = filehandle.tell()
+        data = filehandle.read(probe_size)
+        filehandle.seek(position, io.SEEK_SET)
+    else:
+        position = 0
+        data = filehandle.peek(probe_size)[:probe_size]
+    (offset, size) = probeSync(data, sizes)
+    if offset < 0:
+        return (-1, 0)
+    return (position + offset, size)
+
+class PacketSource(object):
+    "Iterate over the packets of a Transport Stream held in a shared buffer"
+
+    chunk_size = 4*1024*1024
+    #bytes kept after the current packet, so a PSI section that runs
+    #into the following packets can still be read from the same buffer
+    lookahead = 4096
+    #consecutive sync bytes needed to lock again after a corrupt region
+    sync_lock = 5
+
+    def __init__(self, filehandle, packet_size=188, start=0, end=None, resync=False):
+        self.filehandle = filehandle
+        self.packet_size = packet_size
+        self.start = start
+        #packets starting in [start, end) are read, end = None meaning the end of file
+        self.end = end
+        self.resync = resync
+        #called with (file offset, skipped bytes) whenever sync is locked again
+        self.resync_callback = None
+        #with resync, hand out a packet whose sync byte alone is wrong, the
+        #packets after it being in phase, instead of skipping it
+        self.keep_sync_errors = False
+        self.lost_bytes = 0
+        self.base = 0
+        #file offset following the last packet handed out or bytes skipped
+        self.position = start
+        #a stream which can not seek is handed out as soon as data arrives
+        self.streaming = not isSeekable(filehandle)
+        self.map = None
+        try:
+            self.map = mmap.mmap(filehandle.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, io.UnsupportedOperation, ValueError, OSError):
+            self.map = None
+
+    def offset(self, n):
+        "Return the file offset of position n in the buffer last handed out"
+        return self.base + n
+
+    def findPacket(self, offset):
+        """Return the file offset of the first packet at or after offset followed by sync_lock - 1 more, or -1.
+
+        This is where a resync search which starts at offset locks, so
+        ranges of a file cut there are read as one pass over it would.
+        """
+        size = self.packet_size
+        prefix = prefixLength(size)
+        data = self.map
+        base = 0
+        if data is None:
+            self.filehandle.seek(offset, io.SEEK_SET)
+            data = self.filehandle.read()
+            (base, offset) = (offset, 0)
+        n = self._findSync(data, offset + prefix, len(data), True)
+        if n < 0:
+            return -1
+        return base + n - prefix
+
+    def boundary(self, offset, end):
+        "Where a range of the file is cut near offset: the packet findPacket() finds there, or end"
+        if offset >= end:
+            return end
+        n = self.findPacket(offset)
+        if n < 0:
+            return end
+        return n
+
+    def packets(self):
+        """Yield (data, n) for every whole packet, data[n:n+packet_size] being the packet.
+
+        data is only valid until the next packet is requested.
+        """
+        size = self.packet_size
+        for (data, start, count) in self.chunks():
+            end = start + count*size
+            for n in range(start, end, size):
+                yield data, n
+
+    def chunks(self):
+        """Yield (data, start, count) for runs of whole packets.
+
+        data[start:start+count*packet_size] holds count packets; it is only
+        valid until the next chunk is requested.
+        """
+        if self.map is not None:
+            return self._mapped_chunks()
+        return self._buffered_chunks()
+
+    def _count(self, pos, limit):
+        "Number of whole packets from buffer position pos up to limit, and before end"
+        size = self.packet_size
+        count = (limit - pos) // size
+        if self.end is not None:
+            count = min(count, -(-(self.end - self.offset(pos)) // size))
+        return max(count, 0)
+
+    def _synced(self, data, pos, count):
+        "Number of packets from pos on which start with a sync byte"
+        size = self.packet_size
+        n = pos + prefixLength(size)
+        column = data[n:n+count*size:size]
+        if column.count(SYNC_BYTE) == count:
+            return count
+        return count - len(column.lstrip(SYNC_BYTE))
+
+    def _findSync(self, data, first, limit, final):
+        """Return the first sync byte position >= first followed by sync_lock - 1 more, or -1.
+
+        Unless final, a position is only accepted when all of its followers
+        are below limit.
+        """
+        size = self.packet_size
+        span = (self.sync_lock - 1)*size
+        last = limit
+        if not final:
+            last = limit - span
+        n = first - 1
+        while n + 1 < last:
+            n = data.find(SYNC_BYTE, n + 1, last)
+            if n < 0:
+                break
+            run = data[n:n+span+1:size]
+            if run.count(SYNC_BYTE) == len(run):
+                return n
+        return -1
+
+    def _inPhase(self, data, n, limit, final):
+        """Whether data[n] and the sync_lock - 1 positions a packet apart after it hold sync bytes.
+
+        When final, the positions from limit on are not looked at.
+        """
+        size = self.packet_size
+        last = n + (self.sync_lock - 1)*size + 1
+        if not final and last > limit:
+            return False
+        run = data[n:min(last, limit):size]
+        return len(run) > 0 and run.count(SYNC_BYTE) == len(run)
+
+    def _lost(self, begin, end):
+        self.lost_bytes += end - begin
+        if self.resync_callback is not None:
+            self.resync_callback(end, end - begin)
+
+    def _mapped_chunks(self):
+        data = self.map
+        size = self.packet_size
+        step = max(self.chunk_size // size, 1)
+        pos = self.start
+        while True:
+            count = min(step, self._count(pos, len(data)))
+            if count <= 0:
+                break
+            if self.resync:
+                good = self._synced(data, pos, count)
+                bad = pos + good*size
+                if good < count and self.keep_sync_errors and \
+                        self._inPhase(data, bad + size + prefixLength(size), len(data), True):
+                    count = good + 1
+                elif good < count:
+                    if good > 0:
+                        self.position = self.offset(pos) + good*size
+                        yield data, pos, good
+                    n = self._findSync(data, bad + prefixLength(size) + 1, len(data), True)
+                    if n < 0:
+                        self._lost(bad, len(data))
+                        self.position = len(data)
+                        break
+                    pos = n - prefixLength(size)
+                    self._lost(bad, pos)
+                    self.position = pos
+                    continue
+            self.position = self.offset(pos) + count*size
+            yield data, pos, count
+            pos += count*size
+
+    def _buffered_chunks(self):
+        size = self.packet_size
+        prefix = prefixLength(size)
+        if self.streaming:
+            self._skip(self.start - self.filehandle.tell())
+        elif self.start:
+            self.filehandle.seek(self.start, io.SEEK_SET)
+        self.base = self.start
+        buf = bytearray(self.chunk_size + self.lookahead)
+        view = memoryview(buf)
+        filled = 0
+        eof = False
+        #while sync is lost: where the search for a sync byte goes on, and
+        #the file offset of the first byte skipped
+        searching = None
+        lost = 0
+        try:
+            while True:
+                while not eof and filled < len(buf):
+                    count = self.filehandle.readinto(view[filled:])
+                    if not count:
+                        eof = True
+                    else:
+                        filled += count
+                        if self.streaming and filled >= self.lookahead + size:
+                            break
+
+                pos = 0
+                if searching is not None:
+                    n = self._findSync(buf, searching, filled, eof)
+                    if n < 0:
+                        if eof:
+                            self._lost(lost, self.offset(filled))
+                            self.position = self.offset(filled)
+                            break
+                        #keep the bytes which may still hold the next packet
+                        searched = max(searching, filled - (self.sync_lock - 1)*size)
+                        drop = max(searched - prefix, 0)
+                        buf[:filled-drop] = buf[drop:filled]
+                        filled -= drop
+                        self.base += drop
+                        searching = searched - drop
+                        continue
+                    pos = n - prefix
+                    self._lost(lost, self.offset(pos))
+                    self.position = self.offset(pos)
+                    searching = None
+
+                if eof:
+                    count = self._count(pos, filled)
+                else:
+                    count = self._count(pos, filled - self.lookahead)
+                if self.resync and count > 0:
+                    good = self._synced(buf, pos, count)
+                    bad = pos + good*size
+                    if good < count and self.keep_sync_errors and \
+                            self._inPhase(buf, bad + size + prefix, filled, eof):
+                        count = good + 1
+                    elif good < count:
+                        if good > 0:
+                            self.position = self.offset(pos) + good*size
+                            yield buf, pos, good
+                        lost = self.offset(bad)
+                        searching = bad + prefix + 1
+                        continue
+                if count > 0:
+                    self.position = self.offset(pos) + count*size
+                    yield buf, pos, count
+                n = pos + count*size
+                #a chunk cut after a packet kept with its sync error goes on
+                #with the packets following it, even at the end of file
+                if (eof and filled - n < size) or (self.end is not None and self.offset(n) >= self.end):
+                    break
+                buf[:filled-n] = buf[n:filled]
+                filled -= n
+                self.base += n
+        finally:
+            view.release()
+
+    def _skip(self, count):
+        "Read and drop count bytes of a stream which can not seek"
+        while count > 0:
+            data = self.filehandle.read(min(count, self.chunk_size))
+            if not data:
+                break
+            count -= len(data)
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+class FollowSource(PacketSource):
+    """Iterate over the packets of a file which is still being written.
+
+    Once the whole packets written so far are handed out, the size of the
+    file is polled every poll_interval seconds and the packets appended
+    since are handed out in turn, every byte being read once; a packet
+    written in part waits for the rest of it. Iteration ends when the file
+    has not grown for idle_timeout seconds, never when it is None, or
+    when the file gets shorter.
+    """
+
+    poll_interval = 0.25
+
+    def __init__(self, filehandle, packet_size=188, start=0, resync=False, idle_timeout=None):
+        super(FollowSource, self).__init__(filehandle, packet_size, start, None, resync)
+        self.idle_timeout = idle_timeout
+        #called before every wait for more data, to flush what was output
+        self.wait_callback = None
+        self.source = None
+        #where the next packet starts, and the end of the bytes reported lost
+        self.position = start
+        self.lost_until = start
+
+    def offset(self, n):
+        return self.source.offset(n)
+
+    def _sourceLost(self, end, skipped):
+        #a corrupt end of file is searched again once the file grows
+        begin = max(end - skipped, self.lost_until)
+        if end > begin:
+            self.lost_until = end
+            self._lost(begin, end)
+
+    def chunks(self):
+        size = self.packet_size
+        idle = 0.0
+        last_size = None
+        while True:
+            try:
+                file_size = os.fstat(self.filehandle.fileno()).st_size
+            except (AttributeError, io.UnsupportedOperation, OSError):
+                break
+            if file_size < self.position:
+                break
+            #while the file grows, the packets of its last lookahead bytes
+            #wait for the ones following them, as in a buffered read
+            reserve = 0
+            if file_size != last_size:
+                reserve = self.lookahead
+            last_size = file_size
+            whole = (file_size - self.position - reserve) // size
+            if whole <= 0:
+                if reserve:
+                    continue
+                if self.idle_timeout is not None and idle >= self.idle_timeout:
+                    break
+                if self.wait_callback is not None:
+                    self.wait_callback()
+                time.sleep(self.poll_interval)
+                idle += self.poll_interval
+                continue
+            idle = 0.0
+            self.source = PacketSource(self.filehandle, size, self.position, self.position + whole*size, self.resync)
+            self.source.resync_callback = self._sourceLost
+            self.source.keep_sync_errors = self.keep_sync_errors
+            try:
+                for (data, start, count) in self.source.chunks():
+                    self.position = self.source.offset(start) + count*size
+                    yield data, start, count
+            finally:
+                self.source.close()
+            #bytes skipped by resync up to the end are not searched again
+            self.position = max(self.position, self.lost_until)
+
+    def close(self):
+        if self.source is not None:
+            self.source.close()
+        super(FollowSource, self).close()
@@ -0,0 +1,114 @@
+#this Python script is used to find where the time of parsing MPEG-2 TS streams goes
+
+"""Opt-in counters and stage timers of the parsers.
+
+A Stats object is handed to TSStream(stats=) or TSParser.parseTSMain(stats=);
+without one every hook is a single `is not None` test, so a parse which is
+not profiled runs as before. Counters are
+
+    bytes_read       bytes of the packets handed out by the PacketSource
+    packets_decoded  packet headers decoded
+    pes_units        PES completed (TSStream) or PES headers parsed
+    psi_units        PSI sections completed
+    bytes_copied     bytes copied to join the payload pieces of a unit
+    dispatches       workers created by TSPayloadFactory.dispatch_worker
+
+and stages are timed with time.perf_counter(), each with the number of
+times it was entered. A stage which calls another one includes its time;
+output, the time spent writing to stdout or to an event writer opened
+with the same Stats (TSOutput.openWriter(stats=)), is also counted in the
+stage which printed. With a memory mapped file the pages
+are read when first touched, so part of the I/O shows up in the stage
+which first looks at a packet rather than in read.
+"""
+
+import json
+import time
+
+COUNTERS = ("bytes_read", "packets_decoded", "pes_units", "psi_units", "bytes_copied", "dispatches")
+
+class Stats(object):
+    "Counters and stage timers of one parse"
+
+    def __init__(self):
+        self.clock = time.perf_counter
+        self.started = self.clock()
+        self.counters = dict((name, 0) for name in COUNTERS)
+        #seconds and calls by stage, in the order stages were first entered
+        self.times = dict()
+        self.calls = dict()
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def add(self, stage, begin):
+        "Account for one pass through stage, which began at clock() == begin"
+        self.times[stage] = self.times.get(stage, 0.0) + (self.clock() - begin)
+        self.calls[stage] = self.calls.get(stage, 0) + 1
+
+    def iterate(self, stage, iterable):
+        "Hand out the items of iterable, timing the wait for every item as stage"
+        items = iter(iterable)
+        while True:
+            begin = self.clock()
+            try:
+                item = next(items)
+            except StopIteration:
+                self.add(stage, begin)
+                return
+            self.add(stage, begin)
+            yield item
+
+    def chunks(self, chunks, packet_size, stage="read"):
+        "Hand out the (data, start, count) of chunks, counting their bytes and timing their reading as stage"
+        for (data, start, count) in self.iterate(stage, chunks):
+            self.count("bytes_read", count*packet_size)
+            yield data, start, count
+
+    def packets(self, source, stage="read"):
+        "Hand out the (data, n) of every packet of a TSSource.PacketSource like its packets(), timing their reading as stage"
+        size = source.packet_size
+        for (data, start, count) in self.chunks(source.chunks(), size, stage):
+            for n in range(start, start + count*size, size):
+                yield data, n
+
+    def report(self):
+        "Return the counters and the stages as a dict of builtin types"
+        elapsed = self.clock() - self.started
+        stages = [{"stage":stage, "seconds":seconds, "calls":self.calls[stage],
+                   "share":seconds/elapsed if elapsed else 0.0} for (stage, seconds) in self.times.items()]
+        return {"elapsed":elapsed, "counters":dict(self.counters), "stages":stages}
+
+    def json(self):
+        return json.dumps(self.report())
+
+    def table(self):
+        report = self.report()
+        lines = ['------- Profile Information -------',
+                 '%-20s %12s %8s %12s' %('stage', 'seconds', 'share', 'calls')]
+        for s in report["stages"]:
+            lines.append('%-20s %12.3f %7.1f%% %12d' %(s["stage"], s["seconds"], s["share"]*100, s["calls"]))
+        lines.append('%-20s %12.3f' %('elapsed', report["elapsed"]))
+        lines.append('')
+        lines.append('%-20s %12s' %('counter', 'value'))
+        for name in COUNTERS:
+            lines.append('%-20s %12d' %(name, report["counters"].get(name, 0)))
+        return '\n'.join(lines)
+
+class TimedStream(object):
+    "A text stream whose write() is timed as stage of stats, for timing print()"
+
+    def __init__(self, stream, stats, stage="output"):
+        self.stream = stream
+        self.stats = stats
+        self.stage = stage
+
+    def write(self, text):
+        begin = self.stats.clock()
+        try:
+            return self.stream.write(text)
+        finally:
+            self.stats.add(self.stage, begin)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
@@ -1,9 +1,18 @@
 __author__ = 'xiao'
 
+import collections
 import io
+import os
+import pickle
 import struct
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from ctypes import *
+from TSSource import PacketSource, FollowSource, probeSync, prefixLength, isSeekable
+import TSView
+from TSSection import SectionCache, sectionKey, sectionCRCValid
+from TSPCR import PCR_HZ, PCR_WRAP
+from TSNAL import accessUnitType
 
 def _from_bytes(input_bytes, byteorder='big'):
     length = len(input_bytes)
@@ -26,13 +35,13 @@ def integer_from_bytes(input_bytes, byteorder='big'):
 class PTSPattern(Union):
     class _Pattern(BigEndianStructure):
         _fields_ = [
-            ('prefix', c_uint, 4),
-            ('pts1', c_uint, 3),
-            ('marker', c_uint, 1),
-            ('pts2', c_uint, 15),
-            ('marker', c_uint, 1),
-            ('pts3', c_uint, 15),
-            ('marker', c_uint, 1),]
+            ('prefix', c_uint64, 4),
+            ('pts1', c_uint64, 3),
+            ('marker_bit0', c_uint64, 1),
+            ('pts2', c_uint64, 15),
+            ('marker_bit1', c_uint64, 1),
+            ('pts3', c_uint64, 15),
+            ('marker_bit2', c_uint64, 1),]
     _anonymous_ = ('bits',)
     _pattern_type = c_uint8 * 5
     _fields_ = [('bits', _Pattern),
@@ -48,15 +57,15 @@ class PTSPattern(Union):
 class ESCRPattern(Union):
     class _Pattern(BigEndianStructure):
         _fields_ = [
-            ('reserved', c_uint, 2),
-            ('ESCR_base0', c_uint, 3),
-            ('marker_bit0', c_uint, 1),
-            ('ESCR_base1', c_uint, 15),
-            ('marker_bit1', c_uint, 1),
-            ('ESCR_base2', c_uint, 15),
-            ('marker_bit2', c_uint, 1),
-            ('ESCR_extension', c_uint, 9),
-            ('marker_bit3', c_uint, 1),]
+            ('reserved', c_uint64, 2),
+            ('ESCR_base0', c_uint64, 3),
+            ('marker_bit0', c_uint64, 1),
+            ('ESCR_base1', c_uint64, 15),
+            ('marker_bit1', c_uint64, 1),
+            ('ESCR_base2', c_uint64, 15),
+            ('marker_bit2', c_uint64, 1),
+            ('ESCR_extension', c_uint64, 9),
+            ('marker_bit3', c_uint64, 1),]
     _anonymous_ = ('bits',)
     _pattern_type = c_uint8 * 6
     _fields_ = [('bits', _Pattern),
@@ -136,6 +145,13 @@ class PES(Union):
         ("int", _prefix_type)
         ]
 
+    @property
+    def AUType(self):
+        "Access unit type of a video PES, see TSNAL.accessUnitType(); None for the other streams"
+        if getattr(self, '_AUType', None) is None and (self.stream_id & 0xF0) == 0xE0:
+            self._AUType = accessUnitType(self.stream.payload)
+        return getattr(self, '_AUType', None)
+
     def isPaddingStream(self):
         if self.stream_id == 0xBE:
             return True
@@ -266,17 +282,17 @@ class PES(Union):
 
 class PAT(Union):
     class _PAT(BigEndianStructure):
-        _fields_ = [("table_id", c_uint, 8),
-                    ("section_syntax_indicator", c_uint, 1),
-                    ("void_0", c_uint, 1),
-                    ("reserved_0", c_uint, 2),
-                    ("section_length", c_uint, 12),
-                    ("transport_stream_id", c_uint, 16),
-                    ("reserved_1", c_uint, 2),
-                    ("version_number", c_uint, 5),
-                    ("current_next_indicator", c_uint, 1),
-                    ("section_number", c_uint, 8),
-                    ("last_section_number", c_uint, 8)]
+        _fields_ = [("table_id", c_uint64, 8),
+                    ("section_syntax_indicator", c_uint64, 1),
+                    ("void_0", c_uint64, 1),
+                    ("reserved_0", c_uint64, 2),
+                    ("section_length", c_uint64, 12),
+                    ("transport_stream_id", c_uint64, 16),
+                    ("reserved_1", c_uint64, 2),
+                    ("version_number", c_uint64, 5),
+                    ("current_next_indicator", c_uint64, 1),
+                    ("section_number", c_uint64, 8),
+                    ("last_section_number", c_uint64, 8)]
     _anonymous_ = ("bits",)
     _header_type = c_uint8 * 8
     _fields_ = [("bits", _PAT),
@@ -291,12 +307,16 @@ class PAT(Union):
             self.program_list.append({"program_number":program_number, "pid":pid})
         self.CRC_32 = integer_from_bytes(d.read(4), byteorder='big')     
 
-    def __init__(self, data):
+    def __init__(self, data, verify=False):
         super(PAT, self).__init__()
         self.structure_length = 8
         d = io.BytesIO(data)
         pointer_field = struct.unpack(">B", d.read(1))[0]
         d.read(pointer_field)
+        #True or False when verify is set, whether CRC_32 matches the section
+        self.crc_valid = None
+        if verify:
+            self.crc_valid = sectionCRCValid(data, 1 + pointer_field)
         ins = _from_bytes(d.read(self.structure_length), byteorder='big')
         self.int = PAT._header_type(*ins)
         self.program_list = list()
@@ -304,17 +324,17 @@ class PAT(Union):
 
 class PMT(Union):
     class _PMT(BigEndianStructure):
-        _fields_ = [("table_id", c_uint, 8),
-                    ("section_syntax_indicator", c_uint, 1),
-                    ("void_0", c_uint, 1),
-                    ("reserved_0", c_uint, 2),
-                    ("section_length", c_uint, 12),
-                    ("program_num", c_uint, 16),
-                    ("reserved_1", c_uint, 2),
-                    ("version_number", c_uint, 5),
-                    ("current_next_indicator", c_uint, 1),
-                    ("section_number", c_uint, 8),
-                    ("last_section_number", c_uint, 8),
+        _fields_ = [("table_id", c_uint64, 8),
+                    ("section_syntax_indicator", c_uint64, 1),
+                    ("void_0", c_uint64, 1),
+                    ("reserved_0", c_uint64, 2),
+                    ("section_length", c_uint64, 12),
+                    ("program_num", c_uint64, 16),
+                    ("reserved_1", c_uint64, 2),
+                    ("version_number", c_uint64, 5),
+                    ("current_next_indicator", c_uint64, 1),
+                    ("section_number", c_uint64, 8),
+                    ("last_section_number", c_uint64, 8),
                     ("reserved_2", c_uint, 3),
                     ("PCR_PID", c_uint, 13),
                     ("reserved_3", c_uint, 4),
@@ -336,12 +356,16 @@ class PMT(Union):
             length = length - 5 - es_info_length
         self.CRC_32 = integer_from_bytes(d.read(4), byteorder='big')
 
-    def __init__(self, data):
+    def __init__(self, data, verify=False):
         super(PMT, self).__init__()
         self.structure_length = 12
         d = io.BytesIO(data)
         pointer_field = struct.unpack(">B", d.read(1))[0]
         d.read(pointer_field)
+        #True or False when verify is set, whether CRC_32 matches the section
+        self.crc_valid = None
+        if verify:
+            self.crc_valid = sectionCRCValid(data, 1 + pointer_field)
         ins = _from_bytes(d.read(self.structure_length), byteorder='big')
         self.int = PMT._header_type(*ins)
         self.es_list = list()
@@ -349,19 +373,63 @@ class PMT(Union):
 
 class TSPayloadFactory(object):
     "Generate Transport Stream PES or PSI based on payload"
-    def __init__(self):
+    def __init__(self, views=False, max_pes_size=None, pes_callback=None, verify_crc=False):
         super(TSPayloadFactory, self).__init__()
         self.workers = dict()
         self.pid_type_map = dict()
+        #PES larger than max_pes_size bytes are dropped; with pes_callback
+        #PES payload is handed out packet by packet instead of reassembled
+        self.max_pes_size = max_pes_size
+        self.pes_callback = pes_callback
+        #the classes payloads are decoded with, the TSView ones when views is set
+        if views:
+            (self.PES, self.PAT, self.PMT) = (TSView.PES, TSView.PAT, TSView.PMT)
+        else:
+            (self.PES, self.PAT, self.PMT) = (PES, PAT, PMT)
+        #decoded PSI sections, so repetitions of a PAT or PMT are not decoded again
+        self.sections = SectionCache()
+        #with verify_crc, sections failing their CRC_32 check are counted and dropped
+        self.verify_crc = verify_crc
+        self.crc_errors = 0
+        #a TSStats.Stats of the parse, when profiled
+        self.stats = None
+
+    def verifySection(self, data, k):
+        "Whether the section at data[k] may be used: its CRC_32 is valid or is not checked"
+        if self.verify_crc and not sectionCRCValid(data, k):
+            self.crc_errors += 1
+            return False
+        return True
     
     class Worker(object):
         "Parse specific pid payload"
-        def __init__(self, pid, start_indicator = False):
+        def __init__(self, pid, start_indicator = False, max_size = None):
             self.pid = pid
             self.start_indicator = start_indicator
             self.type = ""
-            self.cache = bytearray()
+            #payload of the current unit, joined once when it is parsed
+            self.pieces = list()
+            self.size = 0
+            self.max_size = max_size
+            self.overflows = 0
             self.queue = list()
+            self.stats = None
+
+        @property
+        def cache(self):
+            "The payload of the current unit as one bytes object"
+            if len(self.pieces) > 1:
+                self.pieces = [b''.join(self.pieces)]
+                if self.stats is not None:
+                    self.stats.count("bytes_copied", len(self.pieces[0]))
+            if self.pieces:
+                return self.pieces[0]
+            return b''
+
+        @cache.setter
+        def cache(self, data):
+            self.pieces = [data]
+            self.size = len(data)
 
         def parse(self):
             "Implement in subclass"
@@ -372,11 +440,33 @@ class TSPayloadFactory(object):
             if start_indicator == True:
                 if not self.type:
                     self.type = self.probe(data)
-                if len(self.cache) > 0:
-                    self.parse()
+                if self.size > 0:
+                    if self.stats is None:
+                        self.parse()
+                    else:
+                        self.parseTimed()
                 self.cache = data
+                self.start_indicator = True
+            elif self.start_indicator:
+                #continuation data before the first unit start can not be parsed
+                self.pieces.append(data)
+                self.size += len(data)
+                if self.max_size is not None and self.size > self.max_size:
+                    #drop the unit and wait for the next start
+                    self.overflows += 1
+                    self.cache = b''
+                    self.start_indicator = False
+
+        def parseTimed(self):
+            "parse(), timed and counted as a PES or PSI unit"
+            begin = self.stats.clock()
+            self.parse()
+            if self.type == 'PES':
+                self.stats.add("PES", begin)
+                self.stats.count("pes_units")
             else:
-                self.cache += data
+                self.stats.add("PSI", begin)
+                self.stats.count("psi_units")
 
         def feedback(self):
             "Try to return a complete PES or PSI"
@@ -398,8 +488,18 @@ class TSPayloadFactory(object):
             self.factory_instance = instance
 
         def parse(self):
-            item = PAT(self.cache)
+            data = self.cache
+            if not self.factory_instance.verifySection(data, 1 + data[0]):
+                return
+            key = sectionKey(self.pid, data, 1 + data[0])
+            item = self.factory_instance.sections.get(key)
+            if item is not None:
+                #an unchanged repetition, already reported
+                self.queue.append(item)
+                return
+            item = self.factory_instance.PAT(data)
             if item:
+                self.factory_instance.sections.put(key, item)
                 info = list()
                 for p in item.program_list:
                     if p['program_number'] == 0:
@@ -418,8 +518,18 @@ class TSPayloadFactory(object):
             self.factory_instance = instance
 
         def parse(self):
-            item = PMT(self.cache)
+            data = self.cache
+            if not self.factory_instance.verifySection(data, 1 + data[0]):
+                return
+            key = sectionKey(self.pid, data, 1 + data[0])
+            item = self.factory_instance.sections.get(key)
+            if item is not None:
+                #an unchanged repetition, already reported
+                self.queue.append(item)
+                return
+            item = self.factory_instance.PMT(data)
             if item:
+                self.factory_instance.sections.put(key, item)
                 info = list()
                 for es in item.es_list:
                     i = {"type":"PES", "pid":es["elementary_PID"]}
@@ -428,12 +538,23 @@ class TSPayloadFactory(object):
                 self.queue.append(item)
 
     class PESWorker(Worker):
-        def __init__(self, pid, payload_unit_start_indicator):
-            super(TSPayloadFactory.PESWorker, self).__init__(pid, payload_unit_start_indicator)
+        def __init__(self, pid, payload_unit_start_indicator, decoder=PES, max_size=None, callback=None):
+            super(TSPayloadFactory.PESWorker, self).__init__(pid, payload_unit_start_indicator, max_size)
             self.type = 'PES'
-        
+            self.decoder = decoder
+            self.callback = callback
+
+        def feed(self, data, start_indicator = False):
+            if self.callback is None:
+                return super(TSPayloadFactory.PESWorker, self).feed(data, start_indicator)
+            #streaming: hand the payload of every packet out as (pid, data, start)
+            if start_indicator:
+                self.start_indicator = True
+            if self.start_indicator:
+                self.callback(self.pid, data, start_indicator)
+
         def parse(self):
-            item = PES(self.cache)
+            item = self.decoder(self.cache)
             if item and item.packet_start_code_prefix == 1:
                 self.queue.append(item)
 
@@ -452,7 +573,8 @@ class TSPayloadFactory(object):
             pid_type = self.pid_type_map[pid]            
         except KeyError:
             if data[0:3] == b'\x00\x00\x01' and payload_unit_start_indicator:
-                worker = TSPayloadFactory.PESWorker(pid, payload_unit_start_indicator)
+                worker = TSPayloadFactory.PESWorker(pid, payload_unit_start_indicator, self.PES,
+                                                    self.max_pes_size, self.pes_callback)
                 self.pid_type_map[pid] = 'PES'
             else:
                 print("About pid %d, info not found in previous packet" % (pid))
@@ -461,9 +583,13 @@ class TSPayloadFactory(object):
             if pid_type == "PMT":
                 worker = TSPayloadFactory.PMTWorker(pid, payload_unit_start_indicator, TSPayloadFactory.report_callback, factory_instance)
             elif pid_type == "PES":
-                worker = TSPayloadFactory.PESWorker(pid, payload_unit_start_indicator)
+                worker = TSPayloadFactory.PESWorker(pid, payload_unit_start_indicator, self.PES,
+                                                    self.max_pes_size, self.pes_callback)
         #dispatch PMT and other workers here
         if worker:
+            worker.stats = self.stats
+            if self.stats is not None:
+                self.stats.count("dispatches")
             worker.feed(data, payload_unit_start_indicator)
         return worker
     
@@ -483,6 +609,37 @@ class TSPayloadFactory(object):
         except KeyError:
             return None
 
+    def getState(self):
+        """Return what the factory knows of the stream as builtin types, for TSStream checkpoints.
+
+        Every worker is kept with the payload of its unfinished unit, a
+        partial PES or PSI section. Decoded sections are not: a table is
+        decoded once more after a restore.
+        """
+        workers = dict()
+        for (pid, worker) in self.workers.items():
+            workers[pid] = {"type":worker.type, "start_indicator":worker.start_indicator,
+                            "cache":worker.cache, "overflows":worker.overflows}
+        return {"pid_type_map":dict(self.pid_type_map), "workers":workers, "crc_errors":self.crc_errors}
+
+    def setState(self, state):
+        "Take back the state returned by getState()"
+        self.pid_type_map = dict(state["pid_type_map"])
+        self.crc_errors = state["crc_errors"]
+        self.workers = dict()
+        for (pid, w) in state["workers"].items():
+            if w["type"] == 'PAT':
+                worker = TSPayloadFactory.PATWorker(pid, w["start_indicator"], TSPayloadFactory.report_callback, self)
+            elif w["type"] == 'PMT':
+                worker = TSPayloadFactory.PMTWorker(pid, w["start_indicator"], TSPayloadFactory.report_callback, self)
+            else:
+                worker = TSPayloadFactory.PESWorker(pid, w["start_indicator"], self.PES,
+                                                    self.max_pes_size, self.pes_callback)
+            worker.cache = w["cache"]
+            worker.overflows = w["overflows"]
+            worker.stats = self.stats
+            self.workers[pid] = worker
+
     def report_callback(self, src_type, info):
         if src_type == 'PAT' or src_type == 'PMT':
             for i in info:
@@ -518,16 +675,16 @@ class TSHeader(Union):
         self.int = TSHeader._header_type(*ins)
 
 class TSAdaptationField(Union):
+    "Adaptation field, built from the bytes following adaptation_field_length"
     class _AdaptationField(BigEndianStructure):
-        _fields_ = [("adaptation_field_length", c_uint16, 8),
-                    ("discontinuity_indicator", c_uint16, 1),
-                    ("random_access_indicator", c_uint16, 1),
-                    ("elementary_stream_priority_indicator", c_uint16, 1),
-                    ("PCR_flag", c_uint16, 1),
-                    ("OPCR_flag", c_uint16, 1),
-                    ("splicing_point_flag", c_uint16, 1),
-                    ("transport_private_data_flag", c_uint16, 1),
-                    ("adaptation_field_extension_flag", c_uint16, 1),]
+        _fields_ = [("discontinuity_indicator", c_uint8, 1),
+                    ("random_access_indicator", c_uint8, 1),
+                    ("elementary_stream_priority_indicator", c_uint8, 1),
+                    ("PCR_flag", c_uint8, 1),
+                    ("OPCR_flag", c_uint8, 1),
+                    ("splicing_point_flag", c_uint8, 1),
+                    ("transport_private_data_flag", c_uint8, 1),
+                    ("adaptation_field_extension_flag", c_uint8, 1),]
 
     class PCR(Union):
         class _PCR(BigEndianStructure):
@@ -546,16 +703,19 @@ class TSAdaptationField(Union):
             self.int = TSAdaptationField.PCR._field_type(*ins)
 
     _anonymous_ = ("bits", )
-    _field_type = c_uint8 * 2
+    _field_type = c_uint8 * 1
     _fields_ = [("bits", _AdaptationField),
                 ("int", _field_type)]
-    field_length = 2
+    field_length = 1
 
     def __init__(self, data):
         super(TSAdaptationField, self).__init__()
+        #the flags follow adaptation_field_length, which TSPacket has read
+        self.adaptation_field_length = len(data)
         d = io.BytesIO(data)
-        ins = _from_bytes(d.read(TSAdaptationField.field_length), byteorder='big')
-        self.int = TSAdaptationField._field_type(*ins)
+        if data:
+            ins = _from_bytes(d.read(TSAdaptationField.field_length), byteorder='big')
+            self.int = TSAdaptationField._field_type(*ins)
 
         if (self.PCR_flag == 1):
             self.pcr = self.PCR(d.read(TSAdaptationField.PCR.field_length))
@@ -567,7 +727,9 @@ class TSAdaptationField(Union):
 class TSPacket(object):
 
     def parse(self, data):
-        d = io.BytesIO(data)
+        #drop the timestamp of 192 bytes packets and the parity of 204 bytes ones
+        prefix = prefixLength(len(data))
+        d = io.BytesIO(data[prefix:prefix+188])
         self.head = TSHeader(d.read(TSHeader.header_length))
         if self.head.adaptation_field_ctrl & 0x2:
             #Parse adapation_field data
@@ -586,23 +748,258 @@ class TSPacket(object):
         self.packet_length = len(packet_data)
         self.parse(packet_data)
 
-class TSStream(object):
-
+class TSUnit(object):
+    "A payload unit reassembled by a parallel parse worker"
+    #units carrying a PES start code are parsed by the worker; the raw bytes
+    #are only kept for the others, which are usually PSI sections
+    def __init__(self, pid, offset, pieces, decoder=PES):
+        self.pid = pid
+        self.offset = offset
+        #what the serial dispatch_worker() looks at: the first packet payload
+        self.prefix = pieces[0][0:3]
+        self.raw = None
+        self.pes = None
+        self.error = None
+        data = b''.join(pieces)
+        if data[0:3] == b'\x00\x00\x01':
+            try:
+                self.pes = decoder(data)
+            except Exception as e:
+                self.error = e
+        else:
+            self.raw = data
+        self.size = len(data)
+        self.empty = self.size == 0
+
+def _headerPID(data, n, prefix):
+    "PID of the packet at data[n:], read straight from the header bytes"
+    return ((data[n+prefix+1] & 0x1F) << 8) | data[n+prefix+2]
+
+def _parseRange(path, begin, end, packet_length, pids=None, views=False, start=None):
+    """Reassemble the payload units of the packets of path in [begin, end).
+
+    When pids is given, packets of other PIDs are dropped from their header.
+    With views, packets and PES are decoded with the TSView classes. Unless
+    start is None, begin (when it is not start) and end are first moved to
+    the packet a resync search from them locks onto, as a scan of the whole
+    file would cut them.
+
+    Units are keyed by the file offset of their first packet, which stays
+    right when a corrupt region is skipped. Return (heads, units, tails,
+    continuity), each a dict by PID: heads holds the payload seen before the
+    first unit start of the PID, units the TSUnit objects started and
+    finished in the range, tails the (offset, payload list) of the unit
+    still open at end, and continuity the [first, last, errors]
+    continuity_counter of the payload packets, errors being counted within
+    the range only, followed by the range as parsed and the file offset a
+    scan would go on from.
+    """
+    heads = dict()
+    units = dict()
+    tails = dict()
+    continuity = dict()
+    prefix = prefixLength(packet_length)
+    (packet_type, decoder) = (TSPacket, PES)
+    if views:
+        (packet_type, decoder) = (TSView.TSPacket, TSView.PES)
+    with open(path, 'rb') as f:
+        if start is not None:
+            size = os.fstat(f.fileno()).st_size
+            source = PacketSource(f, packet_length, begin, end, resync=True)
+            try:
+                if begin != start:
+                    begin = source.boundary(begin, size)
+                end = source.boundary(end, size)
+            finally:
+                source.close()
+        source = PacketSource(f, packet_length, begin, end, resync=True)
+        try:
+            for (data, n) in source.packets():
+                if pids is not None and _headerPID(data, n, prefix) not in pids:
+                    continue
+                p = packet_type(data[n:n+packet_length])
+                pid = p.head.pid
+                if p.head.adaptation_field_ctrl & 0x1:
+                    cc = p.head.continuity_counter
+                    counters = continuity.get(pid)
+                    if counters is None:
+                        continuity[pid] = [cc, cc, 0]
+                    else:
+                        last = counters[1]
+                        #a packet may be sent twice, with the same continuity_counter
+                        if cc != last and cc != (last + 1) & 0xF:
+                            counters[2] += 1
+                        counters[1] = cc
+                    if p.head.payload_unit_start_indicator:
+                        if pid in tails:
+                            (start, pieces) = tails[pid]
+                            units.setdefault(pid, []).append(TSUnit(pid, start, pieces, decoder))
+                        tails[pid] = (source.offset(n), [p.payload])
+                    elif pid in tails:
+                        tails[pid][1].append(p.payload)
+                    else:
+                        heads.setdefault(pid, []).append(p.payload)
+        finally:
+            source.close()
+    return heads, units, tails, continuity, begin, source.position
+
+def _parseRangeJob(args):
+    return _parseRange(*args)
+
+def pesMetadata(pes):
+    "Return the header fields of a PES, of either representation, as a dict without its payload"
+    info = {"stream_id":pes.stream_id, "pes_packet_length":pes.pes_packet_length,
+            "PTS":None, "DTS":None, "payload_length":None, "AUType":None}
+    stream = getattr(pes, 'stream', None)
+    if stream is not None:
+        if getattr(stream, 'PTS', None) is not None:
+            info["PTS"] = stream.PTS.value
+        if getattr(stream, 'DTS', None) is not None:
+            info["DTS"] = stream.DTS.value
+        info["payload_length"] = len(stream.payload)
+        info["AUType"] = pes.AUType
+    return info
+
+class PIDMapSink(object):
+    "Keep every unit in a list per PID, as TSStream.PIDMap always did"
     def __init__(self):
         self.PIDMap = dict()
-        self.payload_parser = TSPayloadFactory()
 
+    def add(self, pid, item):
+        try:
+            self.PIDMap[pid].append(item)
+        except KeyError:
+            self.PIDMap[pid] = [item]
+
+class RingSink(PIDMapSink):
+    "Keep only the last size units of every PID"
+    def __init__(self, size):
+        super(RingSink, self).__init__()
+        self.size = size
+
+    def add(self, pid, item):
+        try:
+            queue = self.PIDMap[pid]
+        except KeyError:
+            queue = self.PIDMap[pid] = collections.deque(maxlen=self.size)
+        queue.append(item)
+
+class MetadataSink(PIDMapSink):
+    "Keep PSI tables as they are, and only the pesMetadata() of every PES"
+    def add(self, pid, item):
+        if hasattr(item, 'packet_start_code_prefix'):
+            item = pesMetadata(item)
+        super(MetadataSink, self).add(pid, item)
+
+class CallbackSink(PIDMapSink):
+    "Hand every unit to callback(pid, item) as it is produced, PIDMap only counting them"
+    def __init__(self, callback):
+        super(CallbackSink, self).__init__()
+        self.callback = callback
+
+    def add(self, pid, item):
+        self.PIDMap[pid] = self.PIDMap.get(pid, 0) + 1
+        self.callback(pid, item)
+
+def _seconds(value):
+    "Seconds of a time given as a number or as a [[HH:]MM:]SS[.sss] string"
+    if not isinstance(value, str):
+        return float(value)
+    seconds = 0.0
+    for field in value.split(':'):
+        seconds = seconds*60 + float(field)
+    return seconds
+
+class PCRSample(object):
+    "A PCR read by TSStream.seek_time()"
+    __slots__ = ('offset', 'pid', 'pcr', 'discontinuity', 'rate', 'time')
+
+    def __init__(self, offset, pid, pcr, discontinuity=False):
+        #file offset of the packet, PCR in 27 MHz ticks
+        self.offset = offset
+        self.pid = pid
+        self.pcr = pcr
+        self.discontinuity = discontinuity
+        #bytes per second up to the next PCR of the PID, None when unknown
+        self.rate = None
+        #seconds from the first PCR of the file
+        self.time = None
+
+class TSStream(object):
+
+    #bytes read from a probe offset on to find its PCRs
+    seek_window = 4*1024*1024
+    #longest time between two PCRs of one segment, a longer or backward step being a discontinuity
+    seek_max_interval = 0.1
+    #PCRs a probe reads to measure the bitrate at its offset
+    seek_rate_samples = 8
+    #change of the bitrate between two probes taken for a PCR discontinuity between them
+    seek_rate_ratio = 2.0
+    #packets parsed between two checkpoints
+    checkpoint_interval = 100000
+    checkpoint_version = 1
+
+    def __init__(self, views=False, max_pes_size=None, pes_callback=None, sink=None, verify_crc=False, stats=None):
+        """views selects the TSView classes, which decode faster than the ctypes ones.
+
+        PES larger than max_pes_size bytes are dropped. With pes_callback,
+        PES are not reassembled: pes_callback(pid, payload, start) gets the
+        payload of every packet of a PES PID as it is read.
+
+        sink receives the units as they are produced, a PIDMapSink keeping
+        all of them by default; see RingSink, MetadataSink and CallbackSink.
+
+        With verify_crc, PAT and PMT sections are only used when their CRC_32
+        is valid; crc_errors counts the others.
+
+        stats, a TSStats.Stats, gets the counters and stage timers of the
+        parse: read, packet (TSPacket construction), payload (the payload
+        factory, PES and PSI included), PES, PSI and sink.
+        """
+        if sink is None:
+            sink = PIDMapSink()
+        self.sink = sink
+        self.views = views
+        self.packet_type = TSPacket
+        if views:
+            self.packet_type = TSView.TSPacket
+        self.payload_parser = TSPayloadFactory(views, max_pes_size, pes_callback, verify_crc)
+        self.stats = stats
+        self.payload_parser.stats = stats
+        self.index = None
+        #PIDs parsed, None for all of them; grows with the PAT and PMTs of programs
+        self.pid_filter = None
+        self.programs = None
+        #last continuity_counter by PID, and the packets breaking the sequence
+        self.continuity = dict()
+        self.cc_errors = 0
+        #offset of the last checkpoint saved
+        self._checkpoint_offset = None
+
+    def useIndex(self, index):
+        "Answer PID and unit queries from a TSIndex.TSIndex instead of parsing the file"
+        self.index = index
 
     def findSyncByte(self):
-        seq = self.data.read(64*1024)
-        offset = seq.find(b'G')
-        #TODO how to dynamicly determine packet length
-        return (offset, 188)
+        "Return (offset of the first packet, packet length), the offset relative to the current position"
+        if not isSeekable(self.data):
+            seq = self.data.peek(256*1024)
+        else:
+            seq = self.data.read(256*1024)
+        (offset, packet_length) = probeSync(seq)
+        if offset < 0:
+            return (max(seq.find(b'G'), 0), 188)
+        return (offset, packet_length)
 
     def prepare(self):
+        position = self.data.tell()
         (begin, packet_length) = self.findSyncByte()
-        self.data.seek(begin, io.SEEK_SET)
+        if isSeekable(self.data):
+            self.data.seek(position + begin, io.SEEK_SET)
+        else:
+            self.data.read(begin)
         self.packet_length = packet_length
+        self.begin = position + begin
 
     def locatePAT(self):
         for packet in TSPacket.iterator(self.data, self.packet_length):
@@ -620,23 +1017,529 @@ class TSStream(object):
 
             yield packet
 
-    def parse(self, filehandle):
+    @property
+    def crc_errors(self):
+        "Number of PSI sections dropped for a wrong CRC_32"
+        return self.payload_parser.crc_errors
+
+    @property
+    def PIDMap(self):
+        "What the sink kept, by PID"
+        return self.sink.PIDMap
+
+    def _store(self, pid, payload):
+        if payload:
+            self.sink.add(pid, payload)
+            if self.programs is not None:
+                self._follow(pid, payload)
+
+    def _follow(self, pid, item):
+        "Let the PMT and ES PIDs of the selected programs through the PID filter"
+        if isinstance(item, self.payload_parser.PAT):
+            for p in item.program_list:
+                if p["program_number"] in self.programs:
+                    self.pid_filter.add(p["pid"])
+                    self._pmt_pids[p["pid"]] = p["program_number"]
+                    self._pending.add(p["program_number"])
+            self._pat_seen = True
+        elif isinstance(item, self.payload_parser.PMT) and pid in self._pmt_pids:
+            self.pid_filter.update(es["elementary_PID"] for es in item.es_list)
+            self._pending.discard(self._pmt_pids[pid])
+        if not self.resolved and self._pat_seen and not self._pending:
+            self._resolve()
+
+    def _resolve(self):
+        "Start filtering, forgetting what was parsed of PIDs outside the programs meanwhile"
+        self.resolved = True
+        for pid in list(self.PIDMap):
+            if pid not in self.pid_filter:
+                del self.PIDMap[pid]
+        for pid in list(self.payload_parser.workers):
+            if pid not in self.pid_filter:
+                del self.payload_parser.workers[pid]
+
+    def setFilter(self, pids=None, programs=None):
+        """Only parse the packets of pids, and of the PAT, PMTs and ES of programs.
+
+        Packets of other PIDs are dropped once the PID has been read from
+        their header. With neither argument every PID is parsed.
+        """
+        if pids is None and programs is None:
+            self.pid_filter = None
+            self.programs = None
+            self.resolved = True
+            return
+        self.pid_filter = set(pids or ())
+        self.programs = None
+        if programs is not None:
+            self.programs = frozenset(programs)
+            self.pid_filter.add(0)
+        #program number by PMT PID, and the programs whose PMT is still missing
+        self._pmt_pids = dict()
+        self._pending = set()
+        self._pat_seen = False
+        #every PID is parsed until the PMTs of all programs are known
+        self.resolved = programs is None
+
+    def parse(self, filehandle, processes=1, pids=None, programs=None, checkpoint=None, follow=False, idle_timeout=None):
+        """Parse every packet of filehandle into PIDMap.
+
+        pids and programs restrict the parse as setFilter() does; programs
+        are resolved from their first PAT and PMTs before parsing. With
+        processes > 1 the file is split into packet aligned ranges which are
+        parsed by a process pool; the result is the same as a serial run.
+        Streams which can not seek (see TSSource.openStream()) are parsed
+        serially, every PID being parsed until the PMTs of programs arrive.
+
+        With checkpoint, a file name, the parse is serial and saves its
+        state there every checkpoint_interval packets and at the end. When
+        the file exists, the parse resumes from the state it holds, with its
+        PID filter instead of pids and programs, and goes on with the
+        packets appended since.
+
+        With follow, a file still being written is parsed serially as it
+        grows, like tail -f, until it has not grown for idle_timeout seconds
+        (see TSSource.FollowSource); units reach the sink as they complete,
+        and a checkpoint is also saved whenever the parse waits for data.
+        """
         self.data = filehandle
+        if checkpoint is not None and os.path.exists(checkpoint):
+            self.loadCheckpoint(checkpoint)
+            return self._parseSerial(checkpoint=checkpoint, follow=follow, idle_timeout=idle_timeout)
         self.prepare()
-        packets = map(lambda x: TSPacket(x), self.read_packet_records(self.data))
-        for p in packets:
-            self.payload_parser.feed(p.head.pid, p.payload, p.head.payload_unit_start_indicator)
-            payload = self.payload_parser.feedback(p.head.pid)
-            if payload:
-                try:
-                    queue = self.PIDMap[p.head.pid]
-                    queue.append(payload)
-                except KeyError as e:
-                    self.PIDMap[p.head.pid] = [payload]
+        self.setFilter(pids, programs)
+        seekable = isSeekable(self.data)
+        if self.programs is not None and seekable:
+            self.pid_filter |= self.resolvePrograms(self.programs)
+            self.resolved = True
+        #streamed PES payload has to reach the callback in file order
+        if processes > 1 and seekable and self.payload_parser.pes_callback is None and checkpoint is None and not follow:
+            return self._parseParallel(processes)
+        self._parseSerial(checkpoint=checkpoint, follow=follow and seekable, idle_timeout=idle_timeout)
+
+    def _parseSerial(self, until=None, checkpoint=None, follow=False, idle_timeout=None):
+        "Parse the packets from the current position on, until until() holds"
+        prefix = prefixLength(self.packet_length)
+        pid_filter = self.pid_filter
+        continuity = self.continuity
+        stats = self.stats
+        if follow:
+            source = FollowSource(self.data, self.packet_length, self.data.tell(), True, idle_timeout)
+            if checkpoint is not None:
+                source.wait_callback = lambda: self._waitCheckpoint(checkpoint, source.position)
+        else:
+            source = PacketSource(self.data, self.packet_length, self.data.tell(), resync=True)
+        packets = source.packets()
+        if stats is not None:
+            packets = stats.packets(source)
+        position = None
+        count = 0
+        try:
+            for (data, n) in packets:
+                if checkpoint is not None:
+                    #the state here is the one after the packets before this one
+                    position = source.offset(n)
+                    count += 1
+                    if count % self.checkpoint_interval == 0:
+                        self.saveCheckpoint(checkpoint, position)
+                if pid_filter is not None and self.resolved and _headerPID(data, n, prefix) not in pid_filter:
+                    continue
+                if stats is not None:
+                    begin = stats.clock()
+                p = self.packet_type(data[n:n+self.packet_length])
+                if stats is not None:
+                    stats.add("packet", begin)
+                    stats.count("packets_decoded")
+                if not p.head.adaptation_field_ctrl & 0x1:
+                    continue
+                pid = p.head.pid
+                cc = p.head.continuity_counter
+                last = continuity.get(pid)
+                #a packet may be sent twice, with the same continuity_counter
+                if last is not None and cc != last and cc != (last + 1) & 0xF:
+                    self.cc_errors += 1
+                continuity[pid] = cc
+                if stats is not None:
+                    begin = stats.clock()
+                self.payload_parser.feed(pid, p.payload, p.head.payload_unit_start_indicator)
+                item = self.payload_parser.feedback(pid)
+                if stats is not None:
+                    stats.add("payload", begin)
+                    begin = stats.clock()
+                self._store(pid, item)
+                if stats is not None:
+                    stats.add("sink", begin)
+                if until is not None and until():
+                    break
+        finally:
+            source.close()
+        if checkpoint is not None:
+            if position is None:
+                position = self.data.tell()
+            else:
+                position += self.packet_length
+            self.saveCheckpoint(checkpoint, position)
+
+    def _waitCheckpoint(self, path, offset):
+        "Save a checkpoint while following a file, unless one was saved at offset already"
+        if offset != self._checkpoint_offset:
+            self.saveCheckpoint(path, offset)
+
+    def _packetBefore(self, offset):
+        "The bytes of the packet ending at offset, which tell a checkpoint belongs to the file"
+        if offset - self.packet_length < self.begin:
+            return b''
+        with open(self.data.name, 'rb') as f:
+            f.seek(offset - self.packet_length, io.SEEK_SET)
+            return f.read(self.packet_length)
+
+    def saveCheckpoint(self, path, offset):
+        """Save to path what is needed to go on parsing at the packet at offset.
+
+        The state is kept as builtin types only: the filter, the continuity
+        counters and the state of the payload factory, whose workers hold
+        the partial PES and sections. It is written to a temporary file
+        which then replaces path, so an interrupted save keeps the last
+        checkpoint.
+        """
+        if not isSeekable(self.data):
+            raise ValueError('checkpoints need a file which can seek')
+        state = {"version":TSStream.checkpoint_version, "offset":offset, "begin":self.begin,
+                 "packet_length":self.packet_length, "last_packet":self._packetBefore(offset),
+                 "pid_filter":self.pid_filter, "programs":self.programs, "resolved":self.resolved,
+                 "continuity":dict(self.continuity), "cc_errors":self.cc_errors,
+                 "factory":self.payload_parser.getState()}
+        if self.programs is not None:
+            state.update(pmt_pids=self._pmt_pids, pending=self._pending, pat_seen=self._pat_seen)
+        temporary = path + '.tmp'
+        with open(temporary, 'wb') as f:
+            pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, path)
+        self._checkpoint_offset = offset
+
+    def loadCheckpoint(self, path):
+        """Restore the state saved by saveCheckpoint() and seek the file to its offset.
+
+        ValueError when the checkpoint is not one of this file.
+        """
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        if state.get("version") != TSStream.checkpoint_version:
+            raise ValueError('%s is not a checkpoint of this version' % path)
+        self.packet_length = state["packet_length"]
+        self.begin = state["begin"]
+        if self._packetBefore(state["offset"]) != state["last_packet"]:
+            raise ValueError('%s is not a checkpoint of %s' % (path, self.data.name))
+        self.setFilter(state["pid_filter"], state["programs"])
+        if state["pid_filter"] is not None:
+            self.pid_filter = set(state["pid_filter"])
+        self.resolved = state["resolved"]
+        if self.programs is not None:
+            (self._pmt_pids, self._pending, self._pat_seen) = (state["pmt_pids"], state["pending"], state["pat_seen"])
+        self.continuity = dict(state["continuity"])
+        self.cc_errors = state["cc_errors"]
+        self.payload_parser.setState(state["factory"])
+        self.data.seek(state["offset"], io.SEEK_SET)
+
+    def resolvePrograms(self, programs):
+        "Return the PIDs of the PAT, PMTs and ES of programs, from the first PAT and PMTs of the file"
+        stream = TSStream(self.views, sink=CallbackSink(lambda pid, item: None))
+        stream.data = self.data
+        stream.packet_length = self.packet_length
+        stream.setFilter(programs=programs)
+        position = self.data.tell()
+        try:
+            stream._parseSerial(lambda: stream._pat_seen and not stream._pending)
+        finally:
+            self.data.seek(position, io.SEEK_SET)
+        return stream.pid_filter
+
+    def _readUnit(self, begin, pid):
+        "Read again the unit of pid starting at offset begin, for the rare unit a worker did not keep"
+        pieces = list()
+        source = PacketSource(self.data, self.packet_length, begin, resync=True)
+        try:
+            for (data, n) in source.packets():
+                p = self.packet_type(data[n:n+self.packet_length])
+                if p.head.pid != pid or not p.head.adaptation_field_ctrl & 0x1:
+                    continue
+                if pieces and p.head.payload_unit_start_indicator:
+                    break
+                pieces.append(p.payload)
+        finally:
+            source.close()
+        return b''.join(pieces)
+
+    def _completeUnit(self, worker, unit):
+        "Give worker a finished unit, as the serial feed() does at the next unit start"
+        if unit.empty:
+            return
+        if worker.max_size is not None and unit.size > worker.max_size:
+            worker.overflows += 1
+            return
+        if worker.type == 'PES' and unit.raw is None:
+            if unit.error is not None:
+                raise unit.error
+            if unit.pes.packet_start_code_prefix == 1:
+                worker.queue.append(unit.pes)
+            if self.stats is not None:
+                self.stats.count("pes_units")
+        else:
+            if unit.raw is None:
+                unit.raw = self._readUnit(unit.offset, worker.pid)
+            worker.cache = unit.raw
+            if worker.stats is None:
+                worker.parse()
+            else:
+                worker.parseTimed()
+        self._store(worker.pid, worker.feedback())
+
+    def _parseParallel(self, processes):
+        factory = self.payload_parser
+        begin = self.data.tell()
+        total = (os.fstat(self.data.fileno()).st_size - begin) // self.packet_length
+        step = max(total // (processes*4) + 1, 1024)
+        pids = None
+        if self.pid_filter is not None:
+            pids = frozenset(self.pid_filter)
+        jobs = [(self.data.name, begin + first*self.packet_length,
+                 begin + min(first+step, total)*self.packet_length, self.packet_length, pids, self.views, begin)
+                for first in range(0, total, step)]
+        position = begin
+
+        #open units of accepted workers, by PID: a TSUnit, or a (file
+        #offset, payload list) while the unit runs on in the next range
+        opened = dict()
+        #the ranges not started yet are cancelled when the parse stops early,
+        #as buildIndexParallel() does
+        executor = ProcessPoolExecutor(processes)
+        try:
+            futures = [executor.submit(_parseRangeJob, job) for job in jobs]
+            results = (future.result() for future in futures)
+            if self.stats is not None:
+                #the ranges are read and their packets decoded by the pool
+                self.stats.count("bytes_read", total*self.packet_length)
+                self.stats.count("packets_decoded", total)
+                results = self.stats.iterate("workers", results)
+            for (heads, units, tails, counters, first, end) in results:
+                if first != position:
+                    #the last packet ran past the cut, or the corrupt regions
+                    #line up otherwise than in one scan: parse again from there
+                    (heads, units, tails, counters, first, end) = \
+                        _parseRange(self.data.name, position, max(end, position), self.packet_length, pids, self.views)
+                position = end
+                #the first packet of a PID in the range follows the last one of the ranges before
+                for (pid, (first, last, errors)) in counters.items():
+                    previous = self.continuity.get(pid)
+                    if previous is not None and first != previous and first != (previous + 1) & 0xF:
+                        errors += 1
+                    self.cc_errors += errors
+                    self.continuity[pid] = last
+                for (pid, pieces) in heads.items():
+                    if isinstance(opened.get(pid), tuple):
+                        opened[pid][1].extend(pieces)
+
+                #every unit start of the range as (file offset, PID, prefix, unit)
+                starts = list()
+                for unit_list in units.values():
+                    starts.extend((u.offset, u.pid, u.prefix, u) for u in unit_list)
+                for (pid, (start, pieces)) in tails.items():
+                    if isinstance(opened.get(pid), tuple):
+                        (offset, previous) = opened[pid]
+                        opened[pid] = TSUnit(pid, offset, previous, self.payload_parser.PES)
+                    starts.append((start, pid, pieces[0][0:3], (start, pieces)))
+                starts.sort(key=lambda s: s[0])
+
+                for (offset, pid, prefix, unit) in starts:
+                    try:
+                        worker = factory.workers[pid]
+                    except KeyError:
+                        worker = factory.dispatch_worker(pid, prefix, True, factory)
+                        if not worker:
+                            continue
+                        factory.workers[pid] = worker
+                    else:
+                        self._completeUnit(worker, opened[pid])
+                    opened[pid] = unit
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def seek_time(self, target, filehandle=None, pid=None):
+        """Return the byte offset of the packet at target seconds, and seek the file there.
+
+        target counts from the first PCR of the file, of pid or else of the
+        first PID carrying one, and may be given as a "HH:MM:SS" string.
+        The PCR timeline is sampled at a few probe offsets, each read for at
+        most seek_window bytes, and searched by interpolation and bisection;
+        the last few MB are scanned PCR by PCR and the packet is interpolated
+        between the two PCRs around target. The 33 bits PCR base may wrap
+        around. Across a PCR discontinuity the timeline runs on at the
+        bitrate before it; one is found between two probes when it changes
+        their bitrate by more than seek_rate_ratio times. A later parse()
+        starts at the returned offset. Return None when no PCR is found.
+        """
+        if filehandle is not None:
+            self.data = filehandle
+            self.prepare()
+        if not isSeekable(self.data):
+            raise ValueError('seek_time() needs a file which can seek')
+        target = _seconds(target)
+        end = os.fstat(self.data.fileno()).st_size
+        self._seek_pid = pid
+
+        lo = self._probe(self.begin, end)
+        if lo is None:
+            return None
+        self._seek_pid = lo.pid
+        lo.time = 0.0
+        hi = self._probe(max(end - self.seek_window, lo.offset + self.packet_length), end)
+        if hi is not None:
+            hi.time = self._timeOf(lo, hi)
+            if hi.time <= target:
+                (lo, hi) = (hi, None)
+
+        #interpolation, every other step a bisection so the range at least halves
+        step = 0
+        while hi is not None and hi.offset - lo.offset > self.seek_window:
+            bisect = step % 2 == 1 or hi.time <= lo.time
+            if bisect:
+                x = (lo.offset + hi.offset) // 2
+            else:
+                x = lo.offset + int((target - lo.time)/(hi.time - lo.time)*(hi.offset - lo.offset))
+            x = min(max(x, lo.offset + self.packet_length), hi.offset - self.packet_length)
+            step += 1
+            sample = self._probe(x, hi.offset)
+            if sample is None:
+                if bisect:
+                    #no PCR for seek_window bytes, the rest is scanned
+                    break
+                continue
+            sample.time = self._timeOf(lo, sample)
+            if sample.time <= target:
+                lo = sample
+            else:
+                hi = sample
+
+        limit = end
+        if hi is not None:
+            limit = hi.offset + self.packet_length
+        samples = self._scan(lo, limit)
+        offset = samples[-1].offset
+        for (a, b) in zip(samples, samples[1:]):
+            if b.time > target:
+                x = a.offset + int(max(target - a.time, 0.0)*(b.offset - a.offset)/(b.time - a.time))
+                offset = a.offset + (x - a.offset)//self.packet_length*self.packet_length
+                break
+        self.data.seek(offset, io.SEEK_SET)
+        return offset
+
+    def _readPCRs(self, begin, end, pid, limit=None):
+        "Return the PCRSample of the packets of pid in [begin, end), at most limit of them"
+        samples = list()
+        prefix = prefixLength(self.packet_length)
+        source = PacketSource(self.data, self.packet_length, begin, end, resync=True)
+        try:
+            for (data, n) in source.packets():
+                k = n + prefix
+                #an adaptation field long enough for a PCR, with its PCR_flag set
+                if not (data[k+3] & 0x20 and data[k+4] >= 7 and data[k+5] & 0x10):
+                    continue
+                if pid is not None and _headerPID(data, n, prefix) != pid:
+                    continue
+                p = self.packet_type(data[n:n+self.packet_length])
+                field = p.adaption_field
+                samples.append(PCRSample(source.offset(n), p.head.pid, field.pcr.pcr_base*300 + field.pcr.pcr_extension,
+                                         bool(field.discontinuity_indicator)))
+                pid = p.head.pid
+                if limit is not None and len(samples) >= limit:
+                    break
+        finally:
+            source.close()
+        return samples
+
+    def _probe(self, offset, end):
+        "Return the first PCRSample from offset on, before end, with its rate when the next PCR is near"
+        offset = self.begin + (offset - self.begin)//self.packet_length*self.packet_length
+        samples = self._readPCRs(offset, min(offset + self.seek_window, end), self._seek_pid, self.seek_rate_samples)
+        if not samples:
+            return None
+        #the bitrate over the PCRs up to the first discontinuity
+        span = 0.0
+        last = samples[0]
+        for sample in samples[1:]:
+            interval = self._interval(last, sample)
+            if interval is None:
+                break
+            span += interval
+            last = sample
+        if span > 0:
+            samples[0].rate = (last.offset - samples[0].offset)/span
+        return samples[0]
+
+    def _interval(self, a, b):
+        "Seconds between the consecutive PCRs a and b, None at a discontinuity"
+        if b.discontinuity:
+            return None
+        interval = float((b.pcr - a.pcr) % PCR_WRAP)/PCR_HZ
+        if interval <= 0 or interval > self.seek_max_interval:
+            return None
+        return interval
+
+    def _span(self, a, b):
+        "Seconds from a to the distant b, None when their bitrates tell a discontinuity may lie between"
+        rates = [r for r in (a.rate, b.rate) if r]
+        span = float((b.pcr - a.pcr) % PCR_WRAP)/PCR_HZ
+        if not rates or span <= 0:
+            return None
+        rate = (b.offset - a.offset)/span
+        if min(rates)/self.seek_rate_ratio <= rate <= max(rates)*self.seek_rate_ratio:
+            return span
+        return None
+
+    def _timeOf(self, a, b):
+        "Time of sample b, from the time of sample a before it"
+        if b.offset - a.offset > self.seek_window:
+            span = self._span(a, b)
+            if span is not None:
+                return a.time + span
+            x = self._probe((a.offset + b.offset) // 2, b.offset)
+            if x is not None:
+                x.time = self._timeOf(a, x)
+                return self._timeOf(x, b)
+        for sample in self._scan(a, b.offset + self.packet_length):
+            if sample.offset >= b.offset:
+                return sample.time
+        return a.time
+
+    def _scan(self, a, end):
+        "Return the PCRSamples from a on to end, timed from a"
+        samples = self._readPCRs(a.offset, end, self._seek_pid)
+        if not samples or samples[0].offset != a.offset:
+            samples.insert(0, a)
+        samples[0] = a
+        rate = a.rate
+        for (s, t) in zip(samples, samples[1:]):
+            interval = self._interval(s, t)
+            if interval is not None:
+                rate = (t.offset - s.offset)/interval
+            elif rate:
+                #the timeline runs on over the discontinuity
+                interval = (t.offset - s.offset)/rate
+            else:
+                interval = 0.0
+            s.rate = s.rate or rate
+            t.time = s.time + interval
+        return samples
 
     def getPidManifest(self):
+        if not self.PIDMap and self.index is not None:
+            return self.index.getPidManifest()
         return self.PIDMap.keys()
 
+    def locateUnits(self, pid):
+        "Return the byte offsets of the payload unit starts of pid, from the index"
+        return self.index.unitOffsets(pid)
+
 ##Following for Test
 
 def getFilename():
@@ -647,7 +1550,6 @@ if __name__ == "__main__":
 
     filename = getFilename()
     filehandle = open(filename, 'rb')
-    filehandle.seek(188*440)
 
     #For test
     stream = TSStream()
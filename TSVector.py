@@ -0,0 +1,250 @@
+#this Python script is used to decode MPEG-2 TS packet headers chunk by chunk
+
+"""Vectorized transport header decoding.
+
+decodeHeaders() turns a run of N packets (188, 192 or 204 bytes each) into
+one column per transport header field, in a single pass over the chunk.
+NumPy is used when it is installed; otherwise the columns are built from
+strided byte slices, which is slower but has no dependency.
+"""
+
+from array import array
+from TSSource import prefixLength
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+SYNC_BYTE = 0x47
+
+class TSHeaderColumns(object):
+    "Transport header fields of a run of packets, one sequence per field"
+
+    fields = ("syncByte",
+              "transport_error_indicator",
+              "payload_unit_start_indicator",
+              "transport_priority",
+              "pid",
+              "scrambling_control",
+              "adaptation_field_ctrl",
+              "continuity_counter")
+
+    def __init__(self, count, **columns):
+        self.count = count
+        for name in TSHeaderColumns.fields:
+            setattr(self, name, columns[name])
+
+    def __len__(self):
+        return self.count
+
+def _decodeNumpy(data, packet_size, start, count):
+    o = prefixLength(packet_size)
+    packets = numpy.frombuffer(data, dtype=numpy.uint8, count=count*packet_size, offset=start)
+    packets = packets.reshape(count, packet_size)
+    b1 = packets[:, o+1]
+    b3 = packets[:, o+3]
+    return TSHeaderColumns(count,
+        syncByte = packets[:, o].copy(),
+        transport_error_indicator = b1 >> 7,
+        payload_unit_start_indicator = (b1 >> 6) & 0x1,
+        transport_priority = (b1 >> 5) & 0x1,
+        pid = ((b1.astype(numpy.uint16) & 0x1F) << 8) | packets[:, o+2],
+        scrambling_control = b3 >> 6,
+        adaptation_field_ctrl = (b3 >> 4) & 0x3,
+        continuity_counter = b3 & 0xF)
+
+def _table(function):
+    return bytes(function(i) for i in range(256))
+
+_TEI = _table(lambda b: b >> 7)
+_PUSI = _table(lambda b: (b >> 6) & 0x1)
+_PRIORITY = _table(lambda b: (b >> 5) & 0x1)
+_PID_HI = _table(lambda b: b & 0x1F)
+_SCRAMBLING = _table(lambda b: b >> 6)
+_AFC = _table(lambda b: (b >> 4) & 0x3)
+_CC = _table(lambda b: b & 0xF)
+
+def _decodeBytes(data, packet_size, start, count):
+    o = start + prefixLength(packet_size)
+    end = start + count*packet_size
+    b1 = bytes(data[o+1:end:packet_size])
+    b2 = bytes(data[o+2:end:packet_size])
+    b3 = bytes(data[o+3:end:packet_size])
+    return TSHeaderColumns(count,
+        syncByte = bytes(data[o:end:packet_size]),
+        transport_error_indicator = b1.translate(_TEI),
+        payload_unit_start_indicator = b1.translate(_PUSI),
+        transport_priority = b1.translate(_PRIORITY),
+        pid = array('H', [(hi << 8) | lo for (hi, lo) in zip(b1.translate(_PID_HI), b2)]),
+        scrambling_control = b3.translate(_SCRAMBLING),
+        adaptation_field_ctrl = b3.translate(_AFC),
+        continuity_counter = b3.translate(_CC))
+
+def decodeHeaders(data, packet_size=188, start=0, count=None):
+    """Decode the transport headers of count packets found at data[start:].
+
+    data is anything supporting the buffer protocol, e.g. a chunk handed out
+    by TSSource.PacketSource.chunks(). Every column is a fresh sequence of
+    length count, so it stays valid after the chunk has been released.
+    """
+    if count is None:
+        count = (len(data) - start) // packet_size
+    if numpy is not None:
+        return _decodeNumpy(data, packet_size, start, count)
+    return _decodeBytes(data, packet_size, start, count)
+
+def candidatePackets(columns, pids=(), payload_unit_start=False, adaptation_field=False):
+    """Return the indices of the packets a scan has to look at.
+
+    A packet is selected when its PID is in pids, when payload_unit_start is
+    set and it starts a PES/PSI unit, or when adaptation_field is set and it
+    carries an adaptation field. Packets with a broken sync byte are always
+    selected, so the caller can report them.
+    """
+    if numpy is not None:
+        mask = columns.syncByte != SYNC_BYTE
+        if payload_unit_start:
+            mask |= columns.payload_unit_start_indicator == 1
+        if adaptation_field:
+            mask |= (columns.adaptation_field_ctrl & 0x2) != 0
+        for pid in pids:
+            mask |= columns.pid == pid
+        return numpy.flatnonzero(mask).tolist()
+
+    pids = frozenset(pids)
+    selected = []
+    for (i, sync) in enumerate(columns.syncByte):
+        if (sync != SYNC_BYTE) or \
+            (payload_unit_start and columns.payload_unit_start_indicator[i]) or \
+            (adaptation_field and columns.adaptation_field_ctrl[i] & 0x2) or \
+            (columns.pid[i] in pids):
+            selected.append(i)
+    return selected
+
+def scanPackets(source, pids=(), payload_unit_start=False, adaptation_field=False, stats=None):
+    """Yield (packet_number, data, n) for the packets selected by candidatePackets().
+
+    source is a TSSource.PacketSource; data[n:] is the selected packet,
+    including the 4 bytes timestamp of 192 bytes packets. stats, a
+    TSStats.Stats, times the reading and the header decoding of every chunk.
+    """
+    size = source.packet_size
+    first = 0
+    chunks = source.chunks()
+    if stats is not None:
+        chunks = stats.chunks(chunks, size)
+    for (data, start, count) in chunks:
+        if stats is not None:
+            begin = stats.clock()
+        columns = decodeHeaders(data, size, start, count)
+        selected = candidatePackets(columns, pids, payload_unit_start, adaptation_field)
+        if stats is not None:
+            stats.add("decode headers", begin)
+            stats.count("packets_decoded", count)
+        for i in selected:
+            yield first + i, data, start + i*size
+        first += count
+
+class PIDCensus(object):
+    "Count packets per PID from header columns, without parsing any packet"
+
+    def __init__(self):
+        self.total = 0
+        self.counts = dict()
+        self.scrambled = dict()
+        self.errors = dict()
+        self.first = dict()
+        self.last = dict()
+
+    def _add(self, table, pid, value):
+        table[pid] = table.get(pid, 0) + value
+
+    def update(self, columns, first=0):
+        "Account for one chunk of columns whose first packet has number first"
+        if numpy is not None:
+            self._updateNumpy(columns, first)
+        else:
+            self._updateBytes(columns, first)
+        self.total += len(columns)
+
+    def _updateNumpy(self, columns, first):
+        pid = columns.pid
+        if not len(pid):
+            return
+        counts = numpy.bincount(pid, minlength=0x2000)
+        scrambled = numpy.bincount(pid[columns.scrambling_control != 0], minlength=0x2000)
+        errors = numpy.bincount(pid[columns.transport_error_indicator != 0], minlength=0x2000)
+        (present, first_index) = numpy.unique(pid, return_index=True)
+        (_, last_index) = numpy.unique(pid[::-1], return_index=True)
+        last_index = len(pid) - 1 - last_index
+        for (i, p) in enumerate(present.tolist()):
+            self._add(self.counts, p, int(counts[p]))
+            self._add(self.scrambled, p, int(scrambled[p]))
+            self._add(self.errors, p, int(errors[p]))
+            self.first.setdefault(p, first + int(first_index[i]))
+            self.last[p] = first + int(last_index[i])
+
+    def _updateBytes(self, columns, first):
+        scrambling = columns.scrambling_control
+        tei = columns.transport_error_indicator
+        for (i, p) in enumerate(columns.pid):
+            self._add(self.counts, p, 1)
+            if scrambling[i]:
+                self._add(self.scrambled, p, 1)
+            if tei[i]:
+                self._add(self.errors, p, 1)
+            self.first.setdefault(p, first + i)
+            self.last[p] = first + i
+
+    def report(self):
+        "Return one dict per PID, in PID order"
+        rows = list()
+        for pid in sorted(self.counts):
+            count = self.counts[pid]
+            rows.append({"pid":pid,
+                         "count":count,
+                         "share":float(count)/self.total,
+                         "scrambled":self.scrambled.get(pid, 0),
+                         "transport_error":self.errors.get(pid, 0),
+                         "first":self.first[pid],
+                         "last":self.last[pid]})
+        return rows
+
+def previousPayloadPackets(columns, indices, first, last, unseen=0):
+    """Return, for every packet index in indices, the number of the previous packet of the same PID carrying payload.
+
+    indices must point at packets carrying payload. last maps a PID to its
+    last payload packet before this chunk (unseen when none was seen) and is
+    updated to the end of the chunk.
+    """
+    if numpy is not None:
+        payload = numpy.flatnonzero(columns.adaptation_field_ctrl & 0x1)
+        if not len(payload):
+            return []
+        pids = columns.pid[payload]
+        order = numpy.argsort(pids, kind='stable')
+        grouped = pids[order]
+        numbers = payload[order].astype(numpy.int64) + first
+        previous = numpy.empty_like(numbers)
+        previous[1:] = numbers[:-1]
+        starts = numpy.ones(len(grouped), dtype=bool)
+        starts[1:] = grouped[1:] != grouped[:-1]
+        for j in numpy.flatnonzero(starts).tolist():
+            previous[j] = last.get(int(grouped[j]), unseen)
+        ends = numpy.flatnonzero(numpy.append(starts[1:], True))
+        for j in ends.tolist():
+            last[int(grouped[j])] = int(numbers[j])
+        by_packet = numpy.empty_like(previous)
+        by_packet[order] = previous
+        return by_packet[numpy.searchsorted(payload, indices)].tolist()
+
+    wanted = dict((i, None) for i in indices)
+    afc = columns.adaptation_field_ctrl
+    pids = columns.pid
+    for i in range(len(columns)):
+        if afc[i] & 0x1:
+            if i in wanted:
+                wanted[i] = last.get(pids[i], unseen)
+            last[pids[i]] = first + i
+    return [wanted[i] for i in indices]
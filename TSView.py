@@ -0,0 +1,322 @@
+#this Python script is used to decode MPEG-2 TS structures without ctypes
+
+"""Lightweight views of the TSStruct structures.
+
+Every class here has the field names of its ctypes counterpart in
+TSStruct, but keeps the bytes it was built from and decodes the header
+bits with one precompiled struct.Struct (or int.from_bytes) call; single
+fields are shifted out of that integer only when they are read, and the
+costlier parts (adaptation field, payload, PES stream) are decoded on
+first access. Instances use __slots__, so building one per packet costs
+little more than the tuple of its arguments.
+
+TSStruct.TSStream(views=True) parses with these classes.
+"""
+
+import struct
+from TSSource import prefixLength
+from TSSection import sectionCRCValid
+from TSNAL import accessUnitType
+
+_UINT32 = struct.Struct('>L')
+_UINT24_16 = struct.Struct('>HB')
+_UINT16 = struct.Struct('>H')
+_PROGRAM = struct.Struct('>HH')
+_ES = struct.Struct('>BHH')
+
+def _bitfields(width, layout):
+    """Class decorator adding one read only property per (name, bits) of layout.
+
+    layout lists the fields MSB first over the width bits of the integer
+    self._bits; fields named None are skipped. An int property returns the
+    raw bytes.
+    """
+    def decorate(cls):
+        shift = width
+        for (name, bits) in layout:
+            shift -= bits
+            if name is not None:
+                setattr(cls, name, property(
+                    lambda self, s=shift, m=(1 << bits) - 1: (self._bits >> s) & m))
+        #the raw header bytes, as the ctypes unions expose them
+        cls.int = property(lambda self: self._bits.to_bytes(width // 8, 'big'))
+        return cls
+    return decorate
+
+def _uint(data, offset, length):
+    return int.from_bytes(data[offset:offset+length], 'big')
+
+def _padded(data, length):
+    "data, or a copy of it with 0 bytes appended up to length when shorter, as the ctypes unions read it"
+    if len(data) >= length:
+        return data
+    return bytes(data) + bytes(length - len(data))
+
+@_bitfields(40, [('prefix', 4), ('pts1', 3), (None, 1), ('pts2', 15), (None, 1), ('pts3', 15), ('marker', 1)])
+class PTSPattern(object):
+    __slots__ = ('_bits',)
+    pattern_length = 5
+
+    def __init__(self, data, offset=0):
+        self._bits = _uint(data, offset, 5)
+
+    @property
+    def value(self):
+        return self.pts3 + (self.pts2 << 15) + (self.pts1 << 30)
+
+@_bitfields(48, [('reserved', 2), ('ESCR_base0', 3), ('marker_bit0', 1), ('ESCR_base1', 15),
+                 ('marker_bit1', 1), ('ESCR_base2', 15), ('marker_bit2', 1),
+                 ('ESCR_extension', 9), ('marker_bit3', 1)])
+class ESCRPattern(object):
+    __slots__ = ('_bits',)
+    pattern_length = 6
+
+    def __init__(self, data, offset=0):
+        self._bits = _uint(data, offset, 6)
+
+    @property
+    def value(self):
+        return (self.ESCR_base0 << 30) + (self.ESCR_base1 << 15) + self.ESCR_base2
+
+@_bitfields(24, [('marker_bit0', 1), ('ES_rate', 22), ('marker_bit1', 1)])
+class ESratePattern(object):
+    __slots__ = ('_bits',)
+    pattern_length = 3
+
+    def __init__(self, data, offset=0):
+        self._bits = _uint(data, offset, 3)
+
+class DSMTrickModePattern(object):
+    __slots__ = ('trick_mode_control', 'trick_mode')
+    pattern_length = 1
+
+    def __init__(self, data, offset=0):
+        self.trick_mode_control = data[offset] >> 5
+        self.trick_mode = data[offset] & 0x1F
+
+class PES(object):
+    "PES packet; the stream is decoded on first access"
+    __slots__ = ('_data', 'packet_start_code_prefix', 'stream_id', 'pes_packet_length', 'type', '_stream', '_AUType')
+    prefix_length = 6
+
+    def __init__(self, data):
+        self._data = data
+        header = _padded(data, PES.prefix_length)
+        (hi, lo) = _UINT24_16.unpack_from(header, 0)
+        self.packet_start_code_prefix = (hi << 8) | lo
+        self.stream_id = header[3]
+        self.pes_packet_length = _UINT16.unpack_from(header, 4)[0]
+        self._stream = None
+        self._AUType = None
+        if self.isMainStream():
+            self.type = 'MainStream'
+        elif self.isAuxillaryStream():
+            self.type = 'AuxillaryStream'
+        else:
+            self.type = 'PaddingStream'
+
+    def isPaddingStream(self):
+        return self.stream_id == 0xBE
+
+    def isAuxillaryStream(self):
+        return self.stream_id in (0xBC, 0xBF, 0xF0, 0xF1, 0xFF, 0xF2, 0xF8)
+
+    def isMainStream(self):
+        return not (self.isPaddingStream() or self.isAuxillaryStream())
+
+    @property
+    def stream(self):
+        if self._stream is None and self.type == 'MainStream':
+            end = len(self._data)
+            if self.pes_packet_length:
+                end = min(end, PES.prefix_length + self.pes_packet_length)
+            #a memoryview slice, so the payload is only copied once, by MainStream.payload
+            self._stream = PES.MainStream(memoryview(self._data)[PES.prefix_length:end])
+        return self._stream
+
+    @property
+    def AUType(self):
+        "Access unit type of a video PES, see TSNAL.accessUnitType(); None for the other streams"
+        if self._AUType is None and (self.stream_id & 0xF0) == 0xE0:
+            self._AUType = accessUnitType(self.stream.payload)
+        return self._AUType
+
+    @_bitfields(24, [('prefix', 2), ('pes_scrambling_control', 2), ('pes_priority', 1),
+                     ('data_alignment_indicator', 1), ('copyright', 1), ('original_or_copy', 1),
+                     ('pts_dts_flag', 2), ('escr_flag', 1), ('es_rate_flag', 1),
+                     ('esm_trick_mode_flag', 1), ('additional_copy_info_flag', 1),
+                     ('pes_crc_flag', 1), ('pes_extension_flag', 1), ('pes_header_data_length', 8)])
+    class MainStream(object):
+        __slots__ = ('_bits', '_data', 'pes_packet_length', 'payload_length', 'PTS', 'DTS',
+                     'ESCR', 'ESrate', 'DSM_trick_mode', 'additional_copy_info', '_payload')
+        _header_length = 3
+        #the most bytes the fields parsed from the header data take
+        _fields_length = 2*PTSPattern.pattern_length + ESCRPattern.pattern_length + \
+            ESratePattern.pattern_length + DSMTrickModePattern.pattern_length + 1
+
+        def __init__(self, data):
+            self._data = data
+            self._bits = _uint(_padded(data, self._header_length), 0, 3)
+            self.pes_packet_length = len(data)
+            self.payload_length = self.pes_packet_length - self.pes_header_data_length
+            self._payload = None
+            self.parsePESHeaderData()
+
+        def parsePESHeaderData(self):
+            d = self._data
+            n = self._header_length
+            if len(d) < n + self.pes_header_data_length:
+                #cut short: what is missing reads as 0
+                d = _padded(d, n + self.pes_header_data_length + self._fields_length)
+            flag = self.pts_dts_flag
+            if flag & 0x2:
+                self.PTS = PTSPattern(d, n)
+                n += PTSPattern.pattern_length
+                if flag == 0x3:
+                    self.DTS = PTSPattern(d, n)
+                    n += PTSPattern.pattern_length
+            elif flag == 0x1:
+                print('pts_dts_flag 0x1 forbidden')
+            if self.escr_flag:
+                self.ESCR = ESCRPattern(d, n)
+                n += ESCRPattern.pattern_length
+            if self.es_rate_flag:
+                self.ESrate = ESratePattern(d, n)
+                n += ESratePattern.pattern_length
+            if self.esm_trick_mode_flag:
+                self.DSM_trick_mode = DSMTrickModePattern(d, n)
+                n += DSMTrickModePattern.pattern_length
+            if self.additional_copy_info_flag:
+                self.additional_copy_info = d[n]
+
+        @property
+        def payload(self):
+            if self._payload is None:
+                self._payload = bytes(self._data[self._header_length + self.pes_header_data_length:])
+            return self._payload
+
+@_bitfields(64, [('table_id', 8), ('section_syntax_indicator', 1), ('void_0', 1), ('reserved_0', 2),
+                 ('section_length', 12), ('transport_stream_id', 16), ('reserved_1', 2),
+                 ('version_number', 5), ('current_next_indicator', 1), ('section_number', 8),
+                 ('last_section_number', 8)])
+class PAT(object):
+    __slots__ = ('_bits', 'program_list', 'CRC_32', 'crc_valid')
+    structure_length = 8
+
+    def __init__(self, data, verify=False):
+        n = 1 + data[0]
+        self.crc_valid = None
+        if verify:
+            self.crc_valid = sectionCRCValid(data, n)
+        self._bits = _uint(data, n, PAT.structure_length)
+        n += PAT.structure_length
+        self.program_list = list()
+        for offset in range(n, n + self.section_length - 5 - 4, 4):
+            (program_number, pid) = _PROGRAM.unpack_from(data, offset)
+            self.program_list.append({"program_number":program_number, "pid":pid & 0x1FFF})
+        self.CRC_32 = _uint(data, n + self.section_length - 5 - 4, 4)
+
+@_bitfields(96, [('table_id', 8), ('section_syntax_indicator', 1), ('void_0', 1), ('reserved_0', 2),
+                 ('section_length', 12), ('program_num', 16), ('reserved_1', 2),
+                 ('version_number', 5), ('current_next_indicator', 1), ('section_number', 8),
+                 ('last_section_number', 8), ('reserved_2', 3), ('PCR_PID', 13),
+                 ('reserved_3', 4), ('program_info_length', 12)])
+class PMT(object):
+    __slots__ = ('_bits', 'program_info', 'es_list', 'CRC_32', 'crc_valid')
+    structure_length = 12
+
+    def __init__(self, data, verify=False):
+        n = 1 + data[0]
+        self.crc_valid = None
+        if verify:
+            self.crc_valid = sectionCRCValid(data, n)
+        self._bits = _uint(data, n, PMT.structure_length)
+        n += PMT.structure_length
+        self.program_info = bytes(data[n:n+self.program_info_length])
+        n += self.program_info_length
+        end = n + self.section_length - self.program_info_length - 9 - 4
+        self.es_list = list()
+        while n < end:
+            (stream_type, elementary_PID, es_info_length) = _ES.unpack_from(data, n)
+            es_info_length &= 0x0FFF
+            self.es_list.append({'elementary_PID':elementary_PID & 0x1FFF, 'es_info_length':es_info_length,
+                                 'es_info':bytes(data[n+5:n+5+es_info_length])})
+            n += 5 + es_info_length
+        self.CRC_32 = _uint(data, n, 4)
+
+@_bitfields(32, [('syncByte', 8), ('transport_error_indicator', 1), ('payload_unit_start_indicator', 1),
+                 ('transport_priority', 1), ('pid', 13), ('scrambling_control', 2),
+                 ('adaptation_field_ctrl', 2), ('continuity_counter', 4)])
+class TSHeader(object):
+    __slots__ = ('_bits',)
+    header_length = 4
+
+    def __init__(self, data, offset=0):
+        self._bits = _UINT32.unpack_from(data, offset)[0]
+
+@_bitfields(8, [('discontinuity_indicator', 1), ('random_access_indicator', 1),
+                ('elementary_stream_priority_indicator', 1), ('PCR_flag', 1), ('OPCR_flag', 1),
+                ('splicing_point_flag', 1), ('transport_private_data_flag', 1),
+                ('adaptation_field_extension_flag', 1)])
+class TSAdaptationField(object):
+    "Adaptation field, built from the bytes following adaptation_field_length"
+    __slots__ = ('_bits', 'adaptation_field_length', 'pcr', 'opcr')
+    field_length = 1
+
+    @_bitfields(48, [('pcr_base', 33), ('pcr_padding', 6), ('pcr_extension', 9)])
+    class PCR(object):
+        __slots__ = ('_bits',)
+        field_length = 6
+
+        def __init__(self, data, offset=0):
+            self._bits = _uint(data, offset, 6)
+
+    def __init__(self, data, offset=0, length=None):
+        if length is None:
+            length = len(data) - offset
+        self.adaptation_field_length = length
+        self._bits = 0
+        if length:
+            self._bits = data[offset]
+        n = offset + TSAdaptationField.field_length
+        if self.PCR_flag:
+            self.pcr = TSAdaptationField.PCR(data, n)
+            n += TSAdaptationField.PCR.field_length
+        if self.OPCR_flag:
+            self.opcr = TSAdaptationField.PCR(data, n)
+
+class TSPacket(object):
+    "Transport packet; the adaptation field and the payload are decoded on first access"
+    __slots__ = ('_data', '_start', 'packet_length', 'head', '_adaption_field', '_payload')
+
+    def __init__(self, packet_data):
+        self._data = packet_data
+        self.packet_length = len(packet_data)
+        #skip the timestamp of 192 bytes packets
+        self._start = prefixLength(self.packet_length)
+        self.head = TSHeader(packet_data, self._start)
+        self._adaption_field = None
+        self._payload = None
+
+    def _payloadStart(self):
+        n = self._start + TSHeader.header_length
+        if self.head.adaptation_field_ctrl & 0x2:
+            n += 1 + self._data[n]
+        return n
+
+    @property
+    def adaption_field(self):
+        if self._adaption_field is None:
+            if not self.head.adaptation_field_ctrl & 0x2:
+                raise AttributeError('adaption_field')
+            n = self._start + TSHeader.header_length
+            self._adaption_field = TSAdaptationField(self._data, n + 1, self._data[n])
+        return self._adaption_field
+
+    @property
+    def payload(self):
+        if self._payload is None:
+            if not self.head.adaptation_field_ctrl & 0x1:
+                raise AttributeError('payload')
+            self._payload = bytes(self._data[self._payloadStart():self._start+188])
+        return self._payload
@@ -0,0 +1,55 @@
+#this Python script is used to write the streams the tests run on
+
+"""Synthetic streams for the tests, written by TSGen into a temporary directory.
+
+corrupt() damages a copy of a stream the way the recordings the resync was
+written for are damaged: bytes inserted, so the packets after them are out
+of phase, and bytes overwritten in phase.
+"""
+
+import os
+import sys
+
+#the modules of the repository are imported by their file name
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import TSGen
+from TSSource import prefixLength
+
+#PIDs of the first program of TSGen
+PMT_PID = 0x100
+VIDEO_PID = 0x101
+
+def generate(directory, name, frames=1200, **options):
+    "Write frames of a TSGen stream to directory/name and return its path"
+    path = os.path.join(directory, name)
+    TSGen.generate(path, frames=frames, **options)
+    return path
+
+def corrupt(path, name, inserted=77, overwritten=1000):
+    """Write a copy of path as name next to it, inserted bytes at 1/4 and overwritten bytes at 3/5 of it.
+
+    Return the path of the copy.
+    """
+    with open(path, 'rb') as f:
+        data = bytearray(f.read())
+    n = len(data)*3//5
+    data[n:n+overwritten] = b'\xa5'*overwritten
+    n = len(data)//4
+    data[n:n] = b'\x5a'*inserted
+    copy = os.path.join(os.path.dirname(path), name)
+    with open(copy, 'wb') as f:
+        f.write(data)
+    return copy
+
+def clearSyncByte(path, name, packet, packet_size=188):
+    "Write a copy of path as name next to it, the sync byte of packet cleared; return its path"
+    with open(path, 'rb') as f:
+        data = bytearray(f.read())
+    data[packet*packet_size + prefixLength(packet_size)] = 0
+    copy = os.path.join(os.path.dirname(path), name)
+    with open(copy, 'wb') as f:
+        f.write(data)
+    return copy
@@ -0,0 +1,85 @@
+#this Python script is used to test the batch analysis of TSBatch
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import streams
+
+import TSBatch
+
+class BatchTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.clean = streams.generate(cls.directory, 'clean.ts', frames=100)
+        cls.corrupt = streams.corrupt(cls.clean, 'corrupt.ts')
+        cls.m2ts = streams.generate(cls.directory, 'clean.TOD', frames=100, packet_size=192)
+        #no sync byte at all
+        cls.garbage = os.path.join(cls.directory, 'garbage.trp')
+        with open(cls.garbage, 'wb') as f:
+            f.write(b'\x5a'*100000)
+        os.mkdir(os.path.join(cls.directory, 'sub'))
+        cls.nested = streams.generate(cls.directory, os.path.join('sub', 'nested.ts'), frames=10)
+        with open(os.path.join(cls.directory, 'notes.txt'), 'w') as f:
+            f.write('not a recording')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def test_find(self):
+        found = [self.clean, self.m2ts, self.corrupt, self.garbage]
+        self.assertEqual(TSBatch.findFiles([self.directory]), sorted(found))
+        self.assertEqual(TSBatch.findFiles([self.directory], True), sorted(found + [self.nested]))
+        self.assertEqual(TSBatch.findFiles([os.path.join(self.directory, '*.ts')]), [self.clean, self.corrupt])
+        #a file named on its own whatever its extension
+        notes = os.path.join(self.directory, 'notes.txt')
+        self.assertEqual(TSBatch.findFiles([notes, self.clean, self.clean]), sorted([notes, self.clean]))
+
+    def test_analyze(self):
+        missing = os.path.join(self.directory, 'missing.ts')
+        filenames = [self.garbage, self.clean, missing, self.m2ts, self.corrupt]
+        reported = list()
+        results = TSBatch.analyzeFiles(filenames, jobs=2, callback=lambda r: reported.append(r["file"]))
+        self.assertEqual([r["file"] for r in results], filenames)
+        self.assertEqual(sorted(reported), sorted(filenames))
+        (garbage, clean, missing, m2ts, corrupt) = results
+        self.assertEqual((garbage["status"], garbage["error"]), ("failed", "no sync byte found"))
+        self.assertEqual(missing["status"], "failed")
+        self.assertTrue(missing["error"].startswith("FileNotFoundError: "))
+        self.assertIsNone(missing["packets"])
+        for r in (clean, m2ts, corrupt):
+            self.assertEqual((r["status"], r["error"]), ("ok", None))
+        self.assertEqual((clean["packet_size"], m2ts["packet_size"]), (188, 192))
+        self.assertEqual(clean["packets"], os.path.getsize(self.clean)//188)
+        self.assertEqual(m2ts["packets"], clean["packets"])
+        self.assertEqual(clean["programs"], m2ts["programs"])
+        self.assertEqual(clean["programs"][0]["pmt_pid"], streams.PMT_PID)
+        self.assertEqual(sum(p["count"] for p in clean["pids"]), clean["packets"])
+        self.assertEqual([p["pid"] for p in clean["pcr"]], [streams.VIDEO_PID])
+        self.assertEqual(sum(clean["errors"].values()), 0)
+        self.assertEqual(sum(m2ts["errors"].values()), 0)
+        self.assertGreater(corrupt["errors"]["1.2"], 0)
+        self.assertGreater(corrupt["errors"]["1.1"], 0)
+
+    def test_cli(self):
+        report = os.path.join(self.directory, 'report.jsonl')
+        subprocess.run([sys.executable, 'TSBatch.py', '-j', '2', '--output-format', 'jsonl', '-o', report,
+                        self.directory], cwd=streams.ROOT, check=True)
+        with open(report) as f:
+            results = [json.loads(line) for line in f]
+        self.assertEqual([r["file"] for r in results], TSBatch.findFiles([self.directory]))
+        self.assertEqual([r["status"] for r in results], ["ok", "ok", "ok", "failed"])
+        text = subprocess.run([sys.executable, 'TSBatch.py', '-j', '2', self.directory], cwd=streams.ROOT,
+                              stdout=subprocess.PIPE, universal_newlines=True, check=True).stdout
+        self.assertIn('%s: no sync byte found' %self.garbage, text)
+        self.assertIn('files = 4, analysed = 3, failed = 1, crashed = 0', text)
+
+if __name__ == '__main__':
+    unittest.main()
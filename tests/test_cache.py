@@ -0,0 +1,104 @@
+#this Python script is used to test that repeated PSI sections are served from the section cache
+
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+import streams
+
+import TSGen
+import TSStruct
+from TSSection import SectionCache, crc32MPEG2, sectionKey
+from TSSource import prefixLength
+
+PAT = TSGen._section(0x00, 1, struct.pack('>HHHH', 0, 0xE010, 1, 0xE100))
+
+def newVersion(path, name, first):
+    """Write a copy of path as name, the PMT sections from packet first on at version_number 1.
+
+    Return the path of the copy.
+    """
+    with open(path, 'rb') as f:
+        data = bytearray(f.read())
+    for n in range(first*188 + prefixLength(188), len(data), 188):
+        if ((data[n+1] & 0x1F) << 8) | data[n+2] == streams.PMT_PID and data[n+1] & 0x40:
+            k = n + 4
+            if data[n+3] & 0x20:
+                k += 1 + data[k]
+            k += 1 + data[k]
+            length = ((data[k+1] << 8) | data[k+2]) & 0xFFF
+            data[k+5] = (data[k+5] & 0xC1) | (1 << 1)
+            data[k+3+length-4:k+3+length] = struct.pack('>L', crc32MPEG2(data[k:k+3+length-4]))
+    copy = os.path.join(os.path.dirname(path), name)
+    with open(copy, 'wb') as f:
+        f.write(data)
+    return copy
+
+class SectionCacheTest(unittest.TestCase):
+
+    def test_key(self):
+        key = sectionKey(0, PAT, 0)
+        self.assertEqual(key, (0, 0x00, 0, 0, struct.unpack('>L', PAT[-4:])[0]))
+        self.assertNotEqual(sectionKey(0, TSGen._section(0x00, 1, PAT[8:-4], version=1), 0), key)
+        self.assertNotEqual(sectionKey(0x10, PAT, 0), key)
+        self.assertEqual(sectionKey(0, b'\xff' + PAT, 1), key)
+        #cut short
+        self.assertIsNone(sectionKey(0, PAT[:-2], 0))
+
+    def test_get(self):
+        cache = SectionCache()
+        key = sectionKey(0, PAT, 0)
+        self.assertIsNone(cache.get(key))
+        cache.put(key, 'PAT')
+        self.assertEqual(cache.get(key), 'PAT')
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertTrue(cache.isNew(0x100, PAT, 0))
+        self.assertFalse(cache.isNew(0x100, PAT, 0))
+
+class StreamCacheTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.path = streams.generate(cls.directory, 'clean.ts', frames=200)
+        cls.versions = newVersion(cls.path, 'versions.ts', os.path.getsize(cls.path)//188//2)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def parse(self, path, views=False):
+        stream = TSStruct.TSStream(views, verify_crc=True)
+        with open(path, 'rb') as f:
+            stream.parse(f)
+        return stream
+
+    def test_repeated(self):
+        "A repeated PAT or PMT is the item decoded the first time"
+        for views in (False, True):
+            stream = self.parse(self.path, views)
+            pats = stream.PIDMap[0]
+            pmts = stream.PIDMap[streams.PMT_PID]
+            self.assertGreater(len(pats), 5)
+            self.assertTrue(all(pat is pats[0] for pat in pats))
+            self.assertTrue(all(pmt is pmts[0] for pmt in pmts))
+            cache = stream.payload_parser.sections
+            self.assertEqual(cache.hits, len(pats) + len(pmts) - 2)
+
+    def test_new_version(self):
+        "A PMT with another version_number is decoded again, and then served from the cache"
+        stream = self.parse(self.versions)
+        self.assertEqual(stream.crc_errors, 0)
+        pmts = stream.PIDMap[streams.PMT_PID]
+        versions = [pmt.version_number for pmt in pmts]
+        self.assertEqual(versions, sorted(versions))
+        self.assertEqual(set(versions), set((0, 1)))
+        changed = versions.index(1)
+        self.assertTrue(all(pmt is pmts[0] for pmt in pmts[:changed]))
+        self.assertTrue(all(pmt is pmts[changed] for pmt in pmts[changed:]))
+        self.assertIsNot(pmts[changed], pmts[0])
+
+if __name__ == '__main__':
+    unittest.main()
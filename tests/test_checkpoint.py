@@ -0,0 +1,71 @@
+#this Python script is used to test that a parse resumed from a checkpoint gives what one parse gives
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import streams
+
+import TSStruct
+from test_parallel import summary
+
+class CheckpointTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.clean = streams.generate(cls.directory, 'clean.ts')
+        cls.corrupt = streams.corrupt(cls.clean, 'corrupt.ts')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def parse(self, path, checkpoint=None):
+        items = list()
+        stream = TSStruct.TSStream(verify_crc=True,
+                                   sink=TSStruct.CallbackSink(lambda pid, item: items.append((pid, summary(item)))))
+        stream.checkpoint_interval = 500
+        with open(path, 'rb') as f:
+            stream.parse(f, checkpoint=checkpoint)
+        return items, stream
+
+    def assertResumes(self, path, cut):
+        "Parse the first cut bytes of path with a checkpoint, append the rest and resume"
+        (items, stream) = self.parse(path)
+        with open(path, 'rb') as f:
+            data = f.read()
+        growing = os.path.join(self.directory, 'growing.ts')
+        checkpoint = os.path.join(self.directory, 'growing.ckpt')
+        for name in (growing, checkpoint):
+            if os.path.exists(name):
+                os.remove(name)
+        with open(growing, 'wb') as f:
+            f.write(data[:cut])
+        (first, ignored) = self.parse(growing, checkpoint)
+        self.assertTrue(os.path.exists(checkpoint))
+        with open(growing, 'ab') as f:
+            f.write(data[cut:])
+        (rest, resumed) = self.parse(growing, checkpoint)
+        self.assertTrue(first)
+        self.assertTrue(rest)
+        self.assertEqual(first + rest, items)
+        self.assertEqual(resumed.cc_errors, stream.cc_errors)
+        self.assertEqual(resumed.continuity, stream.continuity)
+
+    def test_resume_clean(self):
+        self.assertResumes(self.clean, os.path.getsize(self.clean)//188//2*188)
+
+    def test_resume_corrupt(self):
+        #after the inserted bytes, before the overwritten ones
+        self.assertResumes(self.corrupt, (os.path.getsize(self.corrupt)//2 - 77)//188*188 + 77)
+
+    def test_other_file(self):
+        checkpoint = os.path.join(self.directory, 'other.ckpt')
+        self.parse(self.clean, checkpoint)
+        with self.assertRaises(ValueError):
+            self.parse(self.corrupt, checkpoint)
+
+if __name__ == '__main__':
+    unittest.main()
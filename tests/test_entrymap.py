@@ -0,0 +1,101 @@
+#this Python script is used to test the entry point maps of IDR pictures and their seek()
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import streams
+
+import TSParser
+from TSIndex import EntryPointMap, PTS_WRAP
+
+class SeekTest(unittest.TestCase):
+
+    def entryMap(self, *pts):
+        entry_map = EntryPointMap(streams.VIDEO_PID)
+        for (i, p) in enumerate(pts):
+            entry_map.add(i*100, i*100*188, p, 10)
+        return entry_map
+
+    def test_empty(self):
+        self.assertIsNone(EntryPointMap().seek(0))
+
+    def test_seek(self):
+        entry_map = self.entryMap(1000, 4000, 7000)
+        self.assertEqual(entry_map.seek(0), (0, 0))
+        self.assertEqual(entry_map.seek(1000), (0, 0))
+        self.assertEqual(entry_map.seek(3999), (0, 0))
+        self.assertEqual(entry_map.seek(4000), (100, 18800))
+        self.assertEqual(entry_map.seek(6999), (100, 18800))
+        self.assertEqual(entry_map.seek(10**9), (200, 37600))
+
+    def test_unwrap(self):
+        entry_map = self.entryMap(PTS_WRAP - 3000, 0, 3000)
+        self.assertEqual([entry_map.entry(i)[2] for i in range(3)], [PTS_WRAP - 3000, PTS_WRAP, PTS_WRAP + 3000])
+        self.assertEqual(entry_map.seek(PTS_WRAP + 10), (100, 18800))
+        self.assertEqual(entry_map.seek(PTS_WRAP - 10), (0, 0))
+
+    def test_round_trip(self):
+        entry_map = self.entryMap(PTS_WRAP - 3000, 0, 3000)
+        entry_map.setPackets(42)
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'video.tsep')
+            entry_map.save(path)
+            loaded = EntryPointMap.load(path)
+            with open(path, 'rb') as f:
+                data = f.read()
+            with open(path, 'wb') as f:
+                f.write(data[:-1])
+            self.assertIsNone(EntryPointMap.load(path))
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual((loaded.pid, loaded.packet_size, loaded.start), (streams.VIDEO_PID, 188, 0))
+        self.assertEqual(loaded.entries, entry_map.entries)
+        self.assertEqual(loaded.entry(2), (200, 37600, PTS_WRAP + 3000, 42))
+        self.assertEqual(loaded.seek(PTS_WRAP + 3000), (200, 37600))
+
+class StreamMapTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.path = streams.generate(cls.directory, 'clean.ts', frames=300)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def writeMap(self, name, *options):
+        path = os.path.join(self.directory, name)
+        subprocess.run([sys.executable, 'TSParser.py', '-f', self.path, '-m', 'ES', '%x' % streams.VIDEO_PID,
+                        '--entry-map', path] + list(options),
+                       cwd=streams.ROOT, stdout=subprocess.DEVNULL, check=True)
+        return EntryPointMap.load(path)
+
+    def test_from_index(self):
+        with open(self.path, 'rb') as f:
+            index = TSParser.buildIndex(f, 188)
+        entry_map = EntryPointMap.fromIndex(index, streams.VIDEO_PID)
+        keyframes = list(index.keyframes(streams.VIDEO_PID))
+        self.assertGreater(len(keyframes), 1)
+        self.assertEqual([entry_map.entry(i)[0] for i in range(len(entry_map))], [k[0] for k in keyframes])
+        for i in range(len(entry_map)):
+            (packet, offset, pts, packets) = entry_map.entry(i)
+            self.assertEqual(offset, packet*188)
+            self.assertGreater(packets, 0)
+            self.assertEqual(entry_map.seek(pts), (packet, offset))
+            self.assertEqual(entry_map.seek(pts + 1), (packet, offset))
+
+    def test_cli(self):
+        #the map of a scan and the one of the index agree
+        scanned = self.writeMap('scan.tsep')
+        indexed = self.writeMap('index.tsep', '--index')
+        self.assertGreater(len(scanned), 1)
+        self.assertEqual(scanned.entries, indexed.entries)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+#this Python script is used to test that TSStream parses only the PIDs and programs asked for
+
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import streams
+
+import TSGen
+import TSStruct
+from TSSource import StreamReader
+from test_parallel import summary
+
+def parseUnits(path, processes=1, pids=None, programs=None, filehandle=None):
+    "Return the summary() of the units of a TSStream parse, by PID"
+    stream = TSStruct.TSStream(verify_crc=True)
+    if filehandle is None:
+        with open(path, 'rb') as f:
+            stream.parse(f, processes, pids, programs)
+    else:
+        stream.parse(filehandle, processes, pids, programs)
+    return dict((pid, [summary(item) for item in items]) for (pid, items) in stream.PIDMap.items())
+
+class FilterTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.path = streams.generate(cls.directory, 'programs.ts', frames=200, programs=3)
+        cls.units = parseUnits(cls.path)
+        cls.generator = TSGen.TSGenerator(programs=3)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def programUnits(self, *programs):
+        pids = set([TSGen.PAT_PID])
+        for program in programs:
+            (pmt, video, audio) = self.generator.programPIDs(program)
+            pids.update([pmt, video] + audio)
+        return dict((pid, units) for (pid, units) in self.units.items() if pid in pids)
+
+    def test_pids(self):
+        (pmt, video, audio) = self.generator.programPIDs(2)
+        for processes in (1, 3):
+            units = parseUnits(self.path, processes, pids=[video])
+            self.assertEqual(units, {video:self.units[video]})
+        #a PID missing from the stream gives nothing
+        self.assertEqual(parseUnits(self.path, pids=[0x1234]), {})
+
+    def test_programs(self):
+        for processes in (1, 3):
+            self.assertEqual(parseUnits(self.path, processes, programs=[2]), self.programUnits(2))
+            self.assertEqual(parseUnits(self.path, processes, programs=[1, 3]), self.programUnits(1, 3))
+
+    def test_programs_pipe(self):
+        "A pipe is filtered once the PAT and the PMTs of the programs have been read"
+        process = subprocess.Popen(['cat', self.path], stdout=subprocess.PIPE)
+        try:
+            units = parseUnits(None, programs=[3], filehandle=StreamReader(process.stdout))
+        finally:
+            process.wait()
+        self.assertEqual(sorted(units), sorted(self.programUnits(3)))
+        (pmt, video, audio) = self.generator.programPIDs(3)
+        #the units before the PMT was read may be missing
+        self.assertEqual(units[video], self.units[video][-len(units[video]):])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+#this Python script is used to test the follow mode reading a recording still being written
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+import streams
+
+from TSSource import FollowSource
+
+def append(path, data, pieces=7, pause=0.1):
+    "Start a thread appending data to path in pieces cut inside packets"
+    def write():
+        step = len(data) // pieces + 1
+        for n in range(0, len(data), step):
+            time.sleep(pause)
+            with open(path, 'ab') as f:
+                f.write(data[n:n+step])
+    thread = threading.Thread(target=write)
+    thread.start()
+    return thread
+
+class FollowTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        with open(streams.generate(cls.directory, 'clean.ts', frames=200), 'rb') as f:
+            cls.data = f.read()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def start(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def follow(self, path, idle_timeout, resync=False):
+        "Return the (offset, packet) a FollowSource of path hands out, the bytes it lost and the seconds it took"
+        begin = time.time()
+        with open(path, 'rb') as f:
+            source = FollowSource(f, 188, resync=resync, idle_timeout=idle_timeout)
+            source.poll_interval = 0.02
+            try:
+                packets = [(source.offset(n), bytes(data[n:n+188])) for (data, n) in source.packets()]
+            finally:
+                source.close()
+        return packets, source.lost_bytes, time.time() - begin
+
+    def expected(self, data):
+        return [(n, data[n:n+188]) for n in range(0, len(data) - 187, 188)]
+
+    def test_idle_timeout(self):
+        path = self.start('idle.ts', self.data)
+        (packets, lost, seconds) = self.follow(path, 0.3)
+        self.assertEqual(packets, self.expected(self.data))
+        self.assertGreaterEqual(seconds, 0.3)
+        self.assertLess(seconds, 5)
+
+    def test_growing(self):
+        cut = len(self.data)//3 + 100
+        path = self.start('growing.ts', self.data[:cut])
+        writer = append(path, self.data[cut:])
+        try:
+            (packets, lost, seconds) = self.follow(path, 0.5)
+        finally:
+            writer.join()
+        self.assertEqual(packets, self.expected(self.data))
+        self.assertEqual(lost, 0)
+
+    def test_growing_corrupt(self):
+        "Garbage appended is skipped once, and the packets after it are read"
+        cut = len(self.data)//3 // 188*188
+        data = self.data[:cut] + b'\x5a'*77 + self.data[cut:]
+        path = self.start('corrupt.ts', data[:cut + 40])
+        writer = append(path, data[cut + 40:])
+        try:
+            (packets, lost, seconds) = self.follow(path, 0.5, True)
+        finally:
+            writer.join()
+        self.assertEqual([p for (n, p) in packets], [p for (n, p) in self.expected(self.data)])
+        self.assertEqual(packets[cut//188][0], cut + 77)
+        self.assertEqual(lost, 77)
+
+    def test_truncated(self):
+        "A file getting shorter ends the follow"
+        path = self.start('truncated.ts', self.data)
+        def truncate():
+            time.sleep(0.3)
+            with open(path, 'r+b') as f:
+                f.truncate(188*10)
+        thread = threading.Thread(target=truncate)
+        thread.start()
+        try:
+            (packets, lost, seconds) = self.follow(path, None)
+        finally:
+            thread.join()
+        self.assertEqual(packets, self.expected(self.data))
+
+    def test_cli(self):
+        "--follow prints the units appended while it waits, as a parse of the whole file does"
+        def output(path, *options):
+            return subprocess.run([sys.executable, 'TSParser.py', '-f', path, '-m', 'ES', '%x' % streams.VIDEO_PID] + list(options),
+                                  cwd=streams.ROOT, stdout=subprocess.PIPE, check=True).stdout
+        cut = len(self.data)//2 + 55
+        path = self.start('cli.ts', self.data[:cut])
+        writer = append(path, self.data[cut:])
+        try:
+            followed = output(path, '--follow', '--idle-timeout', '2')
+        finally:
+            writer.join()
+        self.assertEqual(followed, output(path))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+#this Python script is used to test that a .tsidx index is written, read back and dropped once stale
+
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import streams
+
+import TSParser
+from TSIndex import TSIndex
+
+def buildIndex(path, packet_size=188):
+    with open(path, 'rb') as f:
+        return TSParser.buildIndex(f, packet_size)
+
+def openIndex(path, packet_size=188):
+    "TSParser.openIndex() of path, quietly"
+    with open(path, 'rb') as f, contextlib.redirect_stdout(io.StringIO()):
+        return TSParser.openIndex(path, f, packet_size)
+
+class IndexTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.clean = streams.generate(cls.directory, 'clean.ts', frames=300)
+        cls.corrupt = streams.corrupt(cls.clean, 'corrupt.ts')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def copy(self, path, name):
+        copy = os.path.join(self.directory, name)
+        shutil.copyfile(path, copy)
+        return copy
+
+    def assertSameIndex(self, loaded, index):
+        for name in ('packet_size', 'start', 'file_size', 'mtime', 'packet_count', 'sync_error'):
+            self.assertEqual(getattr(loaded, name), getattr(index, name), name)
+        self.assertEqual(loaded.units, index.units)
+        self.assertEqual(loaded.pcrs, index.pcrs)
+        self.assertEqual(loaded.resyncs, index.resyncs)
+
+    def test_round_trip(self):
+        for (path, resyncs) in ((self.clean, 0), (self.corrupt, 2)):
+            index = buildIndex(path)
+            index.stamp(path)
+            saved = os.path.join(self.directory, 'saved.tsidx')
+            index.save(saved)
+            loaded = TSIndex.load(saved)
+            self.assertSameIndex(loaded, index)
+            self.assertEqual(len(list(loaded.resyncEvents())), resyncs)
+            self.assertTrue(list(loaded.keyframes(streams.VIDEO_PID)))
+            self.assertTrue(list(loaded.pcrSamples(streams.VIDEO_PID)))
+
+    def test_open(self):
+        path = self.copy(self.clean, 'open.ts')
+        index = openIndex(path)
+        self.assertTrue(os.path.exists(TSIndex.indexPath(path)))
+        self.assertSameIndex(TSIndex.open(path, 188), index)
+        self.assertIsNone(TSIndex.open(path, 192))
+
+    def test_stale_mtime(self):
+        path = self.copy(self.clean, 'touched.ts')
+        openIndex(path)
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        self.assertIsNone(TSIndex.open(path, 188))
+
+    def test_stale_size(self):
+        path = self.copy(self.clean, 'grown.ts')
+        first = openIndex(path)
+        with open(path, 'rb') as f:
+            packet = f.read(188)
+        with open(path, 'ab') as f:
+            f.write(packet)
+        self.assertIsNone(TSIndex.open(path, 188))
+        #built again, with the packet appended
+        self.assertEqual(openIndex(path).packet_count, first.packet_count + 1)
+
+    def test_not_an_index(self):
+        path = os.path.join(self.directory, 'broken.tsidx')
+        self.assertIsNone(TSIndex.load(path))
+        #the index of the corrupt stream ends with 8 bytes resync records
+        buildIndex(self.corrupt).save(path)
+        with open(path, 'rb') as f:
+            data = f.read()
+        for broken in (b'TSXX' + data[4:], data[:20], data[:-1], data[:-8]):
+            with open(path, 'wb') as f:
+                f.write(broken)
+            self.assertIsNone(TSIndex.load(path))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+#this Python script is used to test the TR 101 290 indicators of TSMonitor
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import streams
+
+import TSGen
+import TSMonitor
+import TSPCR
+from TSSource import PacketSource
+
+def videoPackets(data):
+    "Numbers of the packets of data on the video PID without a PCR"
+    return [n//188 for n in range(0, len(data), 188)
+            if ((data[n+1] & 0x1F) << 8) | data[n+2] == streams.VIDEO_PID and
+            not (data[n+3] & 0x20 and data[n+4] >= 7 and data[n+5] & 0x10)]
+
+def monitor(path, numpy=TSMonitor.numpy):
+    "Return the indicators with errors of the report, numpy being the module TSMonitor uses"
+    saved = TSMonitor.numpy
+    TSMonitor.numpy = numpy
+    try:
+        m = TSMonitor.TR101290Monitor()
+        with open(path, 'rb') as f:
+            m.analyze(PacketSource(f, resync=True))
+    finally:
+        TSMonitor.numpy = saved
+    return dict((row["indicator"], row) for row in m.report() if row["count"])
+
+class MonitorTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.path = streams.generate(cls.directory, 'clean.ts', frames=300)
+        with open(cls.path, 'rb') as f:
+            data = bytearray(f.read())
+        video = videoPackets(data)
+        (cls.dropped, cls.sync, cls.error) = [video[len(video)*k//5] for k in (1, 2, 3)]
+        data[cls.sync*188] = 0
+        #transport_error_indicator set, and scrambling_control as the damage may leave it
+        data[cls.error*188 + 1] |= 0x80
+        data[cls.error*188 + 3] |= 0xC0
+        del data[cls.dropped*188:(cls.dropped + 1)*188]
+        cls.damaged = os.path.join(cls.directory, 'damaged.ts')
+        with open(cls.damaged, 'wb') as f:
+            f.write(data)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def test_clean(self):
+        self.assertEqual(monitor(self.path), {})
+
+    def test_damaged(self):
+        rows = monitor(self.damaged)
+        #the packets after the dropped one are numbered one less
+        (sync, error) = (self.sync - 1, self.error - 1)
+        self.assertEqual(rows["1.2"]["events"], [(sync, streams.VIDEO_PID, rows["1.2"]["events"][0][2])])
+        self.assertEqual(rows["2.1"]["pids"], {streams.VIDEO_PID:1})
+        self.assertEqual(rows["2.1"]["events"][0][0], error)
+        #a continuity_counter skipped by the dropped packet, and by the one with transport_error_indicator
+        self.assertEqual([e[0] for e in rows["1.4"]["events"]], [self.dropped, error + 1])
+        #the dropped packet moves the PCRs after it one packet earlier than the constant bitrate puts them
+        self.assertEqual(rows["2.4"]["count"], 2)
+        #a single wrong sync byte does not lose sync, and the damaged packet is not scrambled
+        self.assertEqual(sorted(rows), ["1.2", "1.4", "2.1", "2.4"])
+        #times from the first PCR, at the packet rate of the stream
+        generator = TSGen.TSGenerator()
+        rate = generator.frame_packets*TSPCR.PCR_HZ/float(TSGen.FRAME_TICKS)
+        for row in rows.values():
+            for (packet, pid, t) in row["events"]:
+                self.assertAlmostEqual(t, packet/rate, delta=0.01)
+
+    @unittest.skipIf(TSMonitor.numpy is None, 'NumPy is not installed')
+    def test_bytes(self):
+        "The path without NumPy reports the same errors"
+        for path in (self.path, self.damaged):
+            self.assertEqual(monitor(path, None), monitor(path))
+
+if __name__ == '__main__':
+    unittest.main()
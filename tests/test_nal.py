@@ -0,0 +1,127 @@
+#this Python script is used to test the access unit types found by TSNAL
+
+import unittest
+
+import streams
+
+from TSNAL import H264, HEVC, accessUnitType, classifyAccessUnit, detectCodec, nalUnits, sliceType
+
+START = b'\x00\x00\x00\x01'
+
+#H.264 slice headers: first_mb_in_slice 0 ('1'), then slice_type
+P_SLICE = b'\x41\x9a\x00'    #slice_type 5, P
+B_SLICE = b'\x01\x9e\x00'    #slice_type 6, B
+I_SLICE = b'\x41\xb8\x00'    #slice_type 7, I
+IDR_SLICE = b'\x65\x88\x84'
+SPS = b'\x67\x64\x00\x28'
+PPS = b'\x68\xee\x3c\x80'
+
+def aud(primary_pic_type):
+    return b'\x09' + bytes([(primary_pic_type << 5) | 0x10])
+
+def units(*nal_units):
+    return b''.join(START + u for u in nal_units)
+
+class SliceTypeTest(unittest.TestCase):
+
+    def test_slice_types(self):
+        for (header, slice_type) in ((P_SLICE, 0), (B_SLICE, 1), (I_SLICE, 2)):
+            self.assertEqual(sliceType(header, 0, len(header)), slice_type)
+
+    def test_first_mb(self):
+        #first_mb_in_slice 1 ('010'), slice_type 0 ('1')
+        self.assertEqual(sliceType(b'\x01\x50', 0, 2), 0)
+
+    def test_emulation_prevention(self):
+        #first_mb_in_slice 2**22 - 1, 22 zeros then 1 then 22 zeros, begins
+        #with 00 00 02, which is sent as 00 00 03 02; slice_type 0 follows
+        header = b'\x01\x00\x00\x03\x02\x00\x00\x04'
+        self.assertEqual(sliceType(header, 0, len(header)), 0)
+
+    def test_cut_short(self):
+        self.assertIsNone(sliceType(b'\x01\x00\x00', 0, 3))
+
+    def test_nal_units(self):
+        data = units(SPS, PPS, IDR_SLICE)
+        self.assertEqual([data[n] for n in nalUnits(data)], [0x67, 0x68, 0x65])
+
+class H264Test(unittest.TestCase):
+
+    def test_idr(self):
+        self.assertEqual(classifyAccessUnit(units(aud(0), SPS, PPS, IDR_SLICE)), ("IDR_picture", True))
+        self.assertEqual(accessUnitType(units(SPS, PPS, IDR_SLICE)), "IDR_picture")
+
+    def test_slices(self):
+        self.assertEqual(classifyAccessUnit(units(aud(0), I_SLICE)), ("I_picture", True))
+        self.assertEqual(classifyAccessUnit(units(aud(1), P_SLICE)), ("P_picture", True))
+        self.assertEqual(classifyAccessUnit(units(aud(2), I_SLICE, B_SLICE)), ("B_picture", True))
+
+    def test_highest_slice_type(self):
+        self.assertEqual(accessUnitType(units(aud(7), I_SLICE, P_SLICE, I_SLICE)), "P_picture")
+
+    def test_not_final(self):
+        #a B slice may follow while the primary_pic_type allows one
+        self.assertEqual(classifyAccessUnit(units(aud(2), P_SLICE)), ("P_picture", False))
+        self.assertEqual(classifyAccessUnit(units(aud(2), P_SLICE) + b'\x00'*4000 + START + B_SLICE),
+                         ("B_picture", True))
+
+    def test_next_access_unit(self):
+        self.assertEqual(classifyAccessUnit(units(aud(2), P_SLICE, aud(2), B_SLICE)), ("P_picture", True))
+
+    def test_delimiter_only(self):
+        self.assertEqual(classifyAccessUnit(units(aud(0))), ("IDR_picture", False))
+        self.assertEqual(classifyAccessUnit(units(aud(1))), ("non_IDR_picture", False))
+
+    def test_no_start_code(self):
+        self.assertEqual(accessUnitType(b'\xff'*100), "Unknown AU type")
+
+    def test_sei_first(self):
+        #an SEI whose payloadType looks like a HEVC temporal id is still H.264
+        data = units(b'\x06\x05\x10', P_SLICE)
+        self.assertEqual(detectCodec(data, 4), None)
+        self.assertEqual(accessUnitType(data), "P_picture")
+
+    def test_range(self):
+        data = b'\xaa'*10 + units(aud(1), P_SLICE) + units(IDR_SLICE)
+        self.assertEqual(accessUnitType(data, 10, 10 + len(units(aud(1), P_SLICE))), "P_picture")
+
+class HEVCTest(unittest.TestCase):
+
+    VPS = b'\x40\x01\x0c\x01'
+    SPS = b'\x42\x01\x01\x01'
+    PPS = b'\x44\x01\xc1\x72'
+    IDR = b'\x26\x01\xaf\x08'
+    CRA = b'\x2a\x01\xaf\x08'
+    TRAIL = b'\x02\x01\xd0\x08'
+
+    @staticmethod
+    def aud(pic_type):
+        return b'\x46\x01' + bytes([(pic_type << 5) | 0x10])
+
+    def test_delimiter(self):
+        data = units(self.aud(0), self.VPS, self.SPS, self.PPS, self.IDR)
+        self.assertEqual(detectCodec(data, 4), HEVC)
+        self.assertEqual(classifyAccessUnit(data), ("IRAP_picture", True))
+        self.assertEqual(accessUnitType(units(self.aud(2), self.TRAIL)), "non_IRAP_picture")
+
+    def test_without_delimiter(self):
+        for first in (self.VPS, self.SPS, self.PPS, self.IDR):
+            self.assertEqual(detectCodec(START + first, 4), HEVC)
+        self.assertEqual(accessUnitType(units(self.VPS, self.SPS, self.PPS, self.IDR)), "IRAP_picture")
+        self.assertEqual(accessUnitType(units(self.VPS, self.SPS, self.PPS, self.CRA)), "IRAP_picture")
+        self.assertEqual(accessUnitType(units(self.TRAIL)), "non_IRAP_picture")
+
+    def test_h264_not_taken(self):
+        for first in (SPS, PPS, IDR_SLICE, P_SLICE, aud(0)):
+            self.assertNotEqual(detectCodec(START + first, 4), HEVC)
+        self.assertEqual(detectCodec(START + aud(0), 4), H264)
+
+    def test_delimiter_only(self):
+        self.assertEqual(classifyAccessUnit(units(self.aud(0))), ("IRAP_picture", False))
+        self.assertEqual(classifyAccessUnit(units(self.aud(1))), ("non_IRAP_picture", False))
+
+    def test_codec_given(self):
+        self.assertEqual(accessUnitType(units(self.IDR), codec=HEVC), "IRAP_picture")
+
+if __name__ == '__main__':
+    unittest.main()
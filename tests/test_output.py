@@ -0,0 +1,132 @@
+#this Python script is used to test the jsonl, csv and npz event writers
+
+import csv
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import streams
+
+import TSOutput
+from TSOutput import PES_FIELDS, PCR_FIELDS, openWriter
+
+ROWS = [(0, 0x101, 0xE0, 8100, "IDR_picture"),
+        (5, 0x102, 0xC0, None, None),
+        (9, 0x101, 0xE0, 2**33 - 1, "P_picture"),
+        (12, 0x101, 0xE0, 0, "IDR_picture")]
+
+class Unclosed(io.StringIO):
+    "A StringIO whose value can be read after the writer closed it"
+    def close(self):
+        pass
+
+def writeRows(writer_type, rows, filehandle, batch_size=2):
+    writer = writer_type(filehandle, PES_FIELDS)
+    writer.batch_size = batch_size
+    for row in rows:
+        writer.write(row)
+    writer.close()
+    return writer
+
+class WriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_jsonl(self):
+        f = Unclosed()
+        self.assertEqual(writeRows(TSOutput.JSONLinesWriter, ROWS, f).count, len(ROWS))
+        lines = f.getvalue().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [dict(zip(PES_FIELDS, row)) for row in ROWS])
+        self.assertEqual(list(json.loads(lines[0])), list(PES_FIELDS))
+
+    def test_jsonl_values(self):
+        f = Unclosed()
+        writer = TSOutput.JSONLinesWriter(f, ("a", "b"))
+        for row in ((True, 'quote " and \\'), (False, 1.5)):
+            writer.write(row)
+        writer.close()
+        self.assertEqual([json.loads(line) for line in f.getvalue().splitlines()],
+                         [{"a":True, "b":'quote " and \\'}, {"a":False, "b":1.5}])
+
+    def test_csv(self):
+        f = Unclosed()
+        writeRows(TSOutput.CSVWriter, ROWS, f)
+        rows = list(csv.reader(io.StringIO(f.getvalue())))
+        self.assertEqual(rows[0], list(PES_FIELDS))
+        self.assertEqual(rows[1:], [['' if v is None else str(v) for v in row] for row in ROWS])
+
+    @unittest.skipIf(TSOutput.numpy is None, 'NumPy is not installed')
+    def test_npz(self):
+        path = os.path.join(self.directory, 'events.npz')
+        with open(path, 'wb') as f:
+            writeRows(TSOutput.NPZWriter, ROWS, f)
+        with TSOutput.numpy.load(path) as npz:
+            self.assertEqual(sorted(npz.files), sorted(PES_FIELDS + ('au_type_names',)))
+            for (i, field) in enumerate(PES_FIELDS[:3]):
+                self.assertEqual(npz[field].tolist(), [row[i] for row in ROWS])
+            #None as -1
+            self.assertEqual(npz["pts"].tolist(), [8100, -1, 2**33 - 1, 0])
+            names = npz["au_type_names"].tolist()
+            self.assertEqual([names[c] if c >= 0 else None for c in npz["au_type"].tolist()], [row[4] for row in ROWS])
+
+    @unittest.skipIf(TSOutput.numpy is None, 'NumPy is not installed')
+    def test_npz_empty(self):
+        path = os.path.join(self.directory, 'empty.npz')
+        with open(path, 'wb') as f:
+            writeRows(TSOutput.NPZWriter, [], f)
+        with TSOutput.numpy.load(path) as npz:
+            self.assertEqual(sorted(npz.files), sorted(PES_FIELDS))
+            self.assertEqual(len(npz["packet"]), 0)
+
+    def test_open(self):
+        with self.assertRaises(ValueError):
+            openWriter("npz", '-', PCR_FIELDS)
+        path = os.path.join(self.directory, 'pcr.csv')
+        writer = openWriter("csv", path, PCR_FIELDS)
+        writer.write((1, 0x101, 100, 2, False))
+        writer.close()
+        with open(path) as f:
+            self.assertEqual(f.read(), 'packet,pid,pcr_base,pcr_ext,discontinuity\n1,257,100,2,False\n')
+
+class ParserOutputTest(unittest.TestCase):
+    "TSParser writes the same events in every format"
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.path = streams.generate(cls.directory, 'clean.ts', frames=200)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def events(self, output_format, *search):
+        output = os.path.join(self.directory, 'events.' + output_format)
+        subprocess.run([sys.executable, 'TSParser.py', '-f', self.path] + list(search) +
+                       ['--output-format', output_format, '-o', output],
+                       cwd=streams.ROOT, stdout=subprocess.DEVNULL, check=True)
+        if output_format == 'jsonl':
+            with open(output) as f:
+                return [json.loads(line) for line in f]
+        with open(output) as f:
+            return list(csv.DictReader(f))
+
+    def test_formats(self):
+        for search in (('-m', 'ES', '%x' % streams.VIDEO_PID), ('-s', 'PCR')):
+            events = self.events('jsonl', *search)
+            self.assertGreater(len(events), 10)
+            rows = self.events('csv', *search)
+            self.assertEqual(rows, [dict((k, '' if v is None else str(v)) for (k, v) in e.items()) for e in events])
+        self.assertEqual(events[0]["pid"], streams.VIDEO_PID)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+#this Python script is used to test that the parallel parses give what a serial one gives
+
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import streams
+
+import TSParser
+import TSStruct
+
+def summary(item):
+    "What the tests compare of a parsed unit"
+    if hasattr(item, 'stream_id'):
+        pts = getattr(item.stream, 'PTS', None)
+        return ('PES', item.stream_id, item.pes_packet_length, pts.value if pts is not None else None)
+    return (type(item).__name__, getattr(item, 'CRC_32', None))
+
+def parseStream(path, processes, views=False):
+    "Return the units of a TSStream parse of path, and the stream"
+    items = list()
+    stream = TSStruct.TSStream(views, verify_crc=True,
+                               sink=TSStruct.CallbackSink(lambda pid, item: items.append((pid, summary(item)))))
+    with open(path, 'rb') as f:
+        stream.parse(f, processes=processes)
+    return items, stream
+
+class ParallelTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.clean = streams.generate(cls.directory, 'clean.ts')
+        cls.corrupt = streams.corrupt(cls.clean, 'corrupt.ts')
+        cls.clean192 = streams.generate(cls.directory, 'clean192.ts', packet_size=192)
+        cls.corrupt192 = streams.corrupt(cls.clean192, 'corrupt192.ts')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def assertSameParse(self, path, views=False):
+        (items, serial) = parseStream(path, 1, views)
+        self.assertTrue(items)
+        for processes in (2, 4):
+            (parallel_items, parallel) = parseStream(path, processes, views)
+            self.assertEqual(parallel_items, items)
+            self.assertEqual(parallel.cc_errors, serial.cc_errors)
+            self.assertEqual(parallel.continuity, serial.continuity)
+        return serial
+
+    def test_stream_clean(self):
+        self.assertEqual(self.assertSameParse(self.clean).cc_errors, 0)
+
+    def test_stream_corrupt(self):
+        self.assertGreater(self.assertSameParse(self.corrupt).cc_errors, 0)
+
+    def test_stream_corrupt_views(self):
+        self.assertSameParse(self.corrupt, True)
+
+    def test_stream_corrupt_192(self):
+        self.assertSameParse(self.corrupt192)
+
+    def test_stream_stopped(self):
+        "A parse stopped by its sink leaves no worker process behind"
+        def stop(pid, item):
+            raise KeyboardInterrupt
+        stream = TSStruct.TSStream(sink=TSStruct.CallbackSink(stop))
+        with open(self.corrupt, 'rb') as f:
+            with self.assertRaises(KeyboardInterrupt):
+                stream.parse(f, processes=4)
+        self.assertEqual(multiprocessing.active_children(), [])
+
+    def assertSameIndex(self, path, packet_size):
+        with open(path, 'rb') as f:
+            index = TSParser.buildIndex(f, packet_size)
+        for processes in (2, 8):
+            parallel = TSParser.buildIndexParallel(path, packet_size, processes)
+            self.assertEqual(parallel.packet_count, index.packet_count)
+            self.assertEqual(parallel.units, index.units)
+            self.assertEqual(parallel.pcrs, index.pcrs)
+            self.assertEqual(parallel.resyncs, index.resyncs)
+        return index
+
+    def test_index_clean(self):
+        index = self.assertSameIndex(self.clean, 188)
+        self.assertEqual(len(index.resyncs['packet']), 0)
+
+    def test_index_corrupt(self):
+        index = self.assertSameIndex(self.corrupt, 188)
+        self.assertEqual(len(index.resyncs['packet']), 2)
+
+    def test_index_corrupt_192(self):
+        self.assertSameIndex(self.corrupt192, 192)
+
+    def parserOutput(self, path, *options):
+        return subprocess.run([sys.executable, 'TSParser.py', '-f', path, '-m', 'ES', '%x' % streams.VIDEO_PID] + list(options),
+                              cwd=streams.ROOT, stdout=subprocess.PIPE, check=True).stdout
+
+    def test_cli_jobs(self):
+        for path in (self.clean, self.corrupt):
+            output = self.parserOutput(path)
+            self.assertIn(b'AU_Type = IDR_picture', output)
+            self.assertEqual(self.parserOutput(path, '-j', '3'), output)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+#this Python script is used to test the PCR interval and accuracy analysis of TSPCR
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import streams
+
+import TSGen
+import TSPCR
+from TSPCR import PCR_HZ, PCR_WRAP, PCRAnalyzer
+from TSSource import PacketSource
+
+def pcrPackets(data):
+    "Offsets of the packets of data carrying a PCR"
+    return [n for n in range(0, len(data), 188)
+            if data[n+3] & 0x20 and data[n+4] >= 7 and data[n+5] & 0x10]
+
+def rewritePCRs(path, name, jitter=None, drop=()):
+    """Write a copy of path as name, jitter(i) ticks added to the i-th PCR and the PCRs numbered in drop removed.
+
+    Return the path of the copy.
+    """
+    with open(path, 'rb') as f:
+        data = bytearray(f.read())
+    for (i, n) in enumerate(pcrPackets(data)):
+        if i in drop:
+            #PCR_flag cleared, the adaptation field left as it is
+            data[n+5] &= ~0x10
+            continue
+        if jitter is None:
+            continue
+        raw = int.from_bytes(data[n+6:n+12], 'big')
+        pcr = ((raw >> 15)*300 + (raw & 0x1FF) + jitter(i)) % PCR_WRAP
+        data[n+6:n+12] = (((pcr//300) << 15) | 0x7E00 | (pcr % 300)).to_bytes(6, 'big')
+    copy = os.path.join(os.path.dirname(path), name)
+    with open(copy, 'wb') as f:
+        f.write(data)
+    return copy
+
+def analyze(path, **options):
+    analyzer = PCRAnalyzer(**options)
+    with open(path, 'rb') as f:
+        analyzer.analyze(PacketSource(f, resync=True))
+    (row,) = analyzer.report()
+    return row
+
+class PCRTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.path = streams.generate(cls.directory, 'clean.ts', frames=300)
+        cls.generator = TSGen.TSGenerator()
+        with open(cls.path, 'rb') as f:
+            cls.samples = len(pcrPackets(f.read()))
+        cls.frame = float(TSGen.FRAME_TICKS)/PCR_HZ
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def test_clean(self):
+        row = analyze(self.path)
+        self.assertEqual(row["pid"], streams.VIDEO_PID)
+        self.assertEqual(row["samples"], self.samples)
+        self.assertEqual((row["interval_violations"], row["accuracy_violations"]), (0, 0))
+        self.assertAlmostEqual(row["interval_mean"], self.frame, delta=1e-6)
+        #the PCR of a packet is rounded down to a tick
+        self.assertLess(row["accuracy_max"], 1e9/PCR_HZ)
+        self.assertAlmostEqual(row["bitrate"], self.generator.muxRate(), delta=1)
+        self.assertEqual((row["discontinuities"], row["jumps"], row["wraps"]), (0, 0, 0))
+
+    def test_interval(self):
+        "Every PCR removed leaves one interval of two frames, longer than 40 ms"
+        path = rewritePCRs(self.path, 'gaps.ts', drop=(10, 50, 200))
+        row = analyze(path)
+        self.assertEqual(row["samples"], self.samples - 3)
+        self.assertEqual(row["interval_violations"], 3)
+        self.assertAlmostEqual(row["interval_max"], 2*self.frame, delta=1e-6)
+        self.assertEqual((row["accuracy_violations"], row["jumps"]), (0, 0))
+        self.assertEqual(analyze(path, max_interval=0.07)["interval_violations"], 0)
+        #two in a row leave three frames, past discontinuity_limit: a jump, not an interval
+        row = analyze(rewritePCRs(self.path, 'gaps.ts', drop=(50, 51)))
+        self.assertEqual((row["interval_violations"], row["jumps"]), (0, 1))
+
+    def test_jitter(self):
+        "PCRs alternately jitter ticks early and late are 2*jitter off the line through their neighbours"
+        for (jitter, violations) in ((6, 0), (10, self.samples - 2)):
+            path = rewritePCRs(self.path, 'jitter.ts', lambda i: jitter if i % 2 else -jitter)
+            row = analyze(path)
+            error = 2*jitter*1e9/PCR_HZ
+            self.assertEqual(row["accuracy_violations"], violations)
+            self.assertAlmostEqual(row["accuracy_max"], error, delta=1e9/PCR_HZ)
+            self.assertAlmostEqual(abs(row["accuracy_mean"]), 0, delta=error/10)
+            self.assertAlmostEqual(row["accuracy_deviation"], error, delta=1e9/PCR_HZ)
+            self.assertEqual(row["interval_violations"], 0)
+            #the errors fall into the bins on both sides of 0
+            self.assertEqual(sum(count for (low, high, count) in row["histogram"]), self.samples - 2)
+            for (low, high, count) in row["histogram"]:
+                self.assertTrue(low <= -error + 100 or high >= error - 100)
+
+    def test_single(self):
+        "One PCR 2 us late is a violation, and so are its neighbours 1 us off, unless accuracy is 1.5 us"
+        path = rewritePCRs(self.path, 'single.ts', lambda i: 54 if i == 100 else 0)
+        self.assertEqual(analyze(path)["accuracy_violations"], 3)
+        self.assertEqual(analyze(path, accuracy=1.5e-6)["accuracy_violations"], 1)
+
+    @unittest.skipIf(TSPCR.numpy is None, 'NumPy is not installed')
+    def test_bytes(self):
+        "The columns decoded without NumPy are the same"
+        path = rewritePCRs(self.path, 'jitter.ts', lambda i: 10 if i % 2 else -10, drop=(10,))
+        with open(path, 'rb') as f:
+            data = f.read()
+        columns = (TSPCR._pcrNumpy(data, 188, 0, len(data)//188), TSPCR._pcrBytes(data, 188, 0, len(data)//188))
+        for field in ('index', 'pid', 'pcr', 'discontinuity'):
+            self.assertEqual(*[list(getattr(c, field)) for c in columns])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+#this Python script is used to test the bounded and the streamed reassembly of PES
+
+import shutil
+import tempfile
+import unittest
+
+import streams
+
+import TSStruct
+from test_parallel import summary
+
+def parseStream(path, processes=1, **options):
+    stream = TSStruct.TSStream(verify_crc=True, **options)
+    with open(path, 'rb') as f:
+        stream.parse(f, processes)
+    return stream
+
+def overflows(stream):
+    return sum(worker.overflows for worker in stream.payload_parser.workers.values())
+
+class PESTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.path = streams.generate(cls.directory, 'clean.ts', frames=200)
+        cls.stream = parseStream(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def units(self, stream):
+        return dict((pid, [summary(item) for item in items]) for (pid, items) in stream.PIDMap.items())
+
+    def test_max_pes_size(self):
+        "PES larger than max_pes_size are dropped and counted, the others kept"
+        max_size = 700
+        sizes = dict((pid, [6 + item.stream.pes_packet_length for item in items])
+                     for (pid, items) in self.stream.PIDMap.items() if hasattr(items[0], 'stream_id'))
+        #max_size falls between the sizes of the video PES
+        video = sizes[streams.VIDEO_PID]
+        self.assertLess(min(video), max_size)
+        self.assertGreater(max(video), max_size)
+        units = self.units(self.stream)
+        expected = dict()
+        for (pid, items) in units.items():
+            kept = [u for (u, size) in zip(items, sizes.get(pid, [0]*len(items))) if size <= max_size]
+            if kept:
+                expected[pid] = kept
+        dropped = sum(1 for s in sizes.values() for size in s if size > max_size)
+        for processes in (1, 3):
+            stream = parseStream(self.path, processes, max_pes_size=max_size)
+            self.assertEqual(self.units(stream), expected)
+            #the last PES, never finished, may be counted too
+            self.assertIn(overflows(stream), (dropped, dropped + 1))
+
+    def test_pes_callback(self):
+        "pes_callback gets the payload of every packet, which joined gives the PES"
+        pieces = dict()
+        def callback(pid, data, start):
+            if start:
+                pieces.setdefault(pid, []).append([])
+            pieces[pid][-1].append(bytes(data))
+        stream = parseStream(self.path, 3, pes_callback=callback)
+        units = self.units(self.stream)
+        pes_pids = [pid for (pid, items) in units.items() if items[0][0] == 'PES']
+        self.assertEqual(sorted(pieces), sorted(pes_pids))
+        for pid in pes_pids:
+            #the reassembling parse leaves the last PES of every PID unfinished
+            joined = [summary(TSStruct.PES(b''.join(p))) for p in pieces[pid]]
+            self.assertEqual(joined[:-1], units[pid])
+            #and the PES are not kept
+            self.assertNotIn(pid, stream.PIDMap)
+
+if __name__ == '__main__':
+    unittest.main()
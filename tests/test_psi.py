@@ -0,0 +1,51 @@
+#this Python script is used to test the decoding of PAT, PMT and SIT sections
+
+import contextlib
+import io
+import struct
+import unittest
+
+import streams
+
+import TSGen
+import TSParser
+from TSSection import decodePAT, decodePMT, decodeSIT, decodeSection
+
+PAT = TSGen._section(0x00, 1, struct.pack('>HHHH', 0, 0xE010, 1, 0xE100))
+PMT = TSGen._section(0x02, 1, struct.pack('>HH', 0xE101, 0xF000) + struct.pack('>BHH', 0x1B, 0xE101, 0xF000))
+
+class DecodeTest(unittest.TestCase):
+
+    def test_pat(self):
+        pat = decodePAT(PAT, True)
+        self.assertTrue(pat.crc_valid)
+        self.assertEqual(pat.transport_stream_id, 1)
+        self.assertEqual(pat.program_list, [{"program_number":0, "pid":0x10}, {"program_number":1, "pid":0x100}])
+
+    def test_pmt(self):
+        pmt = decodeSection(PMT, True)
+        self.assertTrue(pmt.crc_valid)
+        self.assertEqual((pmt.program_number, pmt.PCR_PID), (1, 0x101))
+        self.assertEqual([(es["stream_type"], es["elementary_PID"]) for es in pmt.es_list], [(0x1B, 0x101)])
+
+    def test_wrong_table(self):
+        with self.assertRaises(ValueError):
+            decodePMT(PAT)
+
+    def test_truncated(self):
+        #shorter than the section header, or a section_length of 2
+        for decoder in (decodePAT, decodePMT, decodeSIT):
+            for data in (PAT[:5], b'\x00\xb0\x02\x00\x01', b'\x00\xb0\x02\x00\x01\xc1\x00\x00' + b'\xff'*20):
+                with self.assertRaises(ValueError):
+                    decoder(data)
+
+    def test_parse_truncated(self):
+        "TSParser skips a truncated section instead of failing"
+        for data in (b'\x00\xb0\x02\x00\x01', b'\x00\xb0\x02\x00\x01\xc1\x00\x00' + b'\xff'*20):
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                self.assertIsNone(TSParser.parsePATSection(data, 0, True))
+            self.assertIn('error in parsePATSection()', output.getvalue())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+#this Python script is used to test the CRC_32 of PSI sections
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import streams
+
+import TSGen
+from TSSection import crc32MPEG2, sectionCRCValid
+from TSSource import prefixLength
+
+class CRCTest(unittest.TestCase):
+
+    def test_check_value(self):
+        #the check value of CRC-32/MPEG-2
+        self.assertEqual(crc32MPEG2(b'123456789'), 0x0376E6E7)
+
+    def test_table(self):
+        "The same CRC as the bytewise table of the standard"
+        table = list()
+        for i in range(256):
+            c = i << 24
+            for bit in range(8):
+                c = ((c << 1) ^ 0x04C11DB7) if c & 0x80000000 else c << 1
+            table.append(c & 0xFFFFFFFF)
+        for n in (1, 3, 188, 1021, 4096):
+            data = os.urandom(n)
+            crc = 0xFFFFFFFF
+            for b in data:
+                crc = ((crc << 8) & 0xFFFFFFFF) ^ table[(crc >> 24) ^ b]
+            self.assertEqual(crc32MPEG2(data), crc, n)
+            self.assertEqual(crc32MPEG2(bytearray(data)), crc)
+            self.assertEqual(crc32MPEG2(memoryview(data)), crc)
+
+    def test_empty(self):
+        self.assertEqual(crc32MPEG2(b''), 0xFFFFFFFF)
+
+    def test_section(self):
+        section = TSGen._section(0x00, 1, b'\x00\x01\xe1\x00')
+        self.assertTrue(sectionCRCValid(section, 0))
+        self.assertTrue(sectionCRCValid(b'\xff' + section, 1))
+        damaged = bytearray(section)
+        damaged[5] ^= 0x02
+        self.assertFalse(sectionCRCValid(damaged, 0))
+        #a section cut short
+        self.assertFalse(sectionCRCValid(section[:-1], 0))
+
+class UniqueSectionTest(unittest.TestCase):
+    "--unique remembers only the sections which pass the CRC_32 check"
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        path = streams.generate(cls.directory, 'clean.ts', frames=100)
+        with open(path, 'rb') as f:
+            data = bytearray(f.read())
+        #damage the section of the first PMT packet
+        for n in range(prefixLength(188), len(data), 188):
+            if ((data[n+1] & 0x1F) << 8) | data[n+2] == streams.PMT_PID:
+                k = n + 4
+                if data[n+3] & 0x20:
+                    k += 1 + data[k]
+                data[k + 1 + data[k] + 8] ^= 0xFF
+                break
+        cls.path = os.path.join(cls.directory, 'pmtfirst.ts')
+        with open(cls.path, 'wb') as f:
+            f.write(data)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def parserOutput(self, *options):
+        return subprocess.run([sys.executable, 'TSParser.py', '-f', self.path] + list(options),
+                              cwd=streams.ROOT, stdout=subprocess.PIPE, check=True).stdout.decode()
+
+    def test_unique_after_bad_crc(self):
+        output = self.parserOutput('-s', 'PMT', '--unique', '--crc')
+        #the damaged PMT and the first good one, then none
+        self.assertEqual(output.count('pasing PMT Packet!'), 2)
+        self.assertIn('1 PSI sections failed the CRC_32 check', output)
+
+    def test_first_only_summary(self):
+        output = self.parserOutput('-s', 'PMT', '--crc')
+        self.assertIn('PSI sections failed the CRC_32 check', output)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+#this Python script is used to test the seek to a time by the PCRs of TSStream.seek_time()
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import streams
+
+import TSGen
+import TSStruct
+
+PCR_BASE_WRAP = 1 << 33
+
+def shiftPCRs(path, name, shift, first=0, discontinuity=False):
+    """Write a copy of path as name, shift added to the PCR base of the packets from packet first on.
+
+    With discontinuity, the first PCR shifted has its discontinuity_indicator set.
+    Return the path of the copy.
+    """
+    with open(path, 'rb') as f:
+        data = bytearray(f.read())
+    for n in range(first*188, len(data), 188):
+        if data[n+3] & 0x20 and data[n+4] >= 7 and data[n+5] & 0x10:
+            pcr = int.from_bytes(data[n+6:n+12], 'big')
+            base = ((pcr >> 15) + shift) % PCR_BASE_WRAP
+            data[n+6:n+12] = ((base << 15) | (pcr & 0x7FFF)).to_bytes(6, 'big')
+            if discontinuity:
+                data[n+5] |= 0x80
+                discontinuity = False
+    copy = os.path.join(os.path.dirname(path), name)
+    with open(copy, 'wb') as f:
+        f.write(data)
+    return copy
+
+class SeekTimeTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.path = streams.generate(cls.directory, 'clean.ts', frames=1200)
+        cls.generator = TSGen.TSGenerator()
+        cls.packets = os.path.getsize(cls.path)//188
+        #the first packet carrying a PCR
+        with open(cls.path, 'rb') as f:
+            data = f.read()
+        cls.first = min(n//188 for n in range(0, len(data), 188)
+                        if data[n+3] & 0x20 and data[n+4] >= 7 and data[n+5] & 0x10)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def packetAt(self, seconds):
+        "Number of the packet at seconds from the first PCR, at the constant rate of the stream"
+        g = self.generator
+        return self.first + int(seconds*27000000*g.frame_packets/TSGen.FRAME_TICKS)
+
+    def seek(self, path, target, seek_window=64*1024):
+        stream = TSStruct.TSStream()
+        stream.seek_window = seek_window
+        with open(path, 'rb') as f:
+            offset = stream.seek_time(target, f)
+            if offset is not None:
+                self.assertEqual(f.tell(), offset)
+        return offset
+
+    def assertSeeks(self, path, seek_window=64*1024):
+        for seconds in (0, 1.5, 12.345, 25, 38):
+            offset = self.seek(path, seconds, seek_window)
+            self.assertEqual(offset % 188, 0)
+            self.assertAlmostEqual(offset//188, self.packetAt(seconds), delta=2)
+
+    def test_seek(self):
+        for seek_window in (64*1024, 4*1024*1024):
+            self.assertSeeks(self.path, seek_window)
+
+    def test_time_string(self):
+        self.assertEqual(self.seek(self.path, "00:00:12.5"), self.seek(self.path, 12.5))
+        self.assertEqual(self.seek(self.path, "0:25"), self.seek(self.path, 25))
+
+    def test_outside(self):
+        self.assertEqual(self.seek(self.path, -1), self.first*188)
+        #past the last PCR, the last one
+        self.assertLessEqual(self.seek(self.path, 3600), self.packets*188)
+        self.assertGreater(self.seek(self.path, 3600), self.packetAt(38)*188)
+
+    def test_wrap(self):
+        "The 33 bits PCR base wraps around in the middle of the file"
+        shift = PCR_BASE_WRAP - (TSGen.PCR_START//300) - 20*90000
+        self.assertSeeks(shiftPCRs(self.path, 'wrap.ts', shift))
+
+    def test_discontinuity(self):
+        "Across a PCR discontinuity the timeline runs on at the bitrate before it"
+        path = shiftPCRs(self.path, 'discontinuity.ts', 1000*90000, self.packetAt(20), True)
+        self.assertSeeks(path)
+        self.assertSeeks(path, 4*1024*1024)
+
+    def test_no_pcr(self):
+        path = os.path.join(self.directory, 'nopcr.ts')
+        with open(self.path, 'rb') as f:
+            data = f.read(188*self.first)
+        with open(path, 'wb') as f:
+            f.write(data)
+        self.assertIsNone(self.seek(path, 1))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+#this Python script is used to test the sinks TSStream hands its units to
+
+import shutil
+import tempfile
+import unittest
+
+import streams
+
+import TSStruct
+from test_parallel import summary
+
+def parseStream(path, sink, processes=1, views=False):
+    stream = TSStruct.TSStream(views, sink=sink, verify_crc=True)
+    with open(path, 'rb') as f:
+        stream.parse(f, processes)
+    return stream
+
+class SinkTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.path = streams.generate(cls.directory, 'clean.ts', frames=200)
+        cls.items = parseStream(cls.path, None).PIDMap
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def test_default(self):
+        self.assertIsInstance(parseStream(self.path, None).sink, TSStruct.PIDMapSink)
+        self.assertIn(streams.VIDEO_PID, self.items)
+        self.assertIn(streams.PMT_PID, self.items)
+
+    def test_ring(self):
+        "RingSink keeps the last size units of every PID"
+        for processes in (1, 3):
+            stream = parseStream(self.path, TSStruct.RingSink(3), processes)
+            self.assertEqual(sorted(stream.PIDMap), sorted(self.items))
+            for (pid, items) in self.items.items():
+                self.assertEqual([summary(item) for item in stream.PIDMap[pid]],
+                                 [summary(item) for item in items[-3:]])
+
+    def test_metadata(self):
+        "MetadataSink keeps the PSI tables and the header fields of the PES"
+        for views in (False, True):
+            stream = parseStream(self.path, TSStruct.MetadataSink(), views=views)
+            self.assertEqual(sorted(stream.PIDMap), sorted(self.items))
+            video = stream.PIDMap[streams.VIDEO_PID]
+            self.assertEqual(video, [TSStruct.pesMetadata(item) for item in self.items[streams.VIDEO_PID]])
+            self.assertEqual(video[0]["AUType"], "IDR_picture")
+            self.assertIsNotNone(video[0]["PTS"])
+            self.assertEqual([summary(item) for item in stream.PIDMap[streams.PMT_PID]],
+                             [summary(item) for item in self.items[streams.PMT_PID]])
+
+    def test_callback(self):
+        "CallbackSink hands out every unit in file order and only counts them"
+        for processes in (1, 3):
+            units = list()
+            stream = parseStream(self.path, TSStruct.CallbackSink(lambda pid, item: units.append((pid, summary(item)))),
+                                 processes)
+            self.assertEqual(stream.PIDMap, dict((pid, len(items)) for (pid, items) in self.items.items()))
+            for (pid, items) in self.items.items():
+                self.assertEqual([u for (p, u) in units if p == pid], [summary(item) for item in items])
+
+if __name__ == '__main__':
+    unittest.main()
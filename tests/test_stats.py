@@ -0,0 +1,137 @@
+#this Python script is used to test the counters and stage timers of TSStats
+
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import streams
+
+import TSStruct
+from TSStats import COUNTERS, Stats, TimedStream
+
+class FakeClock(object):
+    "A clock which moves on by one second every time it is read"
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        self.now += 1.0
+        return self.now
+
+def parseStream(path, processes=1, pids=None):
+    stats = Stats()
+    stream = TSStruct.TSStream(stats=stats, verify_crc=True)
+    with open(path, 'rb') as f:
+        stream.parse(f, processes, pids)
+    return (stream, stats.report())
+
+def stages(report):
+    return dict((s["stage"], s["calls"]) for s in report["stages"])
+
+class StatsTest(unittest.TestCase):
+
+    def test_counters(self):
+        stats = Stats()
+        stats.count("pes_units")
+        stats.count("bytes_read", 188*3)
+        stats.count("other", 2)
+        counters = stats.report()["counters"]
+        self.assertEqual(sorted(counters), sorted(COUNTERS + ("other",)))
+        self.assertEqual((counters["pes_units"], counters["bytes_read"], counters["other"]), (1, 564, 2))
+        self.assertEqual(counters["psi_units"], 0)
+
+    def test_stages(self):
+        stats = Stats()
+        stats.clock = FakeClock()
+        stats.started = stats.clock()
+        stats.add("PES", stats.clock())
+        self.assertEqual(list(stats.iterate("read", "ab")), ['a', 'b'])
+        output = io.StringIO()
+        TimedStream(output, stats).write('text')
+        self.assertEqual(output.getvalue(), 'text')
+        report = stats.report()
+        #the wait for every item and the one which ends the iteration
+        self.assertEqual(stages(report), {"PES":1, "read":3, "output":1})
+        self.assertEqual([s["seconds"] for s in report["stages"]], [1.0, 3.0, 1.0])
+        self.assertEqual(report["elapsed"], 11.0)
+        self.assertEqual(json.loads(stats.json())["stages"][1]["share"], 0.25)
+        self.assertIn('%-20s %12d' %("pes_units", 0), stats.table())
+
+    def test_chunks(self):
+        stats = Stats()
+        chunks = [(b'\x47'*188*4, 0, 4), (b'\x47'*188*4, 188, 2)]
+        self.assertEqual(list(stats.chunks(chunks, 188)), chunks)
+        self.assertEqual(stats.report()["counters"]["bytes_read"], 6*188)
+
+class StreamStatsTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.path = streams.generate(cls.directory, 'clean.ts', frames=200)
+        cls.packets = os.path.getsize(cls.path)//188
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def units(self, stream, kind):
+        "Number of units of stream with the type of TSStruct name kind"
+        return sum(len(items) for items in stream.PIDMap.values() if type(items[0]).__name__ in kind)
+
+    def test_serial(self):
+        (stream, report) = parseStream(self.path)
+        counters = report["counters"]
+        self.assertEqual(counters["bytes_read"], os.path.getsize(self.path))
+        self.assertEqual(counters["packets_decoded"], self.packets)
+        self.assertEqual(counters["pes_units"], self.units(stream, ('PES',)))
+        self.assertEqual(counters["psi_units"], self.units(stream, ('PAT', 'PMT')))
+        self.assertEqual(counters["dispatches"], len(stream.payload_parser.workers))
+        #the PES of several packets are joined
+        self.assertGreater(counters["bytes_copied"], 0)
+        calls = stages(report)
+        self.assertEqual((calls["packet"], calls["payload"], calls["sink"]), (self.packets,)*3)
+        self.assertEqual((calls["PES"], calls["PSI"]), (counters["pes_units"], counters["psi_units"]))
+
+    def test_filter(self):
+        "Only the packets of the PIDs parsed are decoded"
+        (stream, report) = parseStream(self.path, pids=[streams.VIDEO_PID])
+        counters = report["counters"]
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        video = sum(1 for n in range(0, len(data), 188) if ((data[n+1] & 0x1F) << 8) | data[n+2] == streams.VIDEO_PID)
+        self.assertEqual(counters["bytes_read"], len(data))
+        self.assertEqual(counters["packets_decoded"], video)
+        self.assertEqual((counters["psi_units"], counters["dispatches"]), (0, 1))
+        self.assertEqual(counters["pes_units"], len(stream.PIDMap[streams.VIDEO_PID]))
+
+    def test_parallel(self):
+        (serial, expected) = parseStream(self.path)
+        (stream, report) = parseStream(self.path, 3)
+        counters = report["counters"]
+        for name in ("bytes_read", "packets_decoded", "pes_units", "psi_units", "dispatches"):
+            self.assertEqual(counters[name], expected["counters"][name])
+        self.assertIn("workers", stages(report))
+
+    def test_cli(self):
+        output = os.path.join(self.directory, 'pes.jsonl')
+        out = subprocess.run([sys.executable, 'TSParser.py', '-f', self.path, '-m', 'ES', '%x' % streams.VIDEO_PID,
+                              '--profile', 'json', '--output-format', 'jsonl', '-o', output],
+                             cwd=streams.ROOT, stdout=subprocess.PIPE, universal_newlines=True, check=True).stdout
+        report = json.loads(out.splitlines()[-1])
+        with open(output) as f:
+            events = sum(1 for line in f)
+        self.assertEqual(report["counters"]["bytes_read"], os.path.getsize(self.path))
+        self.assertEqual(report["counters"]["packets_decoded"], self.packets)
+        self.assertEqual(report["counters"]["pes_units"], events)
+        #the writer opened with the Stats times its writes
+        self.assertIn("output", stages(report))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+#this Python script is used to test that pipes, FIFOs and stdin are read as files are
+
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+
+import streams
+
+from TSSource import PacketSource, StreamReader, detectSync, isSeekable, openStream
+
+def pipe(data):
+    "Return a StreamReader of a pipe which a thread fills with data in small writes"
+    (r, w) = os.pipe()
+    def write():
+        with io.open(w, 'wb', buffering=0) as f:
+            for n in range(0, len(data), 1000):
+                f.write(data[n:n+1000])
+    thread = threading.Thread(target=write)
+    thread.daemon = True
+    thread.start()
+    return StreamReader(io.open(r, 'rb', buffering=0))
+
+def readPackets(filehandle, packet_size, start=0, resync=False):
+    source = PacketSource(filehandle, packet_size, start, resync=resync)
+    try:
+        return [(source.offset(n), bytes(data[n:n+packet_size])) for (data, n) in source.packets()]
+    finally:
+        source.close()
+
+class StreamTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.path = streams.generate(cls.directory, 'clean.ts', frames=300)
+        cls.corrupt = streams.corrupt(cls.path, 'corrupt.ts')
+        cls.path192 = streams.generate(cls.directory, 'clean192.ts', frames=100, packet_size=192)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_reader(self):
+        reader = pipe(b'0123456789'*1000)
+        self.assertFalse(isSeekable(reader))
+        self.assertEqual(reader.peek(5), b'01234')
+        self.assertEqual(reader.tell(), 0)
+        self.assertEqual(reader.read(3), b'012')
+        self.assertEqual(reader.tell(), 3)
+        #what was peeked at is read first
+        b = bytearray(4)
+        self.assertEqual(reader.readinto(b), 2)
+        self.assertEqual(bytes(b[:2]), b'34')
+        self.assertEqual(reader.tell(), 5)
+        self.assertEqual(len(reader.read()), 10000 - 5)
+        self.assertEqual(reader.read(1), b'')
+        reader.close()
+
+    def test_open_fifo(self):
+        fifo = os.path.join(self.directory, 'fifo')
+        os.mkfifo(fifo)
+        data = self.read(self.path)
+        def write():
+            with open(fifo, 'wb') as f:
+                f.write(data)
+        thread = threading.Thread(target=write)
+        thread.start()
+        f = openStream(fifo)
+        try:
+            self.assertIsInstance(f, StreamReader)
+            self.assertEqual(detectSync(f), (0, 188))
+            self.assertEqual(readPackets(f, 188), readPackets(io.BytesIO(data), 188))
+        finally:
+            f.close()
+            thread.join()
+        with openStream(self.path) as f:
+            self.assertTrue(isSeekable(f))
+
+    def test_detect(self):
+        data = self.read(self.path192)
+        reader = pipe(b'\x5a'*77 + data)
+        self.assertEqual(detectSync(reader), (77, 192))
+        #detection consumes nothing
+        self.assertEqual(reader.read(77), b'\x5a'*77)
+        reader.close()
+
+    def test_packets(self):
+        for (path, packet_size, resync) in ((self.path, 188, False), (self.path192, 192, False), (self.corrupt, 188, True)):
+            with open(path, 'rb') as f:
+                expected = readPackets(f, packet_size, 188*10 + 3, resync)
+            reader = pipe(self.read(path))
+            self.assertEqual(readPackets(reader, packet_size, 188*10 + 3, resync), expected)
+            reader.close()
+
+    def test_stdin(self):
+        "TSParser -f - prints what it prints for the file, but for the name of the file"
+        def output(name, data=None):
+            return subprocess.run([sys.executable, 'TSParser.py', '-f', name, '-m', 'ES', '%x' % streams.VIDEO_PID],
+                                  cwd=streams.ROOT, input=data, stdout=subprocess.PIPE, check=True).stdout.split(b'\n')
+        for path in (self.path, self.corrupt):
+            #stdin is a pipe
+            piped = output('-', self.read(path))
+            expected = output(path)
+            self.assertGreater(len(expected), 100)
+            self.assertEqual(piped[1:], expected[1:])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+#this Python script is used to test the sync and packet size detection and the resync of PacketSource
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import streams
+
+from TSSource import PacketSource, detectSync, prefixLength, probeSync
+
+#garbage without a sync byte
+GARBAGE = b'\x5a'*77
+
+def packetsOf(data, packet_size):
+    return [data[n:n+packet_size] for n in range(0, len(data) - packet_size + 1, packet_size)]
+
+class SyncTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.data = dict()
+        for packet_size in (188, 192, 204):
+            path = streams.generate(cls.directory, 'clean%d.ts' % packet_size, frames=100, packet_size=packet_size)
+            with open(path, 'rb') as f:
+                cls.data[packet_size] = f.read()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def write(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_probe(self):
+        for (packet_size, data) in self.data.items():
+            self.assertEqual(probeSync(data), (0, packet_size))
+            #a recording starting inside a packet
+            self.assertEqual(probeSync(data[1000:]), (-1000 % packet_size, packet_size))
+            self.assertEqual(probeSync(GARBAGE + data), (len(GARBAGE), packet_size))
+            #bytes inserted after the first quarter shift most packets
+            n = len(data)//4 // packet_size*packet_size
+            self.assertEqual(probeSync(data[:n] + GARBAGE + data[n:]), (0, packet_size))
+
+    def test_probe_nothing(self):
+        self.assertEqual(probeSync(b'\x47' + GARBAGE*100), (-1, 0))
+        self.assertEqual(probeSync(self.data[188][:188*3]), (-1, 0))
+
+    def test_detect(self):
+        for (packet_size, data) in self.data.items():
+            with open(self.write('detect.ts', GARBAGE + data), 'rb') as f:
+                f.seek(10)
+                self.assertEqual(detectSync(f), (len(GARBAGE), packet_size))
+                self.assertEqual(f.tell(), 10)
+
+    def readPackets(self, filehandle, packet_size, keep_sync_errors=False):
+        "Return the packets of a resync PacketSource and the (offset, skipped) it reported"
+        source = PacketSource(filehandle, packet_size, resync=True)
+        source.keep_sync_errors = keep_sync_errors
+        lost = list()
+        source.resync_callback = lambda offset, skipped: lost.append((offset, skipped))
+        try:
+            packets = [bytes(data[n:n+packet_size]) for (data, n) in source.packets()]
+        finally:
+            source.close()
+        return packets, lost
+
+    def sources(self, data):
+        "The same data mapped from a file and read through a buffer"
+        with open(self.write('source.ts', data), 'rb') as f:
+            yield f
+        yield io.BytesIO(data)
+
+    def test_resync(self):
+        for (packet_size, data) in self.data.items():
+            #garbage between two packets, then garbage inside one
+            n = packet_size*100
+            m = packet_size*300 + 10
+            corrupt = data[:n] + GARBAGE + data[n:m] + GARBAGE + data[m:]
+            #the packet holding the garbage still starts with a sync byte, the one after it does not
+            damaged = corrupt[packet_size*300 + len(GARBAGE):packet_size*301 + len(GARBAGE)]
+            expected = packetsOf(data[:packet_size*300], packet_size) + [damaged] + \
+                packetsOf(data[packet_size*301:], packet_size)
+            for f in self.sources(corrupt):
+                (packets, lost) = self.readPackets(f, packet_size)
+                self.assertEqual(packets, expected)
+                self.assertEqual(lost, [(n + len(GARBAGE), len(GARBAGE)),
+                                        (packet_size*301 + 2*len(GARBAGE), len(GARBAGE))])
+
+    def test_resync_at_end(self):
+        data = self.data[188]
+        #garbage shorter than a packet after the last one is not read
+        for f in self.sources(data + GARBAGE):
+            (packets, lost) = self.readPackets(f, 188)
+            self.assertEqual(packets, packetsOf(data, 188))
+            self.assertEqual(lost, [])
+        #no sync byte in the whole packets of the end
+        for f in self.sources(data + GARBAGE*5):
+            (packets, lost) = self.readPackets(f, 188)
+            self.assertEqual(packets, packetsOf(data, 188))
+            self.assertEqual(lost, [(len(data) + len(GARBAGE)*5, len(GARBAGE)*5)])
+
+    def test_sync_error(self):
+        "A packet whose sync byte alone is wrong is skipped"
+        for (packet_size, data) in self.data.items():
+            corrupt = bytearray(data)
+            corrupt[packet_size*50 + prefixLength(packet_size)] = 0
+            expected = packetsOf(bytes(corrupt), packet_size)
+            for f in self.sources(bytes(corrupt)):
+                (packets, lost) = self.readPackets(f, packet_size)
+                self.assertEqual(packets, expected[:50] + expected[51:])
+                self.assertEqual(lost, [(packet_size*51, packet_size)])
+
+    def test_keep_sync_errors(self):
+        "keep_sync_errors hands out a packet whose sync byte alone is wrong, but not two in a row"
+        for (packet_size, data) in self.data.items():
+            corrupt = bytearray(data)
+            corrupt[packet_size*50 + prefixLength(packet_size)] = 0
+            for f in self.sources(bytes(corrupt)):
+                (packets, lost) = self.readPackets(f, packet_size, True)
+                self.assertEqual(packets, packetsOf(bytes(corrupt), packet_size))
+                self.assertEqual(lost, [])
+            corrupt[packet_size*51 + prefixLength(packet_size)] = 0
+            expected = packetsOf(bytes(corrupt), packet_size)
+            for f in self.sources(bytes(corrupt)):
+                (packets, lost) = self.readPackets(f, packet_size, True)
+                self.assertEqual(packets, expected[:50] + expected[52:])
+                self.assertEqual(lost, [(packet_size*52, 2*packet_size)])
+
+if __name__ == '__main__':
+    unittest.main()
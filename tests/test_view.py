@@ -0,0 +1,122 @@
+#this Python script is used to test that the views of TSView decode what the ctypes structures of TSStruct decode
+
+import shutil
+import tempfile
+import unittest
+
+import streams
+
+import TSStruct
+import TSView
+
+HEAD_FIELDS = ('syncByte', 'transport_error_indicator', 'payload_unit_start_indicator', 'transport_priority',
+               'pid', 'scrambling_control', 'adaptation_field_ctrl', 'continuity_counter')
+ADAPTATION_FIELDS = ('adaptation_field_length', 'discontinuity_indicator', 'random_access_indicator',
+                     'elementary_stream_priority_indicator', 'PCR_flag', 'OPCR_flag', 'splicing_point_flag',
+                     'transport_private_data_flag', 'adaptation_field_extension_flag')
+
+def packetFields(packet):
+    "The fields of a TSPacket of TSStruct or TSView the tests compare"
+    fields = [getattr(packet.head, name) for name in HEAD_FIELDS] + [bytes(packet.head.int)]
+    if packet.head.adaptation_field_ctrl & 0x2:
+        field = packet.adaption_field
+        fields += [getattr(field, name) for name in ADAPTATION_FIELDS]
+        if field.PCR_flag:
+            fields += [field.pcr.pcr_base, field.pcr.pcr_extension]
+    if packet.head.adaptation_field_ctrl & 0x1:
+        fields.append(bytes(packet.payload))
+    return fields
+
+def itemFields(item):
+    "The fields of a PES, PAT or PMT of TSStruct or TSView the tests compare"
+    if hasattr(item, 'stream_id'):
+        fields = ['PES', item.packet_start_code_prefix, item.stream_id, item.pes_packet_length, item.type]
+        if item.type == 'MainStream':
+            stream = item.stream
+            fields += [stream.pts_dts_flag, stream.pes_header_data_length, stream.payload_length,
+                       bytes(stream.payload), item.AUType]
+            for name in ('PTS', 'DTS'):
+                pattern = getattr(stream, name, None)
+                fields.append(pattern.value if pattern is not None else None)
+        return fields
+    fields = [type(item).__name__, item.table_id, item.section_length, item.version_number,
+              item.section_number, item.last_section_number, item.CRC_32, item.crc_valid]
+    if hasattr(item, 'program_list'):
+        fields += [item.transport_stream_id, item.program_list]
+    else:
+        fields += [item.program_num, item.PCR_PID, bytes(item.program_info),
+                   [dict(es, es_info=bytes(es['es_info'])) for es in item.es_list]]
+    return fields
+
+class ViewTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.paths = dict((packet_size, streams.generate(cls.directory, 'clean%d.ts' % packet_size,
+                                                        frames=200, packet_size=packet_size))
+                         for packet_size in (188, 192, 204))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def test_packets(self):
+        for (packet_size, path) in sorted(self.paths.items()):
+            with open(path, 'rb') as f:
+                data = f.read()
+            pcrs = 0
+            for n in range(0, len(data), packet_size):
+                packet = data[n:n+packet_size]
+                view = TSView.TSPacket(packet)
+                self.assertEqual(packetFields(view), packetFields(TSStruct.TSPacket(packet)), (packet_size, n))
+                if view.head.adaptation_field_ctrl & 0x2:
+                    pcrs += view.adaption_field.PCR_flag
+            #the stream carries PCRs, so their fields were compared
+            self.assertTrue(pcrs)
+
+    def parseItems(self, path, views):
+        items = list()
+        stream = TSStruct.TSStream(views, verify_crc=True,
+                                   sink=TSStruct.CallbackSink(lambda pid, item: items.append((pid, itemFields(item)))))
+        with open(path, 'rb') as f:
+            stream.parse(f)
+        return items
+
+    def test_items(self):
+        for (packet_size, path) in sorted(self.paths.items()):
+            items = self.parseItems(path, False)
+            self.assertEqual(set(fields[0] for (pid, fields) in items), set(('PAT', 'PMT', 'PES')))
+            self.assertEqual(self.parseItems(path, True), items, packet_size)
+
+    def test_adaptation_field(self):
+        "An adaptation field with both PCR and OPCR, and an empty one, decode alike"
+        self.assertEqual(TSView.TSAdaptationField.field_length, TSStruct.TSAdaptationField.field_length)
+        pcr = bytes((0x12, 0x34, 0x56, 0x78, 0xFE, 0x2B))
+        opcr = bytes((0x87, 0x65, 0x43, 0x21, 0x7F, 0x01))
+        for data in (b'', b'\x80', bytes((0x50,)) + pcr, bytes((0xD8,)) + pcr + opcr + b'\xff'*3):
+            fields = list()
+            for field in (TSView.TSAdaptationField(data), TSStruct.TSAdaptationField(data)):
+                values = [getattr(field, name) for name in ADAPTATION_FIELDS]
+                for (name, flag) in (('pcr', field.PCR_flag), ('opcr', field.OPCR_flag)):
+                    if flag:
+                        values += [getattr(field, name).pcr_base, getattr(field, name).pcr_extension]
+                fields.append(values)
+            self.assertEqual(fields[0], fields[1], data)
+        self.assertEqual(fields[0][1:4], [1, 1, 0])
+        self.assertEqual(fields[0][-4:], [int.from_bytes(pcr, 'big') >> 15, 0x2B, int.from_bytes(opcr, 'big') >> 15, 0x101])
+
+    def test_short_pes(self):
+        "A PES cut short in its header or its header data decodes as the ctypes PES, the missing bytes as 0"
+        with open(self.paths[188], 'rb') as f:
+            data = f.read()
+        n = data.index(b'\x00\x00\x01\xe0')
+        pes = data[n:n+20]
+        for length in range(len(pes) + 1):
+            self.assertEqual(itemFields(TSView.PES(pes[:length])), itemFields(TSStruct.PES(pes[:length])), length)
+        view = TSView.PES(memoryview(pes)[:5])
+        self.assertEqual((view.packet_start_code_prefix, view.stream_id, view.pes_packet_length),
+                         (1, 0xE0, pes[4] << 8))
+
+if __name__ == '__main__':
+    unittest.main()